@@ -0,0 +1,89 @@
+"""
+Flight sonuç akışında sabit 1024 satırlık batch ile bayt hedefli uyarlanır batch karşılaştırması.
+
+Yerel bir StreamFlightServer başlatır; dar (3 tamsayı sütun) ve geniş (uzun metin
+sütunları) iki sorguyu do_get ile çeker. Her politika için ilk batch'e kadar geçen
+süre, toplam süre, satır/sn, MB/sn ve batch (gRPC mesajı) sayısını yazdırır.
+
+    cd backend && python -m benchmarks.bench_batch_sizing --rows 2000000
+"""
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.flight
+
+from query_engine.server import StreamFlightServer
+
+QUERIES = {
+    "narrow": "SELECT range AS id, range % 97 AS account_id, range * 3 AS amount FROM range({rows})",
+    "wide": ("SELECT range AS id, repeat('description ' || (range % 1000)::VARCHAR, 8) AS description, "
+             "md5(range::VARCHAR) || md5((range + 1)::VARCHAR) AS checksum, "
+             "repeat('x', 120) AS payload FROM range({rows})"),
+}
+
+POLICIES = {
+    "fixed-1024": {"batch_rows": 1024},
+    "adaptive": {},
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure(client, sql, batching, repeats):
+    best = None
+    for _ in range(repeats):
+        ticket = pa.flight.Ticket(json.dumps({
+            "query": sql, "already_rendered": True, "session_id": "bench", "batching": batching
+        }).encode())
+        start = time.perf_counter()
+        reader = client.do_get(ticket)
+        first = None
+        rows = nbytes = batches = 0
+        for chunk in reader:
+            if first is None:
+                first = time.perf_counter() - start
+            rows += chunk.data.num_rows
+            nbytes += chunk.data.nbytes
+            batches += 1
+        total = time.perf_counter() - start
+        result = (total, first or total, rows, nbytes, batches)
+        if best is None or result[0] < best[0]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        location = f"grpc://127.0.0.1:{free_port()}"
+        server = StreamFlightServer(location=location, db_path=os.path.join(tmp, "meta.db"), query_dirs=[tmp])
+        threading.Thread(target=server.serve, daemon=True).start()
+        client = pa.flight.connect(location)
+        try:
+            print(f"{'query':<8} {'policy':<11} {'first ms':>9} {'total s':>8} {'rows/s':>12} {'MB/s':>8} {'batches':>8}")
+            for qname, template in QUERIES.items():
+                sql = template.format(rows=args.rows)
+                for pname, batching in POLICIES.items():
+                    total, first, rows, nbytes, batches = measure(client, sql, batching, args.repeats)
+                    print(f"{qname:<8} {pname:<11} {first * 1000:>9.1f} {total:>8.2f} {rows / total:>12,.0f} "
+                          f"{nbytes / total / 1e6:>8.1f} {batches:>8}")
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Yalnızca kriterleri değişen dashboard sorguları: değerleri SQL'e gömen (literal) render
+ile bind parametreli render.
+
+Her mod için yerel bir StreamFlightServer başlatır ve aynı şablonu --queries kez,
+her seferinde farklı kriterlerle get_flight_info + do_get olarak çalıştırır: bir kez
+oturumdaki DuckDB tablosu üzerinde, bir kez harici bir SQLite bağlantısı üzerinde.
+İstek gecikmesinin dağılımı (p50/p95) ile şema önbelleği ve harici şema keşfi
+isabetleri yazdırılır; bind modunda SQL metni kriterden bağımsız olduğu için şema
+bir kez çıkarılır ve kaynak aynı deyimi yeniden kullanır.
+
+    cd backend && python -m benchmarks.bench_bind_params --rows 1000000 --queries 200
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.flight
+
+from query_engine.server import StreamFlightServer
+
+DASHBOARD = (
+    "SELECT region, channel, COUNT(*) AS orders, SUM(amount) AS revenue\n"
+    "FROM {table}\n"
+    "WHERE {{{{ REGION|eq }}}} AND {{{{ CHANNEL|eq }}}} AND {{{{ AMOUNT|gte }}}} AND {{{{ NOTE|like }}}}\n"
+    "GROUP BY region, channel ORDER BY revenue DESC"
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_sqlite(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript(f"""
+        CREATE TABLE sales (id INTEGER, region INTEGER, channel TEXT, amount REAL, note TEXT);
+        WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i < {rows - 1})
+        INSERT INTO sales
+        SELECT i, i % 40, CASE i % 3 WHEN 0 THEN 'web' WHEN 1 THEN 'store' ELSE 'phone' END,
+               (i % 10000) / 10.0, 'order ' || i
+        FROM seq;
+    """)
+    conn.commit()
+    conn.close()
+
+
+def criteria_stream(count, seed=7):
+    rnd = random.Random(seed)
+    for _ in range(count):
+        yield {
+            "REGION": rnd.sample(range(40), rnd.randint(1, 5)),
+            "CHANNEL": rnd.choice(["web", "store", "phone"]),
+            "AMOUNT": rnd.randint(0, 900),
+            "NOTE": str(rnd.randint(0, 99))
+        }
+
+
+def run_dashboard(client, table, criteria, bind, session_id, connection_id=None):
+    command = {"query": DASHBOARD.format(table=table), "criteria": criteria, "session_id": session_id,
+               "bind_parameters": bind}
+    if connection_id:
+        command["connection_id"] = connection_id
+    start = time.perf_counter()
+    info = client.get_flight_info(pa.flight.FlightDescriptor.for_command(json.dumps(command).encode()))
+    rows = client.do_get(info.endpoints[0].ticket).read_all().num_rows
+    return time.perf_counter() - start, rows
+
+
+def action(client, name, body=None):
+    result = list(client.do_action(pa.flight.Action(name, json.dumps(body or {}).encode())))
+    return json.loads(result[0].body.to_pybytes())
+
+
+def measure(bind, sqlite_path, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        location = f"grpc://127.0.0.1:{free_port()}"
+        # Harici sorgu DB-API cursor yolundan geçsin; yerel tarayıcı parametre bağlayamaz
+        server = StreamFlightServer(location=location, db_path=os.path.join(tmp, "meta.db"), query_dirs=[tmp],
+                                    native_scanners=False)
+        threading.Thread(target=server.serve, daemon=True).start()
+        try:
+            client = pa.flight.connect(location)
+            session = "bench"
+            setup = {"query": f"CREATE TABLE sales AS SELECT * FROM sqlite_scan('{sqlite_path}', 'sales')",
+                     "already_rendered": True, "session_id": session}
+            try:
+                client.do_get(pa.flight.Ticket(json.dumps(setup).encode())).read_all()
+            except pa.ArrowException:
+                # sqlite eklentisi yoksa aynı veri DuckDB'de üretilir
+                setup["query"] = (
+                    f"CREATE TABLE sales AS SELECT range AS id, range % 40 AS region, "
+                    f"['web', 'store', 'phone'][range % 3 + 1] AS channel, (range % 10000) / 10.0 AS amount, "
+                    f"'order ' || range AS note FROM range({args.rows})")
+                client.do_get(pa.flight.Ticket(json.dumps(setup).encode())).read_all()
+            conn_id = action(client, "save_connection", {
+                "name": "bench_sqlite", "type": "sqlite", "connection_string": f"sqlite://{sqlite_path}"})["id"]
+
+            results = {}
+            for target, connection_id in (("duckdb", None), ("sqlite", conn_id)):
+                for criteria in criteria_stream(args.warmup, seed=1):
+                    run_dashboard(client, "sales", criteria, bind, session, connection_id)
+                schema_before = action(client, "schema_cache_stats")
+                external_before = action(client, "external_schema_stats")
+                latencies = [run_dashboard(client, "sales", criteria, bind, session, connection_id)[0]
+                             for criteria in criteria_stream(args.queries)]
+                schema_after = action(client, "schema_cache_stats")
+                external_after = action(client, "external_schema_stats")
+                results[target] = (latencies, {
+                    "schema hits": schema_after["hits"] - schema_before["hits"],
+                    "schema misses": schema_after["misses"] - schema_before["misses"],
+                    "source describes": external_after["misses"] - external_before["misses"]
+                })
+        finally:
+            server.shutdown()
+    return results
+
+
+def summary(latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return f"p50 {statistics.median(ordered) * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms  (n={len(ordered)})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows in the sales table")
+    parser.add_argument("--queries", type=int, default=200, help="Measured dashboard requests per target")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per target")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = os.path.join(tmp, "sales.db")
+        make_sqlite(sqlite_path, args.rows)
+        print(f"{args.rows:,} rows, {args.queries} dashboard requests with distinct criteria per target")
+        for bind in (False, True):
+            mode = "bind" if bind else "literal"
+            for target, (latencies, counters) in measure(bind, sqlite_path, args).items():
+                counts = ", ".join(f"{k} {v}" for k, v in counters.items())
+                print(f"[{mode:7}] {target:6}: {summary(latencies)}  {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+DB-API cursor -> Arrow dönüşüm benchmark'ı.
+
+Eski yol (satırları Python'da zip ile çevirip her batch'te tipi yeniden çıkarmak)
+ile CursorConverter'ı 1M satırlık SQLite ve Postgres benzeri girdilerde karşılaştırır.
+
+    cd backend && python -m benchmarks.bench_cursor_converter --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import pyarrow as pa
+
+from query_engine.cursor_converter import CursorConverter
+from query_engine.types import sqlite_declared_types
+
+
+def legacy_batches(cursor, batch_size):
+    """The row-wise path _execute_on_external and ReaderExtension used before CursorConverter."""
+    col_names = [col[0] for col in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        cols = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays([pa.array(c) for c in cols], names=col_names)
+
+
+def make_sqlite(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE facts (id INTEGER, account_id INTEGER, amount REAL, currency TEXT, description TEXT, created_at TEXT)")
+    rnd = random.Random(42)
+    currencies = ["TRY", "USD", "EUR", "GBP"]
+    chunk = 100000
+    for start in range(0, rows, chunk):
+        conn.executemany(
+            "INSERT INTO facts VALUES (?, ?, ?, ?, ?, ?)",
+            [(i, i % 5000, round(rnd.random() * 5000, 2), currencies[i % 4], f"invoice line {i}", f"2024{(i % 12) + 1:02d}15")
+             for i in range(start, min(start + chunk, rows))]
+        )
+    conn.commit()
+    conn.close()
+
+
+class PostgresLikeCursor:
+    """In-memory cursor with psycopg2-style description (type OIDs) and tuple rows."""
+
+    description = [("id", 20), ("account_id", 23), ("amount", 701), ("currency", 1043), ("description", 25)]
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._pos = 0
+
+    def fetchmany(self, n):
+        batch = self._rows[self._pos:self._pos + n]
+        self._pos += n
+        return batch
+
+
+def timed(label, rows, fn):
+    start = time.perf_counter()
+    total = sum(b.num_rows for b in fn())
+    elapsed = time.perf_counter() - start
+    assert total == rows, (label, total)
+    print(f"{label:<32} {elapsed:8.3f}s {rows / elapsed:14,.0f} rows/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        make_sqlite(path, args.rows)
+        sql = "SELECT * FROM facts"
+
+        print(f"SQLite, {args.rows:,} rows")
+        conn = sqlite3.connect(path)
+        legacy = timed("  legacy zip + pa.array", args.rows, lambda: legacy_batches(conn.execute(sql), args.batch_size))
+        declared = sqlite_declared_types(conn, sql)
+        new = timed("  CursorConverter", args.rows, lambda: CursorConverter(conn.execute(sql), args.batch_size, declared_types=declared))
+        print(f"  speedup x{legacy / new:.2f}")
+        conn.close()
+
+    rows = [(i, i % 5000, i * 0.5, "TRY", f"invoice line {i}") for i in range(args.rows)]
+    print(f"Postgres-like, {args.rows:,} rows")
+    legacy = timed("  legacy zip + pa.array", args.rows, lambda: legacy_batches(PostgresLikeCursor(rows), args.batch_size))
+    new = timed("  CursorConverter", args.rows, lambda: CursorConverter(PostgresLikeCursor(rows), args.batch_size, dialect="postgres"))
+    print(f"  speedup x{legacy / new:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+Uçtan uca sorgu benchmark'ı: yerel bir StreamFlightServer'a karşı get_flight_info + do_get.
+
+Sunucuyu ayrı bir süreçte başlatır (bellek ölçümü istemciden bağımsız olsun diye),
+istenen boyutta sentetik bir SQLite veri seti üretir (SQLite içinde tek bir
+özyinelemeli CTE ile; satır başına Python döngüsü yok) ve tipik sorgu
+şablonlarını çalıştırır:
+
+    plain_select          DuckDB üzerinde düz SELECT
+    reader                {% reader %} ile SQLite'tan Arrow tabloya
+    reader_parquet        {% reader ..., true %} soğuk (önbellek her turda temizlenir)
+    reader_parquet_cached {% reader ..., true %} önbellekten
+    python_dicts          {% python %} bloğunun döndürdüğü dict listesi (log akışı + veri bileti)
+    filtered              YAML şablonu, eq/between/like/in kriterleriyle
+    external_sqlite       connection_id ile doğrudan harici SQLite sorgusu
+
+Her senaryo için get_flight_info ve do_get süreleri, ilk batch süresi, satır/sn ve
+sunucu sürecinin tepe RSS değeri (Linux'ta /proc üzerinden) ölçülür. Sonuçlar JSON
+olarak yazılabilir; iki çalıştırma --compare ile karşılaştırılır ve eşik üzerindeki
+gerilemeler işaretlenir (gerileme varsa çıkış kodu 1).
+
+    cd backend && python -m benchmarks.bench_end_to_end --rows 1000000 --output run.json
+    cd backend && python -m benchmarks.bench_end_to_end --baseline base.json --output run.json
+    cd backend && python -m benchmarks.bench_end_to_end --compare base.json run.json --threshold 0.15
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import pathlib
+import platform
+import socket
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import duckdb
+import pyarrow as pa
+import pyarrow.flight
+
+SCENARIOS = (
+    "plain_select", "reader", "reader_parquet", "reader_parquet_cached",
+    "python_dicts", "filtered", "external_sqlite",
+)
+
+# Metric -> True when larger is better; used by --compare
+COMPARED = {
+    "total_ms": False,
+    "first_batch_ms": False,
+    "flight_info_ms": False,
+    "rows_per_sec": True,
+    "peak_rss_mb": False,
+}
+
+FILTERED_TEMPLATE = """\
+name: bench_filtered
+sql: |
+  {% reader 'ledger_f', '<CONN>', true %}SELECT * FROM ledger{% endreader %}
+  SELECT * FROM ledger_f
+  WHERE {{ CURRENCY | eq }}
+    AND {{ AMOUNT | between }}
+    AND {{ DESCRIPTION | like }}
+    AND {{ ACCOUNT_ID | gt }}
+    AND {{ BOOKED_AT | between }}
+"""
+
+FILTERED_CRITERIA = {
+    "CURRENCY": ["TRY", "USD", "EUR"],
+    "AMOUNT": {"start": 100, "end": 9000},
+    "DESCRIPTION": "line",
+    "ACCOUNT_ID": 10,
+    "BOOKED_AT": {"start": "20200101", "end": "20241231"},
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_sqlite(path, rows):
+    """Builds the ledger table inside SQLite with one recursive CTE; no per-row Python."""
+    conn = sqlite3.connect(path)
+    conn.executescript(f"""
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        CREATE TABLE ledger (
+            id INTEGER, account_id INTEGER, amount REAL, currency TEXT,
+            booked_at TEXT, description TEXT
+        );
+        WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i < {rows - 1})
+        INSERT INTO ledger
+        SELECT i, i % 5000, (i * 7919 % 1000000) / 100.0,
+               CASE i % 4 WHEN 0 THEN 'TRY' WHEN 1 THEN 'USD' WHEN 2 THEN 'EUR' ELSE 'GBP' END,
+               strftime('%Y%m%d', '2020-01-01', '+' || (i % 1826) || ' days'),
+               'ledger line ' || i
+        FROM seq;
+    """)
+    conn.commit()
+    conn.close()
+
+
+def serve(location, db_path, query_dir):
+    """Child process entry point."""
+    import logging
+    from query_engine.server import StreamFlightServer
+
+    logging.disable(logging.INFO)
+    server = StreamFlightServer(location=location, db_path=db_path, query_dirs=[pathlib.Path(query_dir)])
+    server.serve()
+
+
+class RssProbe:
+    """
+    Peak resident memory of a process while a block runs. On Linux the kernel's
+    high-water mark (VmHWM) is reset through clear_refs; where that is not allowed
+    VmRSS is sampled instead. Elsewhere nothing is measured.
+    """
+
+    def __init__(self, pid, interval=0.01):
+        self.status = pathlib.Path(f"/proc/{pid}/status")
+        self.clear_refs = pathlib.Path(f"/proc/{pid}/clear_refs")
+        self.interval = interval
+        self.available = self.status.exists()
+
+    def _read_kb(self, field):
+        for line in self.status.read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+        return None
+
+    def __enter__(self):
+        self.start_kb = self.peak_kb = None
+        if not self.available:
+            return self
+        self.start_kb = self._read_kb("VmRSS")
+        try:
+            self.clear_refs.write_text("5")
+            self.hwm = True
+        except OSError:
+            self.hwm = False
+            self._stop = threading.Event()
+            self.peak_kb = self.start_kb
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_kb = max(self.peak_kb, self._read_kb("VmRSS") or 0)
+
+    def __exit__(self, *exc):
+        if not self.available:
+            return
+        if self.hwm:
+            self.peak_kb = self._read_kb("VmHWM")
+        else:
+            self._stop.set()
+            self._sampler.join()
+
+    def result(self) -> dict:
+        if self.peak_kb is None:
+            return {"peak_rss_mb": None, "rss_growth_mb": None}
+        return {
+            "peak_rss_mb": round(self.peak_kb / 1024, 1),
+            "rss_growth_mb": round((self.peak_kb - self.start_kb) / 1024, 1),
+        }
+
+
+def run_flight(client, command):
+    """One get_flight_info + do_get round trip, following a log stream's data ticket like the UI does."""
+    start = time.perf_counter()
+    info = client.get_flight_info(pa.flight.FlightDescriptor.for_command(json.dumps(command).encode()))
+    flight_info = time.perf_counter() - start
+
+    first = None
+    rows = 0
+    ticket = info.endpoints[0].ticket
+    while ticket is not None:
+        reader = client.do_get(ticket)
+        ticket = None
+        is_log = reader.schema.names == ["stream_type", "stream_content"]
+        for chunk in reader:
+            if is_log:
+                for kind, content in zip(chunk.data.column(0).to_pylist(), chunk.data.column(1).to_pylist()):
+                    if kind == "result_ticket":
+                        ticket = pa.flight.Ticket(content.encode())
+                    elif kind == "stderr":
+                        raise RuntimeError(content.strip())
+                continue
+            if first is None:
+                first = time.perf_counter() - start
+            rows += chunk.data.num_rows
+    total = time.perf_counter() - start
+    return {"flight_info": flight_info, "first_batch": first if first is not None else total, "total": total, "rows": rows}
+
+
+def scenario_commands(args, conn_str, connection_id):
+    reader_sql = "SELECT * FROM ledger"
+    python_rows = args.python_rows
+    return {
+        "plain_select": {
+            "query": (f"SELECT range AS id, range % 5000 AS account_id, range * 0.5 AS amount, "
+                      f"'ledger line ' || range AS description FROM range({args.rows})")
+        },
+        "reader": {
+            "query": f"{{% reader 'ledger_a', '{conn_str}' %}}{reader_sql}{{% endreader %}}SELECT * FROM ledger_a"
+        },
+        "reader_parquet": {
+            "query": f"{{% reader 'ledger_p', '{conn_str}', true %}}{reader_sql}{{% endreader %}}SELECT * FROM ledger_p",
+            "_invalidate": True,
+        },
+        "reader_parquet_cached": {
+            "query": f"{{% reader 'ledger_p', '{conn_str}', true %}}{reader_sql}{{% endreader %}}SELECT * FROM ledger_p",
+        },
+        "python_dicts": {
+            "query": (
+                "{% python 'py_rows' %}\n"
+                f"return [{{'id': i, 'account_id': i % 5000, 'amount': i * 0.5, 'currency': 'TRY'}} "
+                f"for i in range({python_rows})]\n"
+                "{% endpython %}\n"
+                "SELECT * FROM py_rows"
+            ),
+            "result_ticket": True,
+        },
+        "filtered": {"template": "bench_filtered.yaml", "criteria": FILTERED_CRITERIA},
+        "external_sqlite": {"query": reader_sql, "connection_id": connection_id},
+    }
+
+
+def measure_scenario(client, probe, name, command, repeats, conn_str):
+    command = {**command, "session_id": f"bench_{name}"}
+    invalidate = command.pop("_invalidate", False)
+    runs = []
+    with probe:
+        for _ in range(repeats):
+            if invalidate:
+                body = json.dumps({"connection": conn_str}).encode()
+                list(client.do_action(pa.flight.Action("invalidate_reader_cache", body)))
+            runs.append(run_flight(client, command))
+    totals = [r["total"] for r in runs]
+    median = statistics.median(totals)
+    rows = runs[-1]["rows"]
+    return {
+        "rows": rows,
+        "repeats": repeats,
+        "flight_info_ms": round(statistics.median(r["flight_info"] for r in runs) * 1000, 1),
+        "first_batch_ms": round(statistics.median(r["first_batch"] for r in runs) * 1000, 1),
+        "total_ms": round(median * 1000, 1),
+        "best_total_ms": round(min(totals) * 1000, 1),
+        "rows_per_sec": round(rows / median) if median else None,
+        **probe.result(),
+    }
+
+
+def run(args) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "ledger.db")
+        conn_str = f"sqlite://{data_path}"
+        start = time.perf_counter()
+        make_sqlite(data_path, args.rows)
+        print(f"Generated {args.rows:,} ledger rows in {time.perf_counter() - start:.1f}s")
+
+        query_dir = os.path.join(tmp, "templates")
+        os.makedirs(query_dir)
+        with open(os.path.join(query_dir, "bench_filtered.yaml"), "w") as f:
+            f.write(FILTERED_TEMPLATE.replace("<CONN>", conn_str))
+
+        location = f"grpc://127.0.0.1:{free_port()}"
+        proc = multiprocessing.get_context("spawn").Process(
+            target=serve, args=(location, os.path.join(tmp, "meta.db"), query_dir), daemon=True)
+        proc.start()
+        try:
+            client = wait_for_server(location)
+            body = {"name": "BenchLedger", "type": "sqlite", "connection_string": conn_str}
+            result = list(client.do_action(pa.flight.Action("save_connection", json.dumps(body).encode())))
+            connection_id = json.loads(result[0].body.to_pybytes())["id"]
+
+            probe = RssProbe(proc.pid)
+            commands = scenario_commands(args, conn_str, connection_id)
+            print(f"{'scenario':<22} {'rows':>10} {'info ms':>9} {'first ms':>9} {'total ms':>9} "
+                  f"{'rows/s':>12} {'peak MB':>8}")
+            for name in args.scenarios:
+                try:
+                    r = measure_scenario(client, probe, name, commands[name], args.repeats, conn_str)
+                except Exception as e:
+                    print(f"{name:<22} FAILED: {e}")
+                    results[name] = {"error": str(e)}
+                    continue
+                results[name] = r
+                print(f"{name:<22} {r['rows']:>10,} {r['flight_info_ms']:>9.1f} {r['first_batch_ms']:>9.1f} "
+                      f"{r['total_ms']:>9.1f} {r['rows_per_sec'] or 0:>12,} {r['peak_rss_mb'] or 0:>8.1f}")
+        finally:
+            proc.terminate()
+            proc.join(10)
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "rows": args.rows,
+            "python_rows": args.python_rows,
+            "repeats": args.repeats,
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "pyarrow": pa.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "scenarios": results,
+    }
+
+
+def wait_for_server(location, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            client = pa.flight.connect(location)
+            list(client.do_action(pa.flight.Action("query_stats", b"")))
+            return client
+        except pa.ArrowException:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Prints a per-scenario comparison and returns the regressions beyond threshold (a fraction)."""
+    regressions = []
+    print(f"{'scenario':<22} {'metric':<15} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, now in current.get("scenarios", {}).items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or "error" in before or "error" in now:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = before.get(metric), now.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions.append({"scenario": name, "metric": metric, "baseline": old, "current": new,
+                                    "change": round(change, 4)})
+            print(f"{name:<22} {metric:<15} {old:>12,} {new:>12,} {change:>+8.1%}{flag}")
+    if baseline.get("meta", {}).get("rows") != current.get("meta", {}).get("rows"):
+        print("Note: the runs used different --rows; absolute timings are not comparable.")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--python-rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare this run against an earlier JSON result")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Only compare two JSON results, without running anything")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative change counted as a regression (default 0.10 = 10%%)")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+    else:
+        current = run(args)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(current, f, indent=2)
+            print(f"Results written to {args.output}")
+        if not args.baseline:
+            return
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+do_get akışında Arrow IPC gövde sıkıştırması: none / lz4 / zstd karşılaştırması.
+
+Yerel bir StreamFlightServer başlatır ve istemciyi araya konan bir TCP vekili
+(proxy) üzerinden bağlar. Vekil sunucudan istemciye giden baytları sayar ve
+--link-mbps verilirse bant genişliğini o hıza kısar (ofis ağı benzetimi). İki
+sorgu çekilir: metin ağırlıklı, sıkıştırılabilir bir fatura sonucu ve rastgele
+sayılardan oluşan, sıkıştırılamaz bir sonuç. Her codec için kablodaki bayt,
+sıkıştırma oranı ve uçtan uca süre yazdırılır.
+
+    cd backend && python -m benchmarks.bench_ipc_compression --rows 500000 --link-mbps 100
+"""
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.flight
+
+from query_engine.server import StreamFlightServer
+
+QUERIES = {
+    "invoices (text)": (
+        "SELECT range AS invoice_id, 'TR' || lpad((range % 90000)::VARCHAR, 10, '0') AS supplier_tax_no, "
+        "CASE range % 5 WHEN 0 THEN 'Ofis malzemesi alımı' WHEN 1 THEN 'Danışmanlık hizmet bedeli' "
+        "WHEN 2 THEN 'Kargo ve lojistik gideri' WHEN 3 THEN 'Yazılım lisans yenilemesi' "
+        "ELSE 'Kira ve aidat ödemesi' END || ' - ' || (range % 12 + 1)::VARCHAR || '. dönem' AS description, "
+        "(range % 100000) / 100.0 AS amount, 'TRY' AS currency, "
+        "DATE '2024-01-01' + (range % 365)::INTEGER AS invoice_date FROM range({rows})"
+    ),
+    "random (numeric)": (
+        "SELECT random() AS a, random() AS b, random() AS c, (random() * 9e18)::BIGINT AS d, "
+        "(random() * 9e18)::BIGINT AS e FROM range({rows})"
+    ),
+}
+
+CODECS = ("none", "lz4", "zstd")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ThrottlingProxy:
+    """TCP forwarder that counts server-to-client bytes and optionally caps their rate."""
+
+    def __init__(self, upstream_port, link_mbps=0.0):
+        self.upstream_port = upstream_port
+        self.rate = link_mbps * 1e6 / 8 if link_mbps else 0.0
+        self.downstream_bytes = 0
+        self._lock = threading.Lock()
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def reset(self):
+        with self._lock:
+            self.downstream_bytes = 0
+
+    def _accept(self):
+        while True:
+            client, _ = self._listener.accept()
+            upstream = socket.create_connection(("127.0.0.1", self.upstream_port))
+            for s in (client, upstream):
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._pump, args=(client, upstream, False), daemon=True).start()
+            threading.Thread(target=self._pump, args=(upstream, client, True), daemon=True).start()
+
+    def _pump(self, src, dst, downstream):
+        started = time.perf_counter()
+        sent = 0
+        try:
+            while True:
+                data = src.recv(64 * 1024)
+                if not data:
+                    break
+                if downstream:
+                    with self._lock:
+                        self.downstream_bytes += len(data)
+                    if self.rate:
+                        sent += len(data)
+                        # Hold the bytes back until the link would have carried them
+                        delay = sent / self.rate - (time.perf_counter() - started)
+                        if delay > 0:
+                            time.sleep(delay)
+                        elif delay < -0.05:
+                            # Idle gaps do not bank credit for later bursts
+                            started, sent = time.perf_counter(), 0
+                dst.sendall(data)
+        except OSError:
+            pass
+        finally:
+            for s in (src, dst):
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def measure(client, proxy, sql, codec, repeats):
+    best = None
+    for _ in range(repeats):
+        ticket = pa.flight.Ticket(json.dumps({
+            "query": sql, "already_rendered": True, "session_id": "bench", "compression": codec
+        }).encode())
+        proxy.reset()
+        start = time.perf_counter()
+        rows = nbytes = 0
+        for chunk in client.do_get(ticket):
+            rows += chunk.data.num_rows
+            nbytes += chunk.data.nbytes
+        total = time.perf_counter() - start
+        result = (total, proxy.downstream_bytes, nbytes, rows)
+        if best is None or result[0] < best[0]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--link-mbps", type=float, default=0.0, help="Cap the proxy at this many Mbit/s (0 = loopback)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        server = StreamFlightServer(location=f"grpc://127.0.0.1:{port}", db_path=os.path.join(tmp, "meta.db"),
+                                    query_dirs=[tmp])
+        threading.Thread(target=server.serve, daemon=True).start()
+        proxy = ThrottlingProxy(port, args.link_mbps)
+        client = pa.flight.connect(f"grpc://127.0.0.1:{proxy.port}")
+        try:
+            link = f"{args.link_mbps:g} Mbit/s" if args.link_mbps else "loopback"
+            print(f"{args.rows:,} rows per query, link: {link}")
+            print(f"{'query':<17} {'codec':<5} {'wire MB':>9} {'arrow MB':>9} {'ratio':>6} {'total s':>8} {'vs none':>8}")
+            for qname, template in QUERIES.items():
+                sql = template.format(rows=args.rows)
+                baseline = None
+                for codec in CODECS:
+                    total, wire, nbytes, rows = measure(client, proxy, sql, codec, args.repeats)
+                    baseline = baseline or total
+                    print(f"{qname:<17} {codec:<5} {wire / 1e6:>9.1f} {nbytes / 1e6:>9.1f} "
+                          f"{nbytes / max(wire, 1):>6.2f} {total:>8.2f} {baseline / total:>7.2f}x")
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+{% reader %} yükleme süresi: DB-API cursor yolu ile DuckDB'nin yerel sqlite tarayıcısı.
+
+5M satırlık bir SQLite tablosunu oturum DuckDB'sine iki yoldan yükler ve süreleri
+karşılaştırır. sqlite eklentisi kurulamıyorsa (ör. ağ yok) yerel yol atlanır.
+
+    cd backend && python -m benchmarks.bench_native_scan --rows 5000000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import duckdb
+import pyarrow as pa
+
+from query_engine.cursor_converter import CursorConverter
+from query_engine.native_scan import NativeScanner
+from query_engine.types import sqlite_declared_types
+
+
+def make_sqlite(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript(f"""
+        CREATE TABLE ledger (id INTEGER, account_id INTEGER, amount REAL, currency TEXT, description TEXT);
+        WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i < {rows - 1})
+        INSERT INTO ledger
+        SELECT i, i % 5000, (i % 100000) / 10.0,
+               CASE i % 4 WHEN 0 THEN 'TRY' WHEN 1 THEN 'USD' WHEN 2 THEN 'EUR' ELSE 'GBP' END,
+               'ledger line ' || i
+        FROM seq;
+    """)
+    conn.commit()
+    conn.close()
+
+
+def load_with_cursor(ctx, path, sql):
+    conn = sqlite3.connect(path)
+    declared = sqlite_declared_types(conn, sql)
+    converter = CursorConverter(conn.execute(sql), batch_size=10000, declared_types=declared)
+    table = pa.Table.from_batches(list(converter), schema=converter.schema)
+    ctx.register("ledger_cursor", table)
+    conn.close()
+    return table.num_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    args = parser.parse_args()
+
+    sql = "SELECT * FROM ledger"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ledger.db")
+        start = time.perf_counter()
+        make_sqlite(path, args.rows)
+        print(f"Generated {args.rows:,} rows in {time.perf_counter() - start:.1f}s")
+
+        ctx = duckdb.connect(":memory:")
+        start = time.perf_counter()
+        rows = load_with_cursor(ctx, path, sql)
+        cursor_time = time.perf_counter() - start
+        print(f"cursor fetch + CursorConverter {cursor_time:8.2f}s {rows / cursor_time:14,.0f} rows/s")
+
+        scanner = NativeScanner()
+        start = time.perf_counter()
+        rows = scanner.materialize(ctx, "ledger_native", f"sqlite://{path}", sql)
+        native_time = time.perf_counter() - start
+        if rows is None:
+            print(f"native sqlite scanner           skipped ({scanner.stats()})")
+            return
+        print(f"native sqlite scanner          {native_time:8.2f}s {rows / native_time:14,.0f} rows/s")
+        print(f"speedup x{cursor_time / native_time:.2f}")
+
+
+if __name__ == "__main__":
+    main()
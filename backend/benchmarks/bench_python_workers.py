@@ -0,0 +1,124 @@
+"""
+{% python %} bloklarının sunucu içinde (inline) ve işçi süreçlerde (process) çalıştırılması.
+
+Her mod için yerel bir StreamFlightServer başlatır. --blocks adet CPU ağırlıklı
+Python bloğunu (saf Python döngüsü) ayrı oturumlardan aynı anda çalıştırırken,
+başka bir oturumdan sürekli hafif bir sorgu (SELECT 42) gönderir. Ağır blokların
+toplam süresi ile hafif sorgunun gecikme dağılımı (p50/p95/max) yazdırılır; inline
+modda GIL'i tutan bloklar diğer oturumları bekletir.
+
+    cd backend && python -m benchmarks.bench_python_workers --blocks 4 --loop 20000000
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.flight
+
+from query_engine.server import StreamFlightServer
+
+HEAVY_BLOCK = (
+    "{{% python 'heavy' %}}\n"
+    "total = 0\n"
+    "for i in range({loop}):\n"
+    "    total += i * i % 7\n"
+    "return [{{'total': total}}]\n"
+    "{{% endpython %}}\n"
+    "SELECT * FROM heavy"
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_heavy(location, session_id, loop):
+    client = pa.flight.connect(location)
+    command = {"query": HEAVY_BLOCK.format(loop=loop), "session_id": session_id}
+    info = client.get_flight_info(pa.flight.FlightDescriptor.for_command(json.dumps(command).encode()))
+    logs = "".join(client.do_get(info.endpoints[0].ticket).read_all().column("stream_content").to_pylist())
+    if "[SQL RESULT]: 1 rows" not in logs:
+        raise RuntimeError(f"Heavy block failed: {logs.strip()[-300:]}")
+
+
+def probe(location, stop, latencies):
+    client = pa.flight.connect(location)
+    ticket = pa.flight.Ticket(json.dumps({"query": "SELECT 42 AS x", "already_rendered": True,
+                                          "session_id": "probe"}).encode())
+    while not stop.is_set():
+        start = time.perf_counter()
+        client.do_get(ticket).read_all()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.01)
+
+
+def measure(mode, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        location = f"grpc://127.0.0.1:{free_port()}"
+        server = StreamFlightServer(
+            location=location, db_path=os.path.join(tmp, "meta.db"), query_dirs=[tmp],
+            python_options={"mode": mode, "processes": args.blocks},
+            scheduler_options={"global_slots": args.blocks + 2, "class_slots": {"python": args.blocks}})
+        threading.Thread(target=server.serve, daemon=True).start()
+        try:
+            # Warm-up: workers started, templates compiled, probe connection open
+            run_heavy(location, "warmup", 1000)
+            time.sleep(1.0 if mode == "process" else 0)
+
+            stop = threading.Event()
+            latencies = []
+            prober = threading.Thread(target=probe, args=(location, stop, latencies))
+            prober.start()
+            time.sleep(0.5)
+            idle = list(latencies)
+
+            start = time.perf_counter()
+            heavy = [threading.Thread(target=run_heavy, args=(location, f"heavy_{i}", args.loop))
+                     for i in range(args.blocks)]
+            for t in heavy:
+                t.start()
+            for t in heavy:
+                t.join()
+            wall = time.perf_counter() - start
+            stop.set()
+            prober.join()
+            busy = latencies[len(idle):]
+        finally:
+            server.python_workers.close()
+            server.shutdown()
+    return wall, idle, busy
+
+
+def summary(latencies):
+    if not latencies:
+        return "n/a"
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return (f"p50 {statistics.median(ordered) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms  "
+            f"max {ordered[-1] * 1000:7.1f} ms  (n={len(ordered)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=4, help="Concurrent CPU-heavy Python blocks")
+    parser.add_argument("--loop", type=int, default=20_000_000, help="Loop iterations per block")
+    args = parser.parse_args()
+
+    print(f"{args.blocks} concurrent blocks x {args.loop:,} iterations, {os.cpu_count()} CPUs")
+    for mode in ("inline", "process"):
+        wall, idle, busy = measure(mode, args)
+        print(f"\n[{mode}] heavy blocks finished in {wall:.2f}s")
+        print(f"  light query, idle server : {summary(idle)}")
+        print(f"  light query, during load : {summary(busy)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import logging
+import pyarrow as pa
+
+logger = logging.getLogger("StreamFlightServer")
+
+# Per-request overrides: ticket "batching" keys and their x- header equivalents
+OVERRIDE_HEADERS = {
+    "target_bytes": "x-batch-target-bytes",
+    "first_batch_rows": "x-first-batch-rows",
+    "batch_rows": "x-batch-rows",
+}
+
+
+class BatchPolicy:
+    """
+    Sizes Flight result batches by bytes instead of a fixed row count.
+
+    The first batch holds at most first_batch_rows rows so the grid can paint
+    quickly. Each following batch is sized from the bytes per row observed so
+    far, growing by at most `growth` times per batch until it carries about
+    target_bytes. batch_rows pins a fixed row count instead (the old behaviour).
+    Sources are read in source_rows chunks (DuckDB's vector size, so the first
+    batch waits for as little work as possible) and re-cut with zero-copy
+    slices; only chunks that must be joined into one message are copied.
+    """
+
+    def __init__(self, target_bytes=4 * 1024 * 1024, first_batch_rows=1024, min_rows=64,
+                 max_rows=1024 * 1024, growth=4.0, source_rows=2048, batch_rows=None):
+        self.target_bytes = target_bytes
+        self.first_batch_rows = first_batch_rows
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.growth = growth
+        self.source_rows = source_rows
+        self.batch_rows = batch_rows
+
+    def overridden(self, ticket_options=None, headers=None) -> "BatchPolicy":
+        """Returns a copy with the ticket's "batching" options and x- headers applied (headers win)."""
+        options = dict(ticket_options or {})
+        for key, header in OVERRIDE_HEADERS.items():
+            if headers and header in headers:
+                options[key] = headers[header]
+
+        policy = BatchPolicy(**vars(self))
+        for key, value in options.items():
+            if key not in OVERRIDE_HEADERS:
+                continue
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                logger.warning(f"Ignoring invalid batching option {key}={value!r}")
+                continue
+            if key == "target_bytes":
+                # Keep each Flight message within a sane range
+                policy.target_bytes = min(max(value, 64 * 1024), 64 * 1024 * 1024)
+            elif key == "first_batch_rows":
+                policy.first_batch_rows = min(max(value, 1), self.max_rows)
+            else:
+                policy.batch_rows = min(max(value, 1), self.max_rows) if value > 0 else None
+        return policy
+
+    @property
+    def fetch_rows(self) -> int:
+        """Row count to request from a DuckDB result per source chunk."""
+        return self.batch_rows or self.source_rows
+
+    def first_rows(self) -> int:
+        return self.batch_rows or self.first_batch_rows
+
+    def next_rows(self, batch, previous_rows) -> int:
+        """Rows for the batch after `batch`, aiming at target_bytes."""
+        if self.batch_rows:
+            return self.batch_rows
+        bytes_per_row = max(batch.nbytes / max(batch.num_rows, 1), 1.0)
+        wanted = int(self.target_bytes / bytes_per_row)
+        rows = min(wanted, int(max(previous_rows, 1) * self.growth))
+        return max(self.min_rows, min(rows, self.max_rows))
+
+    def rebatch(self, reader) -> pa.RecordBatchReader:
+        """Re-cuts a RecordBatchReader into byte-targeted batches."""
+        if self.batch_rows and self.batch_rows == self.source_rows:
+            return reader
+        return pa.RecordBatchReader.from_batches(reader.schema, self._rebatched(reader))
+
+    def _rebatched(self, reader):
+        limit = self.first_rows()
+        pending = []
+        pending_rows = 0
+        for chunk in reader:
+            offset = 0
+            while offset < chunk.num_rows:
+                take = min(chunk.num_rows - offset, limit - pending_rows)
+                pending.append(chunk.slice(offset, take))
+                pending_rows += take
+                offset += take
+                if pending_rows >= limit:
+                    batch = pending[0] if len(pending) == 1 else pa.concat_batches(pending)
+                    yield batch
+                    limit = self.next_rows(batch, limit)
+                    pending = []
+                    pending_rows = 0
+        if pending:
+            yield pending[0] if len(pending) == 1 else pa.concat_batches(pending)
+
+    def adapt(self, converter):
+        """Streams a CursorConverter, resizing its fetchmany() calls after every batch."""
+        converter.batch_size = self.first_rows()
+        for batch in converter:
+            yield batch
+            converter.batch_size = self.next_rows(batch, converter.batch_size)
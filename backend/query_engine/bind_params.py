@@ -0,0 +1,201 @@
+import re
+import hashlib
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+import duckdb
+
+from .reader_extensions import context_storage
+from .cursor_converter import cursor_dialect
+
+logger = logging.getLogger("StreamFlightServer")
+
+# $n placeholders and % signs outside string literals, quoted identifiers and comments
+_TOKENS = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/)|\$(\d+)(?!\w)|(%)", re.DOTALL)
+
+
+def bind_value(value):
+    """
+    In bind mode, appends value to the render's parameter list (context_storage.bind_params)
+    and returns its $n placeholder; returns None when the render inlines literals.
+    """
+    params = getattr(context_storage, "bind_params", None)
+    if params is None:
+        return None
+    params.append(value)
+    return f"${len(params)}"
+
+
+def mssql_param_type(value) -> str:
+    """sp_executesql declaration of a parameter value; strings share one type so their plan is reused."""
+    if isinstance(value, bool):
+        return "bit"
+    if isinstance(value, int):
+        return "bigint"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, Decimal):
+        scale = max(-value.as_tuple().exponent, 0)
+        return f"decimal(38,{min(scale, 38)})"
+    if isinstance(value, datetime):
+        return "datetime2"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, str) and len(value) > 4000:
+        return "nvarchar(max)"
+    return "nvarchar(4000)"
+
+
+def _replace_placeholders(sql, placeholder, escape_percent=False) -> str:
+    def sub(m):
+        if m.group(1) is not None:
+            return m.group(1).replace("%", "%%") if escape_percent else m.group(1)
+        if m.group(2) is not None:
+            return placeholder(int(m.group(2)))
+        return "%%" if escape_percent else "%"
+    return _TOKENS.sub(sub, sql)
+
+
+def null_placeholders(sql) -> str:
+    """sql with every $n placeholder replaced by NULL, for probes that cannot bind values."""
+    return _replace_placeholders(sql, lambda n: "NULL")
+
+
+def binds_before_last(sql) -> bool:
+    """True if a statement before the last one of sql has $n placeholders; DuckDB binds parameters only in the last."""
+    try:
+        statements = duckdb.extract_statements(sql)
+    except Exception:
+        return False
+    return any(s.named_parameters for s in statements[:-1])
+
+
+def sql_literal(value) -> str:
+    """value as a DuckDB SQL literal."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, datetime):
+        return f"TIMESTAMP '{value.isoformat(sep=' ')}'"
+    if isinstance(value, date):
+        return f"DATE '{value.isoformat()}'"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def inline_params(sql, params) -> str:
+    """sql with every $n placeholder replaced by the literal of params[n - 1]."""
+    return _replace_placeholders(sql, lambda n: sql_literal(params[n - 1]))
+
+
+def to_dialect(sql, params, dialect):
+    """
+    (statement, arguments) that run sql, rendered with $n placeholders, through the
+    DB-API driver of dialect: DuckDB binds $n itself, SQLite gets ?n, pyformat
+    drivers (psycopg2) get %(pn)s with literal % doubled, and MSSQL (pymssql)
+    gets an sp_executesql call, so the server caches one plan for the statement.
+    Without params the statement is returned unchanged.
+    """
+    if not params:
+        return sql, None
+    params = list(params)
+    if dialect == "sqlite":
+        return _replace_placeholders(sql, lambda n: f"?{n}"), params
+    if dialect == "mssql":
+        statement = _replace_placeholders(sql, lambda n: f"@P{n}")
+        declaration = ", ".join(f"@P{i} {mssql_param_type(v)}" for i, v in enumerate(params, 1))
+        assignments = ", ".join(f"@P{i} = %s" for i in range(1, len(params) + 1))
+        return f"EXEC sp_executesql %s, %s, {assignments}", tuple([statement, declaration] + params)
+    if dialect == "postgres":
+        return (_replace_placeholders(sql, lambda n: f"%(p{n})s", escape_percent=True),
+                {f"p{i}": v for i, v in enumerate(params, 1)})
+    return sql, params
+
+
+class StatementCache:
+    """
+    Server-side prepared statements per pooled source connection.
+
+    Postgres keeps a PREPAREd plan for the lifetime of the connection, so each
+    distinct bound statement is prepared once per connection and later runs as
+    EXECUTE with only the values; the least recently used are DEALLOCATEd beyond
+    max_per_connection. MSSQL reuses sp_executesql plans on the server and
+    SQLite reuses compiled statements per connection by SQL text, so for those
+    (and when preparing fails) the statement is executed with bound parameters.
+    """
+
+    def __init__(self, enabled=True, max_per_connection=64):
+        self.enabled = enabled
+        self.max_per_connection = max_per_connection
+        self._prepared = weakref.WeakKeyDictionary()  # connection -> OrderedDict of statement names
+        self._unpreparable = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    def execute(self, conn, cursor, sql, params=None):
+        """Runs sql (with $n placeholders) with params on cursor, preparing it on conn where that pays off."""
+        dialect = cursor_dialect(conn)
+        if params and self.enabled and dialect == "postgres" and self._execute_prepared(conn, cursor, sql, params):
+            return
+        statement, args = to_dialect(sql, params, dialect)
+        if args is None:
+            cursor.execute(statement)
+        else:
+            cursor.execute(statement, args)
+
+    def _execute_prepared(self, conn, cursor, sql, params) -> bool:
+        name = "qe_" + hashlib.sha1(sql.encode()).hexdigest()[:16]
+        with self._lock:
+            if name in self._unpreparable:
+                return False
+            try:
+                names = self._prepared.setdefault(conn, OrderedDict())
+            except TypeError:
+                # The driver's connections cannot be weakly referenced
+                return False
+            prepared = name in names
+            if prepared:
+                names.move_to_end(name)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if not prepared:
+            try:
+                # PREPARE takes Postgres' own $n placeholders as rendered
+                cursor.execute(f"PREPARE {name} AS {sql}")
+            except Exception as e:
+                logger.info(f"Could not prepare statement, executing it with bound parameters: {e}")
+                conn.rollback()
+                with self._lock:
+                    self._unpreparable.add(name)
+                    self.fallbacks += 1
+                return False
+            with self._lock:
+                names[name] = None
+                evicted = []
+                while len(names) > self.max_per_connection:
+                    evicted.append(names.popitem(last=False)[0])
+            for old in evicted:
+                cursor.execute(f"DEALLOCATE {old}")
+
+        cursor.execute(f"EXECUTE {name}({', '.join(['%s'] * len(params))})", list(params))
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "connections": len(self._prepared),
+                "hits": self.hits,
+                "misses": self.misses,
+                "fallbacks": self.fallbacks
+            }
@@ -0,0 +1,283 @@
+import time
+import uuid
+import logging
+import threading
+import contextlib
+
+import pyarrow as pa
+
+logger = logging.getLogger("StreamFlightServer")
+
+
+class QueryCancelled(Exception):
+    """Raised by work that stops because its query was cancelled."""
+
+
+class CancelToken:
+    """
+    Cancellation state of one query, shared by its Flight calls, its render thread,
+    `{% reader %}` fetch loops and external cursors.
+
+    Python loops call check() between batches. Work that blocks in native code
+    (a DuckDB query, a driver cursor) registers an interrupt callback with
+    interrupting() for as long as it runs; cancel() fires the registered callbacks
+    while holding the token lock, so a callback never outlives its block and never
+    interrupts the next statement on a reused connection.
+    """
+
+    def __init__(self, query_id=None, session_id=None, registry=None):
+        self.query_id = query_id or uuid.uuid4().hex
+        self.session_id = session_id
+        self.reason = None
+        self.slot = None
+        self.started_at = time.time()
+        self._registry = registry
+        self._event = threading.Event()
+        self._callbacks = {}
+        self._finish_callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason="cancel_query") -> bool:
+        """Cancels the query once; returns False if it was already cancelled."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            for callback in list(self._callbacks.values()):
+                try:
+                    callback()
+                except Exception as e:
+                    logger.warning(f"Interrupting query {self.query_id} failed: {e}")
+        if self._registry is not None:
+            self._registry._cancelled(self, reason)
+        logger.info(f"[{self.session_id}] Query {self.query_id} cancelled ({reason})")
+        return True
+
+    def check(self, kind=None):
+        """Raises QueryCancelled if the query was cancelled, counting the stop under kind."""
+        if self._event.is_set():
+            self.stopped(kind)
+            raise QueryCancelled(f"Query {self.query_id} cancelled ({self.reason})")
+
+    def stopped(self, kind):
+        """Records that work of the given kind (duckdb, external, reader, python, render, logs) was cut short."""
+        if kind and self._registry is not None:
+            self._registry._stopped(kind)
+
+    def on_finish(self, callback):
+        """Calls callback once nothing holds the query any more (see QueryRegistry.release)."""
+        with self._lock:
+            self._finish_callbacks.append(callback)
+
+    def _finished(self):
+        with self._lock:
+            callbacks, self._finish_callbacks = self._finish_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Finishing query {self.query_id} failed: {e}")
+
+    @contextlib.contextmanager
+    def interrupting(self, callback):
+        """Calls callback if the query is cancelled while the block runs."""
+        handle = object()
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks[handle] = callback
+        self.check()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._callbacks.pop(handle, None)
+
+
+def check(token, kind=None):
+    if token is not None:
+        token.check(kind)
+
+
+def checked(batches, token, kind=None):
+    """Yields batches, stopping with QueryCancelled before the next one once token is cancelled."""
+    for batch in batches:
+        check(token, kind)
+        yield batch
+    check(token, kind)
+
+
+def interrupting(token, callback):
+    return token.interrupting(callback) if token is not None else contextlib.nullcontext()
+
+
+def is_cancelled(context) -> bool:
+    try:
+        return bool(context.is_cancelled())
+    except Exception:
+        return False
+
+
+class QueryRegistry:
+    """
+    Running queries by id, so a `cancel_query` action or a client disconnect can stop them.
+
+    A query stays registered while something holds it: its render thread, or a
+    Flight call that waits on it or streams it. Client disconnects are noticed
+    through ServerCallContext.is_cancelled(), which a watcher thread polls only
+    while the call's own thread sits inside a watching() block; the context is
+    not valid once the call has ended, so it is never touched outside one.
+    """
+
+    def __init__(self, poll_interval=0.2):
+        self.poll_interval = poll_interval
+        self._holds = {}  # token -> number of holders
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._watcher = None
+        self.started = 0
+        self.cancelled = 0
+        self.cancel_requests = 0
+        self.client_disconnects = 0
+        self.stopped = {}
+
+    def new(self, query_id=None, session_id=None) -> CancelToken:
+        return CancelToken(query_id, session_id, registry=self)
+
+    def hold(self, token: CancelToken):
+        with self._lock:
+            if token not in self._holds:
+                self.started += 1
+            self._holds[token] = self._holds.get(token, 0) + 1
+
+    def release(self, token: CancelToken):
+        with self._lock:
+            holders = self._holds.get(token, 0) - 1
+            if holders > 0:
+                self._holds[token] = holders
+                return
+            self._holds.pop(token, None)
+        token._finished()
+
+    def cancel(self, query_id=None, session_id=None, reason="cancel_query") -> list:
+        """Cancels one query by id, or every query of a session; returns the cancelled ids."""
+        if query_id is None and session_id is None:
+            return []
+        with self._lock:
+            tokens = [
+                token for token in self._holds
+                if (query_id is None or token.query_id == query_id)
+                and (session_id is None or token.session_id == session_id)
+            ]
+        return [token.query_id for token in tokens if token.cancel(reason)]
+
+    @contextlib.contextmanager
+    def watching(self, token: CancelToken, context):
+        """Cancels token if the client of context goes away while the block runs in the call's thread."""
+        if token is None or context is None:
+            yield
+            return
+        handle = object()
+        with self._wake:
+            self._watched[handle] = (token, context)
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name="query-cancel-watcher", daemon=True)
+                self._watcher.start()
+            self._wake.notify()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._watched.pop(handle, None)
+
+    def stream(self, token: CancelToken, context, reader, kind, interrupt=None) -> pa.RecordBatchReader:
+        """
+        Wraps a result reader so every batch pull is watched for a disconnect and the
+        query is released when the stream ends. interrupt stops a pull blocked in native code.
+        """
+        if token is None:
+            return reader
+
+        def batches():
+            # Held from the first pull; a stream that is never read never runs this body
+            self.hold(token)
+            try:
+                with interrupting(token, interrupt) if interrupt else contextlib.nullcontext():
+                    yield from self._pull(token, context, reader, kind)
+            except GeneratorExit:
+                # The server only abandons a stream early when the client has gone
+                if token.cancel("client disconnected"):
+                    token.stopped(kind)
+                raise
+            finally:
+                self.release(token)
+
+        return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+    def _pull(self, token, context, reader, kind):
+        it = iter(reader)
+        while True:
+            with self.watching(token, context):
+                token.check(kind)
+                try:
+                    batch = next(it)
+                except StopIteration:
+                    # Some producers end quietly when interrupted
+                    token.check(kind)
+                    return
+                except Exception as e:
+                    if token.cancelled:
+                        token.stopped(kind)
+                        raise QueryCancelled(f"Query {token.query_id} cancelled ({token.reason})") from e
+                    raise
+            yield batch
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "active": len(self._holds),
+                "started": self.started,
+                "cancelled": self.cancelled,
+                "cancel_requests": self.cancel_requests,
+                "client_disconnects": self.client_disconnects,
+                "stopped": dict(self.stopped),
+                "queries": [
+                    {
+                        "query_id": token.query_id,
+                        "session_id": token.session_id,
+                        "seconds": round(now - token.started_at, 3),
+                        "cancelled": token.cancelled
+                    }
+                    for token in self._holds
+                ]
+            }
+
+    def _cancelled(self, token, reason):
+        with self._lock:
+            self.cancelled += 1
+            if reason == "client disconnected":
+                self.client_disconnects += 1
+            else:
+                self.cancel_requests += 1
+
+    def _stopped(self, kind):
+        with self._lock:
+            self.stopped[kind] = self.stopped.get(kind, 0) + 1
+
+    def _watch(self):
+        while True:
+            with self._wake:
+                while not self._watched:
+                    self._wake.wait()
+                # Polled under the lock: a context is only valid while its call thread is inside watching()
+                gone = [token for token, context in self._watched.values()
+                        if not token.cancelled and is_cancelled(context)]
+            for token in gone:
+                token.cancel("client disconnected")
+            time.sleep(self.poll_interval)
@@ -0,0 +1,174 @@
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("StreamFlightServer")
+
+# Every table and view of the session with its columns in one pass. DuckDB keeps the
+# row count of each table in its catalog (estimated_size, exact for in-memory tables),
+# so counts come with the scan; views have no count without running them.
+CATALOG_QUERY = """
+    WITH relations AS (
+        SELECT database_name, schema_name, table_name AS name, 'BASE TABLE' AS type, estimated_size AS row_count
+        FROM duckdb_tables() WHERE NOT internal
+        UNION ALL
+        SELECT database_name, schema_name, view_name, 'VIEW', NULL
+        FROM duckdb_views() WHERE NOT internal
+    )
+    SELECT r.schema_name, r.name, r.type, r.row_count, c.column_name, c.data_type
+    FROM relations r
+    LEFT JOIN duckdb_columns() c
+        ON c.database_name = r.database_name AND c.schema_name = r.schema_name AND c.table_name = r.name
+    WHERE r.schema_name NOT IN ('information_schema', 'pg_catalog', '_results')
+    ORDER BY r.name, r.schema_name, c.column_index
+"""
+
+# In-memory width of a value per DuckDB type; strings, blobs and nested types count
+# their 16-byte vector entry only, so sizes of such columns are a lower bound.
+TYPE_WIDTHS = {
+    "BOOLEAN": 1, "TINYINT": 1, "UTINYINT": 1,
+    "SMALLINT": 2, "USMALLINT": 2,
+    "INTEGER": 4, "UINTEGER": 4, "FLOAT": 4, "DATE": 4,
+    "BIGINT": 8, "UBIGINT": 8, "DOUBLE": 8, "TIME": 8, "TIMESTAMP": 8,
+    "TIMESTAMP_S": 8, "TIMESTAMP_MS": 8, "TIMESTAMP_NS": 8,
+    "HUGEINT": 16, "UHUGEINT": 16, "UUID": 16, "INTERVAL": 16,
+}
+DEFAULT_WIDTH = 16
+
+
+def type_width(data_type: str) -> int:
+    """Bytes one value of a DuckDB type (as duckdb_columns() spells it) takes in memory."""
+    if data_type.startswith("DECIMAL("):
+        precision = int(data_type[8:].split(",")[0])
+        return 2 if precision <= 4 else 4 if precision <= 9 else 8 if precision <= 18 else 16
+    if data_type.endswith("]") or data_type.startswith(("STRUCT", "MAP", "UNION")):
+        return DEFAULT_WIDTH
+    base = data_type.split(" WITH ")[0]
+    return TYPE_WIDTHS.get(base, DEFAULT_WIDTH)
+
+
+def snapshot_catalog(conn) -> OrderedDict:
+    """
+    Runs CATALOG_QUERY on conn and returns (schema, name) -> table entry in the
+    get_schema format, with rows and estimated bytes for base tables. It must be the
+    session connection itself: cursors do not see Arrow objects registered on it.
+    """
+    tables = OrderedDict()
+    for schema_name, name, table_type, row_count, column_name, data_type in conn.execute(CATALOG_QUERY).fetchall():
+        entry = tables.get((schema_name, name))
+        if entry is None:
+            entry = tables[(schema_name, name)] = {
+                "name": name,
+                "type": table_type,
+                "columns": [],
+                "rows": row_count,
+                "estimatedBytes": None
+            }
+        if column_name is not None:
+            entry["columns"].append({
+                "name": column_name,
+                "type": data_type,
+                "primaryKey": False,  # Basic schema inference
+                "fk": None
+            })
+    for entry in tables.values():
+        if entry["rows"] is not None:
+            entry["estimatedBytes"] = entry["rows"] * sum(type_width(c["type"]) for c in entry["columns"])
+    return tables
+
+
+class _SessionCatalog:
+    """Latest snapshot of one session plus the version each table last changed at."""
+
+    def __init__(self, version, tables):
+        self.version = version
+        self.base_version = version  # changes before this are unknown
+        self.tables = tables
+        self.changed_at = {key: version for key in tables}
+        self.removed_at = OrderedDict()  # (schema, name) -> version it disappeared at
+
+
+class CatalogCache:
+    """
+    Per-session cache of the get_schema catalog.
+
+    A snapshot is rebuilt only when the session's catalog version (see
+    SessionManager.note_catalog / bump_catalog) moved on since the last one, so
+    repeated get_schema calls between executions cost no DuckDB query at all.
+    Each table remembers the version it last changed at, which lets callers ask
+    for only the tables added, changed or removed since a version they already
+    hold. Changes older than the first cached snapshot of a session are unknown
+    and answered with the full catalog.
+    """
+
+    def __init__(self, enabled=True, max_sessions=256, max_removed=1024):
+        self.enabled = enabled
+        self.max_sessions = max_sessions
+        self.max_removed = max_removed
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id, version, conn, since_version=None, arrow_bytes=None) -> dict:
+        """
+        The session's catalog at version as {"version", "incremental", "tables",
+        "removed"}. With since_version, tables holds only entries changed after it
+        and removed the names of tables dropped after it, when that is known.
+        arrow_bytes (name -> nbytes of Arrow data registered as a view) fills in
+        the sizes DuckDB cannot see.
+        """
+        state = self._refresh(session_id, version, conn)
+        incremental = since_version is not None and state.base_version <= since_version <= state.version
+        if incremental:
+            tables = [t for key, t in state.tables.items() if state.changed_at[key] > since_version]
+            removed = [key[1] for key, v in state.removed_at.items() if v > since_version]
+        else:
+            tables, removed = list(state.tables.values()), []
+        if arrow_bytes:
+            sizes = {name.lower(): nbytes for name, nbytes in arrow_bytes.items()}
+            tables = [dict(t, estimatedBytes=sizes[t["name"].lower()])
+                      if t["estimatedBytes"] is None and t["name"].lower() in sizes else t for t in tables]
+        return {"version": state.version, "incremental": incremental, "tables": tables, "removed": removed}
+
+    def _refresh(self, session_id, version, conn) -> _SessionCatalog:
+        with self._lock:
+            state = self._sessions.get(session_id) if self.enabled and version is not None else None
+            if state is not None and state.version == version:
+                self._sessions.move_to_end(session_id)
+                self.hits += 1
+                return state
+            self.misses += 1
+
+        fresh = _SessionCatalog(version, snapshot_catalog(conn))
+        if state is not None and version is not None and version > state.version:
+            fresh.base_version = state.base_version
+            fresh.removed_at = OrderedDict(state.removed_at)
+            for key, entry in fresh.tables.items():
+                if state.tables.get(key) == entry:
+                    fresh.changed_at[key] = state.changed_at[key]
+                fresh.removed_at.pop(key, None)
+            for key in state.tables.keys() - fresh.tables.keys():
+                fresh.removed_at[key] = version
+            while len(fresh.removed_at) > self.max_removed:
+                _, dropped_at = fresh.removed_at.popitem(last=False)
+                fresh.base_version = max(fresh.base_version, dropped_at)
+
+        if self.enabled and version is not None:
+            with self._lock:
+                current = self._sessions.get(session_id)
+                if current is None or current.version <= version:
+                    self._sessions[session_id] = fresh
+                    self._sessions.move_to_end(session_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+        return fresh
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sessions": len(self._sessions),
+                "hits": self.hits,
+                "misses": self.misses
+            }
@@ -0,0 +1,109 @@
+import logging
+import threading
+
+import pyarrow as pa
+
+logger = logging.getLogger("StreamFlightServer")
+
+# Arrow IPC body codecs, in the order preferred when a client accepts several
+CODECS = ("zstd", "lz4")
+
+# Accepted spellings of each codec, and of "no compression"
+ALIASES = {"zstd": "zstd", "zstandard": "zstd", "lz4": "lz4", "lz4_frame": "lz4"}
+NONE = ("", "none", "off", "false", "identity", "uncompressed")
+
+# Per-request overrides: explicit codec (ticket "compression" or this header) or a list the client can decode
+CODEC_HEADER = "x-ipc-compression"
+LEVEL_HEADER = "x-ipc-compression-level"
+ACCEPT_HEADER = "x-accept-compression"
+
+
+class WireCompression:
+    """
+    Chooses the Arrow IPC body compression of each do_get stream.
+
+    A request asks for a codec through the ticket's "compression" field
+    ("zstd", "lz4", "none" or {"codec": ..., "level": ...}) or the
+    x-ipc-compression header, or lists the codecs it can decode in
+    x-accept-compression ("zstd, lz4"), in which case the server's default codec
+    is used if listed, else the first listed one it supports. Without any of
+    these the server default applies; it is off by default because not every
+    Arrow client (e.g. older arrow-js builds) can decode compressed bodies.
+    Codecs missing from the local pyarrow build fall back to no compression.
+    """
+
+    def __init__(self, default=None, level=None):
+        self.default = self._codec(default)
+        self.level = level
+        self._available = {c: pa.Codec.is_available(c) for c in CODECS}
+        self._lock = threading.Lock()
+        self.streams = {c: 0 for c in ("none",) + CODECS}
+        self.unavailable = 0
+
+    def choose(self, requested=None, headers=None):
+        """Returns (codec or None, level) for one request."""
+        headers = headers or {}
+        level = self.level
+        if isinstance(requested, dict):
+            level = requested.get("level", level)
+            requested = requested.get("codec")
+        if requested is None and CODEC_HEADER in headers:
+            requested = headers[CODEC_HEADER]
+        if LEVEL_HEADER in headers:
+            level = headers[LEVEL_HEADER]
+
+        if requested is not None:
+            codec = self._codec(requested)
+        elif ACCEPT_HEADER in headers:
+            accepted = [self._codec(c) for c in str(headers[ACCEPT_HEADER]).split(",")]
+            usable = [c for c in accepted if c and self._available.get(c)]
+            codec = self.default if self.default in usable else (usable[0] if usable else None)
+        else:
+            codec = self.default
+
+        if codec and not self._available.get(codec):
+            logger.warning(f"IPC codec {codec} is not available in this pyarrow build; sending uncompressed")
+            with self._lock:
+                self.unavailable += 1
+            codec = None
+        try:
+            level = int(level) if level not in (None, "") else None
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring invalid IPC compression level {level!r}")
+            level = None
+        return codec, level
+
+    def write_options(self, requested=None, headers=None) -> pa.ipc.IpcWriteOptions:
+        """IpcWriteOptions for a RecordBatchStream / GeneratorStream of one request."""
+        codec, level = self.choose(requested, headers)
+        with self._lock:
+            self.streams[codec or "none"] += 1
+        if codec is None:
+            return pa.ipc.IpcWriteOptions()
+        try:
+            return pa.ipc.IpcWriteOptions(compression=pa.Codec(codec, compression_level=level))
+        except (ValueError, pa.ArrowException) as e:
+            logger.warning(f"Invalid {codec} compression level {level}: {e}; using the codec default")
+            return pa.ipc.IpcWriteOptions(compression=codec)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "default": self.default or "none",
+                "level": self.level,
+                "available": [c for c in CODECS if self._available[c]],
+                "streams": dict(self.streams),
+                "unavailable_requests": self.unavailable
+            }
+
+    @staticmethod
+    def _codec(name):
+        if name is None or name is False:
+            return None
+        name = str(name).strip().lower()
+        if name in NONE:
+            return None
+        codec = ALIASES.get(name)
+        if codec is None:
+            logger.warning(f"Unknown IPC codec {name!r}; sending uncompressed")
+        return codec
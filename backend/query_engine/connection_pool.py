@@ -0,0 +1,289 @@
+import time
+import logging
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse, unquote, parse_qs
+
+logger = logging.getLogger("StreamFlightServer")
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when a connection cannot be checked out in time or the wait queue is full."""
+
+
+def open_connection(conn_str: str):
+    """Opens a new DB-API connection for mssql://, postgres:// or sqlite:// connection strings."""
+    if conn_str.startswith("mssql://"):
+        import pymssql
+        u = urlparse(conn_str)
+
+        # Parse query parameters (e.g. ?charset=CP1254)
+        query_params = parse_qs(u.query)
+        charset = query_params.get('charset', [None])[0]
+
+        connect_args = {
+            "server": u.hostname,
+            "user": unquote(u.username) if u.username else None,
+            "password": unquote(u.password) if u.password else None,
+            "database": u.path.lstrip('/'),
+            "port": u.port or 1433,
+            "login_timeout": 10,
+            "autocommit": True
+        }
+
+        if charset:
+            connect_args["charset"] = charset
+
+        return pymssql.connect(**connect_args)
+
+    if conn_str.startswith("postgres://") or conn_str.startswith("postgresql://"):
+        import psycopg2
+        return psycopg2.connect(conn_str)
+
+    if conn_str.startswith("sqlite://") or conn_str.startswith("sqlite3://") or "://" not in conn_str:
+        db_path = conn_str.replace("sqlite3://", "").replace("sqlite://", "")
+        # Pooled connections are handed to whichever gRPC thread checks them out
+        return sqlite3.connect(db_path, check_same_thread=False)
+
+    raise ValueError(f"Unsupported connection protocol in: {conn_str}")
+
+
+def cancel_connection(conn):
+    """Aborts the statement running on conn from another thread; the connection should be discarded afterwards."""
+    if isinstance(conn, sqlite3.Connection):
+        conn.interrupt()
+        return
+    # psycopg2 exposes cancel() on the connection, pymssql on its underlying _mssql connection
+    cancel = getattr(conn, "cancel", None) or getattr(getattr(conn, "_conn", None), "cancel", None)
+    if cancel is None:
+        raise NotImplementedError(f"{type(conn).__name__} cannot cancel a running statement")
+    cancel()
+
+
+def mask_connection_string(conn_str: str) -> str:
+    """Hides the password part of a connection string for logs and stats."""
+    try:
+        u = urlparse(conn_str)
+        if u.password:
+            return conn_str.replace(f":{u.password}@", ":***@", 1)
+    except ValueError:
+        pass
+    return conn_str
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of connections for a single connection string.
+
+    Idle connections are reused LIFO (warmest first), dropped after idle_timeout
+    seconds and health-checked with `SELECT 1` on checkout. When all max_size
+    connections are busy, callers wait up to checkout_timeout; at most
+    max_waiters callers may wait at once, the rest fail fast.
+    """
+
+    def __init__(self, conn_str, max_size=5, idle_timeout=300.0, max_waiters=16,
+                 checkout_timeout=30.0, health_check=True, connect=None):
+        self.conn_str = conn_str
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_waiters = max_waiters
+        self.checkout_timeout = checkout_timeout
+        self.health_check = health_check
+        self._connect = connect or open_connection
+
+        self._idle = deque()  # (conn, last_used)
+        self._in_use = 0
+        self._waiters = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def acquire(self, timeout=None):
+        """Checks out a healthy connection, creating one if the pool has room."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        conn = None
+
+        with self._cond:
+            expired = self._pop_expired_locked()
+            while True:
+                if self._closed:
+                    raise PoolExhaustedError("Connection pool is closed")
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    self._in_use += 1
+                    break
+                if self._waiters >= self.max_waiters:
+                    self.rejected += 1
+                    raise PoolExhaustedError(
+                        f"Too many waiters for {mask_connection_string(self.conn_str)} ({self._waiters})")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolExhaustedError(
+                        f"Timed out after {timeout}s waiting for {mask_connection_string(self.conn_str)}")
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+
+        self._close_all(expired)
+
+        try:
+            if conn is not None:
+                if self._is_healthy(conn):
+                    with self._cond:
+                        self.reused += 1
+                    return conn
+                logger.info(f"Discarding unhealthy pooled connection for {mask_connection_string(self.conn_str)}")
+                self._close_all([conn])
+                with self._cond:
+                    self.discarded += 1
+
+            conn = self._connect(self.conn_str)
+            with self._cond:
+                self.created += 1
+            return conn
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """Returns a connection to the pool. Broken or aborted connections should be discarded."""
+        if not discard:
+            try:
+                # Match the old close-per-query semantics: nothing stays open between checkouts
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self.discarded += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None:
+            self._close_all([conn])
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    def evict_idle(self):
+        with self._cond:
+            expired = self._pop_expired_locked()
+        self._close_all(expired)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        self._close_all(idle)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "connection": mask_connection_string(self.conn_str),
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected
+            }
+
+    def _pop_expired_locked(self):
+        if not self.idle_timeout:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = []
+        # Oldest idle connections sit at the left end of the deque
+        while self._idle and self._idle[0][1] < cutoff:
+            expired.append(self._idle.popleft()[0])
+        self.discarded += len(expired)
+        return expired
+
+    def _is_healthy(self, conn) -> bool:
+        if not self.health_check:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_all(conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+class PoolManager:
+    """Keeps one ConnectionPool per connection string, shared by readers and external execution."""
+
+    def __init__(self, **pool_options):
+        self.pool_options = pool_options
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, conn_str: str) -> ConnectionPool:
+        with self._lock:
+            pool = self._pools.get(conn_str)
+            if pool is None:
+                pool = ConnectionPool(conn_str, **self.pool_options)
+                self._pools[conn_str] = pool
+            others = [p for p in self._pools.values() if p is not pool]
+
+        # Opportunistically close idle connections of pools nobody is using anymore
+        for p in others:
+            p.evict_idle()
+        return pool
+
+    def connection(self, conn_str: str, timeout=None):
+        return self.get(conn_str).connection(timeout)
+
+    def stats(self) -> list:
+        with self._lock:
+            pools = list(self._pools.values())
+        return [p.stats() for p in pools]
+
+    def close_all(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for p in pools:
+            p.close()
@@ -0,0 +1,145 @@
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger("StreamFlightServer")
+
+
+class ConnectionRegistryError(Exception):
+    """A save or delete the registry refused; the message is meant for the client."""
+
+
+class ConnectionInfo:
+    """One saved connection as stored in _meta_connections."""
+
+    __slots__ = ("id", "name", "type", "connection_string")
+
+    def __init__(self, id, name, type, connection_string):
+        self.id = str(id)
+        self.name = name
+        self.type = type
+        self.connection_string = connection_string
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "connection_string": self.connection_string  # In production, mask this!
+        }
+
+
+class _Snapshot:
+    """Immutable view of all connections; replaced as a whole on every change."""
+
+    def __init__(self, version, items):
+        self.version = version
+        self.items = tuple(items)
+        self.by_id = {c.id: c for c in self.items}
+        self.by_name = {c.name.casefold(): c for c in self.items}
+
+
+class ConnectionRegistry:
+    """
+    Saved external connections, indexed in memory by id and casefolded name.
+
+    Lookups read the current snapshot without locking or touching disk, so
+    resolving a reader's connection name during a render is two dictionary
+    lookups. Saves and deletes are serialized, written through to the
+    _meta_connections table of the SQLite metadata database (WAL journal, so
+    writes do not block readers of the file) and then publish a new snapshot
+    with the next version number; a lookup already holding the old snapshot
+    finishes against it.
+    """
+
+    def __init__(self, db_path, seeds=None):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        self._store = sqlite3.connect(db_path, check_same_thread=False)
+        self._store.execute("PRAGMA journal_mode=WAL")
+        self._store.execute("PRAGMA synchronous=NORMAL")
+        self._store.execute("""
+            CREATE TABLE IF NOT EXISTS _meta_connections (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL COLLATE NOCASE,
+                type TEXT NOT NULL,
+                connection_string TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Seeds are 'system' connections; a name that already exists keeps its stored value
+        for name, cstr in (seeds or {}).items():
+            self._store.execute(
+                "INSERT OR IGNORE INTO _meta_connections (name, type, connection_string) VALUES (?, ?, ?)",
+                (name, "system", cstr))
+        self._store.commit()
+        self._snapshot = _Snapshot(1, self._read_all())
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def get(self, conn_id):
+        """Connection string of a connection id, or None."""
+        info = self._snapshot.by_id.get(str(conn_id))
+        return info.connection_string if info is not None else None
+
+    def resolve(self, name):
+        """Connection string of a connection name (case-insensitive), or None."""
+        info = self._snapshot.by_name.get(name.casefold())
+        return info.connection_string if info is not None else None
+
+    def list(self) -> list:
+        return [c.to_dict() for c in self._snapshot.items]
+
+    def save(self, name, ctype, connection_string, conn_id=None) -> str:
+        """Inserts a connection, or updates conn_id; returns its id. Names are unique ignoring case."""
+        with self._write_lock:
+            snapshot = self._snapshot
+            existing = snapshot.by_name.get(name.casefold()) if name else None
+            if existing is not None and existing.id != (str(conn_id) if conn_id else None):
+                raise ConnectionRegistryError(f"Connection with name '{name}' already exists.")
+            if conn_id and str(conn_id) not in snapshot.by_id:
+                raise ConnectionRegistryError(f"Connection ID {conn_id} not found.")
+
+            try:
+                if conn_id:
+                    self._store.execute(
+                        "UPDATE _meta_connections SET name=?, type=?, connection_string=? WHERE id=?",
+                        (name, ctype, connection_string, conn_id))
+                else:
+                    conn_id = self._store.execute(
+                        "INSERT INTO _meta_connections (name, type, connection_string) VALUES (?, ?, ?)",
+                        (name, ctype, connection_string)).lastrowid
+                self._store.commit()
+            except sqlite3.IntegrityError:
+                self._store.rollback()
+                raise ConnectionRegistryError(f"Connection with name '{name}' already exists.")
+            except Exception:
+                self._store.rollback()
+                raise
+
+            info = ConnectionInfo(conn_id, name, ctype, connection_string)
+            items = [info if c.id == info.id else c for c in snapshot.items]
+            if info.id not in snapshot.by_id:
+                items.append(info)
+            self._snapshot = _Snapshot(snapshot.version + 1, items)
+            return info.id
+
+    def delete(self, conn_id):
+        with self._write_lock:
+            snapshot = self._snapshot
+            conn_id = str(conn_id)
+            if conn_id not in snapshot.by_id:
+                raise ConnectionRegistryError(f"Connection ID {conn_id} not found.")
+            self._store.execute("DELETE FROM _meta_connections WHERE id = ?", (conn_id,))
+            self._store.commit()
+            self._snapshot = _Snapshot(snapshot.version + 1, [c for c in snapshot.items if c.id != conn_id])
+
+    def close(self):
+        with self._write_lock:
+            self._store.close()
+
+    def _read_all(self) -> list:
+        rows = self._store.execute("SELECT id, name, type, connection_string FROM _meta_connections ORDER BY id")
+        return [ConnectionInfo(*row) for row in rows.fetchall()]
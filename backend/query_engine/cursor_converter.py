@@ -0,0 +1,166 @@
+import re
+import logging
+from decimal import Decimal, ROUND_HALF_EVEN
+
+import pyarrow as pa
+
+from .types import sqlite_to_arrow_type, dbapi_to_arrow_type
+
+logger = logging.getLogger("StreamFlightServer")
+
+_CONVERSION_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError, ValueError, OverflowError)
+
+# Fractional digits kept for decimal columns whose scale only the data shows (28 integer digits remain)
+INFERRED_DECIMAL_SCALE = 10
+_DECLARED_SCALE = re.compile(r"\(\s*\d+\s*,\s*(\d+)\s*\)")
+
+
+def cursor_dialect(cursor) -> str:
+    """Guesses the DB-API driver of a cursor from its module name."""
+    module = type(cursor).__module__ or ""
+    if module.startswith("pymssql") or module.startswith("_mssql"):
+        return "mssql"
+    if module.startswith("psycopg2"):
+        return "postgres"
+    if module.startswith("sqlite3"):
+        return "sqlite"
+    return "unknown"
+
+
+class CursorConverter:
+    """
+    Streams a DB-API cursor as Arrow RecordBatches with one stable schema.
+
+    Column types come from cursor.description where the driver reports precise
+    types (psycopg2 OIDs, pymssql strings/binaries), otherwise from the data of
+    the first batch. Columns that are entirely NULL are resolved from SQLite
+    declared types or by probing up to max_probe_batches further batches, and
+    fall back to string. Rows are converted in one C++ pass through a struct
+    array instead of a Python-level transpose; batches that do not fit that
+    fast path are converted column by column against the fixed schema.
+    Passing schema skips inference, so several cursors over parts of the same
+    query produce batches of one type; known_types (one Arrow type or None per
+    column, e.g. from SchemaDiscovery) pins the columns the source described.
+    """
+
+    def __init__(self, cursor, batch_size=10000, declared_types=None, dialect=None, max_probe_batches=4,
+                 schema=None, known_types=None):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.declared_types = declared_types or {}
+        self.dialect = dialect or cursor_dialect(cursor)
+        self.max_probe_batches = max_probe_batches
+        self.names = [col[0] for col in cursor.description or []]
+        # Ignored unless it lines up with the cursor's columns
+        self.known_types = known_types if known_types and len(known_types) == len(self.names) else None
+        self.exhausted = False
+        self.rows_converted = 0
+        self._pending = []
+        self._schema = schema
+        self._struct_type = pa.struct(list(schema)) if schema is not None else None
+
+    @property
+    def schema(self) -> pa.Schema:
+        if self._schema is None:
+            self._prime()
+        return self._schema
+
+    def __iter__(self):
+        schema = self.schema
+        while self._pending:
+            yield self._to_batch(self._pending.pop(0), schema)
+        while not self.exhausted:
+            rows = self.cursor.fetchmany(self.batch_size)
+            if not rows:
+                self.exhausted = True
+                break
+            yield self._to_batch(rows, schema)
+
+    def to_reader(self) -> pa.RecordBatchReader:
+        return pa.RecordBatchReader.from_batches(self.schema, iter(self))
+
+    def _prime(self):
+        """Fixes the schema, buffering as few batches as needed to type every column."""
+        types = [dbapi_to_arrow_type(self.dialect, col[1]) for col in self.cursor.description or []]
+        if self.known_types:
+            types = [known or t for known, t in zip(self.known_types, types)]
+
+        while any(t is None for t in types) and len(self._pending) < self.max_probe_batches:
+            rows = self.cursor.fetchmany(self.batch_size)
+            if not rows:
+                self.exhausted = True
+                break
+            self._pending.append(rows)
+            for i, t in enumerate(types):
+                if t is None:
+                    types[i] = self._infer_type(i, rows)
+
+        for i, t in enumerate(types):
+            if t is None:
+                declared = self.declared_types.get(self.names[i])
+                types[i] = sqlite_to_arrow_type(declared) if declared else pa.string()
+
+        self._schema = pa.schema([pa.field(n, t) for n, t in zip(self.names, types)])
+        self._struct_type = pa.struct(list(self._schema))
+
+    def _infer_type(self, index, rows):
+        try:
+            inferred = pa.array([r[index] for r in rows]).type
+        except _CONVERSION_ERRORS:
+            return pa.string()
+
+        declared = self.declared_types.get(self.names[index])
+        if pa.types.is_null(inferred):
+            # Still unknown; an SQLite declared type settles it without probing further
+            return sqlite_to_arrow_type(declared) if declared else None
+        if pa.types.is_decimal(inferred):
+            # Later batches may carry more digits than the first one: the scale the source
+            # declares, else room for more fractional digits than this batch shows
+            scale = self._declared_scale(index, declared)
+            return pa.decimal128(38, scale if scale is not None else max(inferred.scale, INFERRED_DECIMAL_SCALE))
+        if pa.types.is_integer(inferred) and declared and pa.types.is_floating(sqlite_to_arrow_type(declared)):
+            # SQLite hands back whole REAL values as ints
+            return pa.float64()
+        return inferred
+
+    def _declared_scale(self, index, declared):
+        """Scale of a decimal column from cursor.description or a declared type like DECIMAL(18,4); None if neither has one."""
+        column = self.cursor.description[index]
+        if len(column) > 5 and isinstance(column[5], int) and 0 <= column[5] <= 38:
+            return column[5]
+        match = _DECLARED_SCALE.search(declared or "")
+        return min(int(match.group(1)), 38) if match else None
+
+    def _to_batch(self, rows, schema) -> pa.RecordBatch:
+        self.rows_converted += len(rows)
+        try:
+            return pa.RecordBatch.from_struct_array(pa.array(rows, type=self._struct_type))
+        except _CONVERSION_ERRORS:
+            cols = list(zip(*rows))
+            return pa.RecordBatch.from_arrays(
+                [self._convert_column(c, f) for c, f in zip(cols, schema)],
+                schema=schema
+            )
+
+    @staticmethod
+    def _convert_column(values, field):
+        try:
+            return pa.array(values, type=field.type)
+        except _CONVERSION_ERRORS:
+            pass
+        if pa.types.is_string(field.type):
+            return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+        if pa.types.is_decimal(field.type):
+            # More fractional digits than the column's scale: round to it rather than fail the stream
+            step = Decimal(1).scaleb(-field.type.scale)
+            try:
+                rounded = [v.quantize(step, rounding=ROUND_HALF_EVEN) if isinstance(v, Decimal) else v for v in values]
+                array = pa.array(rounded, type=field.type)
+                logger.warning(f"Column '{field.name}' has values beyond scale {field.type.scale}; rounded them")
+                return array
+            except (_CONVERSION_ERRORS + (ArithmeticError,)):
+                pass
+        try:
+            return pa.array(values).cast(field.type)
+        except _CONVERSION_ERRORS as e:
+            raise ValueError(f"Column '{field.name}' does not match its type {field.type}: {e}")
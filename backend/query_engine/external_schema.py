@@ -0,0 +1,219 @@
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import pyarrow as pa
+
+from .types import mssql_to_arrow_type, postgres_to_arrow_type, sqlite_known_type, sqlite_declared_types, dbapi_to_arrow_type
+from .cursor_converter import cursor_dialect
+from .schema_cache import normalize_sql
+from .bind_params import to_dialect, null_placeholders
+
+logger = logging.getLogger("StreamFlightServer")
+
+# Estimated rows of the statement in an MSSQL SHOWPLAN_XML plan
+_MSSQL_EST_ROWS = re.compile(r'StatementEstRows="([0-9.eE+-]+)"')
+
+
+class DiscoveredSchema:
+    """
+    Column names and Arrow types (None = decided by the data) of an external query, plus the
+    source's row estimate and, for SQLite, the declared column types the types came from.
+    """
+
+    def __init__(self, names, types, row_estimate=None, declared_types=None):
+        self.names = list(names)
+        self.types = list(types)
+        self.row_estimate = row_estimate
+        self.declared_types = declared_types
+
+    @property
+    def complete(self) -> bool:
+        return all(t is not None for t in self.types)
+
+    @property
+    def schema(self):
+        """The full Arrow schema, or None while some column type is only known from the data."""
+        if not self.complete:
+            return None
+        return pa.schema([pa.field(n, t) for n, t in zip(self.names, self.types)])
+
+    @property
+    def total_records(self) -> int:
+        return int(round(self.row_estimate)) if self.row_estimate is not None and self.row_estimate >= 0 else -1
+
+
+def describe_mssql(conn, sql, estimate_rows=True, params=None) -> DiscoveredSchema:
+    """sp_describe_first_result_set (SQL Server 2012+), else SET FMTONLY; estimated rows from SHOWPLAN_XML."""
+    cursor = conn.cursor()
+    statement, args = to_dialect(sql, params, "mssql")
+
+    def run():
+        if args:
+            cursor.execute(statement, args)
+        else:
+            cursor.execute(statement)
+
+    try:
+        if args:
+            # to_dialect's sp_executesql arguments start with the statement and its declaration
+            cursor.execute("EXEC sp_describe_first_result_set @tsql = %s, @params = %s", args[:2])
+        else:
+            cursor.execute("EXEC sp_describe_first_result_set @tsql = %s", (sql,))
+        columns = [c[0] for c in cursor.description]
+        rows = [dict(zip(columns, r)) for r in cursor.fetchall()]
+        rows = [r for r in rows if not r.get("is_hidden")]
+        names = [r["name"] for r in rows]
+        types = [mssql_to_arrow_type(r["system_type_name"]) for r in rows]
+    except Exception as e:
+        logger.debug(f"sp_describe_first_result_set failed, trying FMTONLY: {e}")
+        cursor.execute("SET FMTONLY ON")
+        try:
+            run()
+            description = cursor.description or []
+        finally:
+            cursor.execute("SET FMTONLY OFF")
+        names = [c[0] for c in description]
+        types = [dbapi_to_arrow_type("mssql", c[1]) for c in description]
+
+    estimate = None
+    if estimate_rows and names:
+        cursor.execute("SET SHOWPLAN_XML ON")
+        try:
+            run()
+            row = cursor.fetchone()
+            match = _MSSQL_EST_ROWS.search(str(row[0])) if row else None
+            estimate = float(match.group(1)) if match else None
+        finally:
+            cursor.execute("SET SHOWPLAN_XML OFF")
+    return DiscoveredSchema(names, types, estimate)
+
+
+def describe_postgres(conn, sql, estimate_rows=True, params=None) -> DiscoveredSchema:
+    """
+    Describes the statement without fetching rows: a LIMIT 0 wrapper is planned and
+    initialized but the LIMIT node never pulls from its child. psycopg2 has no
+    protocol-level describe, so this stands in for a prepared-statement describe.
+    Estimated rows come from EXPLAIN (FORMAT JSON).
+    """
+    cursor = conn.cursor()
+
+    def run(statement):
+        statement, args = to_dialect(statement, params, "postgres")
+        if args:
+            cursor.execute(statement, args)
+        else:
+            cursor.execute(statement)
+
+    try:
+        run(f"SELECT * FROM ({sql}\n) AS _qe_describe LIMIT 0")
+        names = [c[0] for c in cursor.description]
+        types = [postgres_to_arrow_type(c[1], getattr(c, "precision", None), getattr(c, "scale", None))
+                 for c in cursor.description]
+        estimate = None
+        if estimate_rows:
+            run(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0]
+            estimate = float(plan[0]["Plan"]["Plan Rows"])
+        return DiscoveredSchema(names, types, estimate)
+    finally:
+        # A failed statement aborts the transaction the pooled connection is in
+        conn.rollback()
+
+
+def describe_sqlite(conn, sql, estimate_rows=True, params=None) -> DiscoveredSchema:
+    """LIMIT 0 for the column names; declared types for the columns SQLite has them for. SQLite keeps no row estimates."""
+    statement, args = to_dialect(f"SELECT * FROM ({sql}\n) LIMIT 0", params, "sqlite")
+    cursor = conn.execute(statement, args) if args else conn.execute(statement)
+    names = [c[0] for c in cursor.description]
+    # Views cannot take parameters; declared types only come from plain columns, so NULLs stand in
+    declared = sqlite_declared_types(conn, null_placeholders(sql) if params else sql)
+    return DiscoveredSchema(names, [sqlite_known_type(declared.get(n)) for n in names], declared_types=declared)
+
+
+DESCRIBERS = {"mssql": describe_mssql, "postgres": describe_postgres, "sqlite": describe_sqlite}
+
+
+class SchemaDiscovery:
+    """
+    Result schemas and row estimates of external-connection queries, found without running them.
+
+    Each dialect asks the source to describe the statement (see describe_*). The
+    result is cached per connection string and SQL hash for ttl seconds, failures
+    included, so the source is asked once per dashboard query, not per request.
+    Types the source cannot pin down (SQLite expressions, unbounded NUMERIC) stay
+    None and are inferred from the data when the query streams.
+    """
+
+    def __init__(self, enabled=True, ttl=300.0, max_entries=512, estimate_rows=True):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.estimate_rows = estimate_rows
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    @staticmethod
+    def key(conn_str, sql):
+        return conn_str, hashlib.sha1(normalize_sql(sql).encode()).hexdigest()
+
+    def discover(self, conn_str, sql, conn=None, native=None, params=None):
+        """
+        Cached DiscoveredSchema of sql, or None. On a miss the source is described
+        through conn (a DB-API connection); native, a NativeScanner, replaces the
+        column types with DuckDB's when it will stream the query itself. A bound
+        statement (params for its $n placeholders) is cached by its SQL alone, so
+        criteria changes reuse the description; the native scanner cannot bind.
+        """
+        if not self.enabled:
+            return None
+        key = self.key(conn_str, sql)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        discovered = None
+        sql = sql.strip().rstrip(";")
+        if conn is not None:
+            describe = DESCRIBERS.get(cursor_dialect(conn))
+            try:
+                if describe is not None:
+                    discovered = describe(conn, sql, self.estimate_rows, params)
+            except Exception as e:
+                logger.info(f"Schema discovery failed on {type(conn).__module__}: {e}")
+        if native is not None and not params:
+            native_schema = native.describe(conn_str, sql)
+            if native_schema is not None:
+                estimate = discovered.row_estimate if discovered is not None else None
+                declared = discovered.declared_types if discovered is not None else None
+                discovered = DiscoveredSchema(native_schema.names, native_schema.types, estimate, declared)
+
+        with self._lock:
+            if discovered is None:
+                self.failures += 1
+            self._entries[key] = (now, discovered)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return discovered
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures
+            }
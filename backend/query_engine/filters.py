@@ -1,11 +1,20 @@
 from datetime import datetime, timedelta
 import re
 
-# Yardımcı fonksiyon: SQL değerlerini güvenli formatlar
+from .bind_params import bind_value
+
+# Yardımcı fonksiyon: SQL değerlerini güvenli formatlar.
+# Bind modunda değer SQL'e gömülmez; render'ın parametre listesine eklenir ve $n döner.
 def format_sql_value(v):
     if v is None or v == "": return None
+    placeholder = bind_value(v)
+    if placeholder: return placeholder
     return str(v) if isinstance(v, (int, float)) else f"'{v}'"
 
+def format_sql_list(items):
+    """Liste elemanlarını IN (...) içeriği olarak formatlar; bind modunda her eleman bir parametredir."""
+    return ", ".join(bind_value(i) or (f"'{i}'" if isinstance(i, str) else str(i)) for i in items)
+
 def resolve_empty_value(f, empty_val_template, default_sql=""):
     if not empty_val_template: return default_sql
     return empty_val_template.replace("{{ field }}", f or "").replace("{{field}}", f or "")
@@ -22,20 +31,23 @@ def get_val_and_field(val, field_name=None):
 
 def filter_quote(val):
     v = val.value if hasattr(val, 'value') else val
-    if isinstance(v, (int, float)): return str(v)
-    if isinstance(v, list): return ", ".join(f"'{i}'" if isinstance(i, str) else str(i) for i in v)
+    if isinstance(v, list): return format_sql_list(v)
     if v is None: return "NULL"
+    placeholder = bind_value(v)
+    if placeholder: return placeholder
+    if isinstance(v, (int, float)): return str(v)
     return f"'{v}'"
 
 def filter_sql(val):
     v = val.value if hasattr(val, 'value') else val
     if v is None or v == "": return "NULL"
-    if isinstance(v, bool): return "1" if v else "0"
-    if isinstance(v, (int, float)): return str(v)
     if isinstance(v, list):
         if not v: return "NULL"
-        joined = ", ".join(f"'{i}'" if isinstance(i, str) else str(i) for i in v)
-        return f"({joined})"
+        return f"({format_sql_list(v)})"
+    if isinstance(v, bool): return bind_value(int(v)) or ("1" if v else "0")
+    placeholder = bind_value(v)
+    if placeholder: return placeholder
+    if isinstance(v, (int, float)): return str(v)
     return f"'{v}'"
 
 # --- Karşılaştırma Filtreleri (gt, lt, gte, lte, ne, eq, like) ---
@@ -65,7 +77,7 @@ def filter_ne(val, field_name=None):
     if v is None or v == "": return ""
     if isinstance(v, list):
         if not v: return ""
-        joined = ", ".join(f"'{i}'" if isinstance(i, str) else str(i) for i in v)
+        joined = format_sql_list(v)
         return f"{f} NOT IN ({joined})" if f else f"NOT IN ({joined})"
     formatted = format_sql_value(v)
     return f"{f} <> {formatted}" if f else f"<> {formatted}"
@@ -75,7 +87,7 @@ def filter_eq(val, field_name=None):
     if v is None or v == "": return ""
     if isinstance(v, list):
         if not v: return ""
-        joined = ", ".join(f"'{i}'" if isinstance(i, str) else str(i) for i in v)
+        joined = format_sql_list(v)
         return f"{f} IN ({joined})" if f else f"IN ({joined})"
     formatted = format_sql_value(v)
     return f"{f} = {formatted}" if f else f"= {formatted}"
@@ -83,7 +95,8 @@ def filter_eq(val, field_name=None):
 def filter_like(val, field_name=None):
     v, f = get_val_and_field(val, field_name)
     if v is None or v == "": return ""
-    return f"{f} LIKE '%{v}%'" if f else f"LIKE '%{v}%'"
+    pattern = bind_value(f"%{v}%") or f"'%{v}%'"
+    return f"{f} LIKE {pattern}" if f else f"LIKE {pattern}"
 
 # --- Aralık Filtreleri (between, start, end) ---
 
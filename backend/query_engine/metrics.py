@@ -0,0 +1,263 @@
+import os
+import time
+import bisect
+import logging
+import threading
+
+import pyarrow as pa
+
+from .cancellation import QueryCancelled
+
+logger = logging.getLogger("StreamFlightServer")
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Phases of a query that get a latency histogram
+PHASES = ("render", "schema_inference", "execution", "first_batch", "stream")
+
+PREFIX = "flight_"
+
+# Label used for queries that are not run from a template file, and for templates past max_templates
+ADHOC = "adhoc"
+OTHER = "other"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, the same shape Prometheus scrapes."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimates the q-quantile by interpolating inside its bucket, like histogram_quantile()."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 2),
+            "p95_ms": round(self.quantile(0.95) * 1000, 2),
+            "p99_ms": round(self.quantile(0.99) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2)
+        }
+
+
+class MetricsRegistry:
+    """
+    Per-phase latency histograms and throughput counters, labelled by template.
+
+    Histograms cover render, schema_inference, execution, first_batch (from the
+    do_get call to the first batch handed to Flight) and stream (the whole do_get).
+    Counters track rows, bytes and batches sent and queries by outcome. Gauges
+    (sessions, threads, open external connections, ...) are read from callbacks
+    when a snapshot is taken. At most max_templates template labels are kept;
+    later templates are folded into "other" so the series count stays bounded.
+
+    With prometheus_file set, the metrics are also written there in the
+    Prometheus text format every interval seconds, for a node_exporter
+    textfile collector to pick up.
+    """
+
+    def __init__(self, enabled=True, max_templates=200, prometheus_file=None, interval=15.0, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.max_templates = max_templates
+        self.prometheus_file = prometheus_file
+        self.interval = interval
+        self.buckets = tuple(buckets)
+        self._histograms = {}  # (phase, template) -> Histogram
+        self._counters = {}  # (name, labels) -> value
+        self._gauges = {}  # name -> (help, callback)
+        self._templates = set()
+        self._lock = threading.Lock()
+        self._writer = None
+        self.started_at = time.time()
+        if enabled and prometheus_file:
+            self._writer = threading.Thread(target=self._write_loop, name="metrics-writer", daemon=True)
+            self._writer.start()
+
+    def label(self, template) -> str:
+        """Template label for a query; adhoc SQL and templates past the cap share a label."""
+        if not template:
+            return ADHOC
+        with self._lock:
+            if template in self._templates:
+                return template
+            if len(self._templates) >= self.max_templates:
+                return OTHER
+            self._templates.add(template)
+        return template
+
+    def observe(self, phase: str, seconds: float, template=ADHOC):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get((phase, template))
+            if histogram is None:
+                histogram = self._histograms[(phase, template)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, callback, help_text=""):
+        """Registers a gauge whose value is read from callback() at snapshot time."""
+        self._gauges[name] = (help_text, callback)
+
+    def timed(self, phase: str, template=ADHOC):
+        return _Timer(self, phase, template)
+
+    def stream(self, reader, template=ADHOC, started=None) -> pa.RecordBatchReader:
+        """
+        Wraps a result reader so the batches it hands out are counted and the
+        time to the first batch and to the end of the stream are observed,
+        measured from started (the do_get call) when given.
+        """
+        if not self.enabled:
+            return reader
+        started = started or time.perf_counter()
+
+        def batches():
+            rows = nbytes = count = 0
+            status = "error"
+            try:
+                for batch in reader:
+                    if not count:
+                        self.observe("first_batch", time.perf_counter() - started, template)
+                    count += 1
+                    rows += batch.num_rows
+                    nbytes += batch.nbytes
+                    yield batch
+                status = "ok"
+            except (QueryCancelled, GeneratorExit):
+                status = "cancelled"
+                raise
+            finally:
+                self.observe("stream", time.perf_counter() - started, template)
+                self.inc("rows_sent_total", rows, template=template)
+                self.inc("bytes_sent_total", nbytes, template=template)
+                self.inc("batches_sent_total", count, template=template)
+                self.inc("queries_total", template=template, status=status)
+
+        return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+    def snapshot(self) -> dict:
+        """JSON view for the get_metrics action: latency summaries per phase and template, counters, gauges."""
+        with self._lock:
+            phases = {}
+            for (phase, template), histogram in sorted(self._histograms.items()):
+                phases.setdefault(phase, {})[template] = histogram.summary()
+            counters = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                labels = dict(labels)
+                template = labels.pop("template", ADHOC)
+                key = name if not labels else name + "{" + ",".join(f"{k}={v}" for k, v in labels.items()) + "}"
+                counters.setdefault(template, {})[key] = value
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "phases": phases,
+            "counters": counters,
+            "gauges": self._read_gauges()
+        }
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        if histograms:
+            name = PREFIX + "query_phase_seconds"
+            lines += [f"# HELP {name} Latency of each query phase by template.", f"# TYPE {name} histogram"]
+            for (phase, template), h in histograms:
+                labels = f'phase="{phase}",template="{_escape(template)}"'
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {h.sum}")
+                lines.append(f"{name}_count{{{labels}}} {h.count}")
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+            rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{PREFIX}{name}{{{rendered}}} {value}")
+
+        for name, value in self._read_gauges().items():
+            help_text = self._gauges[name][0]
+            if help_text:
+                lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines += [f"# TYPE {PREFIX}{name} gauge", f"{PREFIX}{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        """Writes the text exposition atomically, so a collector never reads a half-written file."""
+        path = path or self.prometheus_file
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def _read_gauges(self) -> dict:
+        values = {}
+        for name, (_, callback) in list(self._gauges.items()):
+            try:
+                values[name] = callback()
+            except Exception as e:
+                logger.warning(f"Reading gauge {name} failed: {e}")
+        return values
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write_prometheus()
+            except Exception as e:
+                logger.warning(f"Writing metrics to {self.prometheus_file} failed: {e}")
+
+
+class _Timer:
+    def __init__(self, registry, phase, template):
+        self.registry = registry
+        self.phase = phase
+        self.template = template
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.phase, time.perf_counter() - self.started, self.template)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
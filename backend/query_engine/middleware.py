@@ -0,0 +1,29 @@
+import pyarrow.flight as flight
+
+
+class HeadersMiddleware(flight.ServerMiddleware):
+    """Keeps the incoming request headers so handlers can read x- options."""
+
+    def __init__(self, headers):
+        self.headers = {}
+        for key, values in (headers or {}).items():
+            if not values:
+                continue
+            value = values[0]
+            if isinstance(value, bytes):
+                value = value.decode("utf-8", errors="replace")
+            self.headers[key.lower()] = value
+
+
+class HeadersMiddlewareFactory(flight.ServerMiddlewareFactory):
+    def start_call(self, info, headers):
+        return HeadersMiddleware(headers)
+
+
+def request_headers(context) -> dict:
+    """Lowercased first value of every header of the current call, or {}."""
+    try:
+        middleware = context.get_middleware("headers")
+    except Exception:
+        return {}
+    return middleware.headers if middleware is not None else {}
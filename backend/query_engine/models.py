@@ -11,6 +11,16 @@ class QueryCommand:
     session_id: str = "default"
     connection_id: Optional[str] = None
     already_rendered: bool = False
+    prepared_id: Optional[str] = None
+    result_ticket: bool = False
+    batching: Dict[str, Any] = field(default_factory=dict)
+    cache_result: bool = False
+    window: Dict[str, Any] = field(default_factory=dict)
+    query_id: Optional[str] = None
+    priority: Optional[str] = None
+    compression: Optional[Any] = None
+    bind_parameters: Optional[bool] = None
+    params: Optional[list] = None
     
     @classmethod
     def from_json(cls, json_str: str) -> 'QueryCommand':
@@ -21,7 +31,17 @@ class QueryCommand:
             query=data.get("query"),
             session_id=data.get("session_id", "default"),
             connection_id=data.get("connection_id"),
-            already_rendered=data.get("already_rendered", False)
+            already_rendered=data.get("already_rendered", False),
+            prepared_id=data.get("prepared_id"),
+            result_ticket=data.get("result_ticket", False),
+            batching=data.get("batching") or {},
+            cache_result=data.get("cache_result", False),
+            window=data.get("window") or {},
+            query_id=data.get("query_id") or data.get("queryId"),
+            priority=data.get("priority"),
+            compression=data.get("compression"),
+            bind_parameters=data.get("bind_parameters"),
+            params=data.get("params")
         )
 
 @dataclass
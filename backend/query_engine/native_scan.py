@@ -0,0 +1,203 @@
+import uuid
+import logging
+import threading
+
+import duckdb
+import pyarrow as pa
+
+from .cancellation import interrupting
+from .schema_cache import describe_schema
+
+logger = logging.getLogger("StreamFlightServer")
+
+
+class NativeScanner:
+    """
+    Pushes reader bodies and external queries down to DuckDB's own sqlite/postgres scanners.
+
+    The source is ATTACHed read-only and the SQL is run unchanged in the source's
+    dialect through sqlite_query()/postgres_query(), so rows never become Python
+    objects. Any failure (extension not installable, non-SELECT statement,
+    unsupported syntax) returns a falsy result and the caller falls back to the
+    DB-API cursor path. MSSQL has no DuckDB scanner and always falls back.
+
+    Requests only LOAD extensions that are already installed. Downloading them is a startup step:
+    pass autoinstall=True (or call install()) once, never from a render.
+    """
+
+    EXTENSIONS = {"sqlite": "sqlite", "postgres": "postgres"}
+    QUERY_FUNCTIONS = {"sqlite": "sqlite_query", "postgres": "postgres_query"}
+
+    def __init__(self, enabled=True, autoinstall=False):
+        self.enabled = enabled
+        self._unavailable = set()
+        self._lock = threading.Lock()
+        self.pushdowns = 0
+        self.fallbacks = 0
+        if enabled and autoinstall:
+            self.install()
+
+    def install(self):
+        """Installs the scanner extensions into DuckDB's extension directory; meant to run once at startup."""
+        duck = duckdb.connect(":memory:")
+        try:
+            for ext in self.EXTENSIONS.values():
+                try:
+                    duck.execute(f"INSTALL {ext}")
+                except Exception as e:
+                    logger.warning(f"Could not install DuckDB {ext} extension, using cursor fetch instead: {e}")
+        finally:
+            duck.close()
+
+    @staticmethod
+    def kind(conn_str: str):
+        """Returns 'sqlite' / 'postgres' for connection strings DuckDB can scan natively, else None."""
+        if conn_str.startswith(("postgres://", "postgresql://")):
+            return "postgres"
+        if conn_str.startswith(("sqlite://", "sqlite3://", "sqllite://")) or "://" not in conn_str:
+            return "sqlite"
+        return None
+
+    def materialize(self, ctx, name, conn_str, sql, parquet_path=None, cancel_token=None):
+        """
+        Loads the result of sql into the session as table `name` (or as a view over
+        parquet_path). Returns the row count, or None when the caller must fall back.
+        Cancelling cancel_token interrupts the scan.
+        """
+        kind = self.kind(conn_str) if self.enabled else None
+        if not kind:
+            return None
+
+        cur = ctx.cursor()
+        alias = None
+        try:
+            if not self._load(cur, kind):
+                return None
+            database = cur.execute("SELECT current_database()").fetchone()[0]
+            alias = self._attach(cur, kind, conn_str)
+            select = self._select(kind, alias, sql)
+
+            with interrupting(cancel_token, cur.interrupt):
+                if parquet_path:
+                    safe_path = str(parquet_path).replace("'", "''")
+                    cur.execute(f"COPY ({select}) TO '{safe_path}' (FORMAT parquet, COMPRESSION snappy)")
+                    cur.execute(f"CREATE OR REPLACE VIEW \"{database}\".main.{name} AS SELECT * FROM '{safe_path}'")
+                else:
+                    cur.execute(f"CREATE OR REPLACE TABLE \"{database}\".main.{name} AS {select}")
+            rows = cur.execute(f"SELECT COUNT(*) FROM \"{database}\".main.{name}").fetchone()[0]
+            self._count("pushdowns")
+            return rows
+        except Exception as e:
+            if cancel_token is not None and cancel_token.cancelled:
+                return None
+            self._count("fallbacks")
+            logger.warning(f"Native {kind} scan failed, falling back to cursor fetch: {e}")
+            return None
+        finally:
+            if alias:
+                try:
+                    cur.execute(f"DETACH {alias}")
+                except Exception:
+                    pass
+            cur.close()
+
+    def stream(self, conn_str, sql, batch_size=10000):
+        """Runs sql on a scratch DuckDB connection; returns a RecordBatchReader or None to fall back."""
+        kind = self.kind(conn_str) if self.enabled else None
+        if not kind:
+            return None
+
+        duck = duckdb.connect(":memory:")
+        try:
+            if not self._load(duck, kind):
+                duck.close()
+                return None
+            alias = self._attach(duck, kind, conn_str)
+            reader = duck.execute(self._select(kind, alias, sql)).to_arrow_reader(batch_size)
+        except Exception as e:
+            self._count("fallbacks")
+            logger.warning(f"Native {kind} scan failed, falling back to cursor fetch: {e}")
+            duck.close()
+            return None
+
+        self._count("pushdowns")
+
+        def batches():
+            # Keep the scratch connection alive for as long as the stream is read
+            try:
+                yield from reader
+            finally:
+                duck.close()
+
+        return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+    def describe(self, conn_str, sql):
+        """Arrow schema stream() would produce for sql, from DuckDB's plan alone; None if it would fall back."""
+        kind = self.kind(conn_str) if self.enabled else None
+        if not kind:
+            return None
+
+        duck = duckdb.connect(":memory:")
+        try:
+            if not self._load(duck, kind):
+                return None
+            alias = self._attach(duck, kind, conn_str)
+            return describe_schema(duck, self._select(kind, alias, sql))
+        except Exception as e:
+            logger.info(f"Native {kind} describe failed: {e}")
+            return None
+        finally:
+            duck.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "unavailable": sorted(self._unavailable),
+                "pushdowns": self.pushdowns,
+                "fallbacks": self.fallbacks
+            }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _load(self, conn, kind) -> bool:
+        ext = self.EXTENSIONS[kind]
+        with self._lock:
+            if kind in self._unavailable:
+                return False
+        try:
+            # LOAD would download a missing extension itself (autoinstall_known_extensions),
+            # so only extensions that are already installed are loaded on the request path
+            installed = conn.execute(
+                "SELECT bool_or(installed), bool_or(loaded) FROM duckdb_extensions() WHERE extension_name IN (?, ?)",
+                [ext, f"{ext}_scanner"]).fetchone()
+            if not installed[0]:
+                raise RuntimeError(f"DuckDB extension '{ext}' is not installed")
+            if not installed[1]:
+                conn.execute(f"LOAD {ext}")
+            return True
+        except Exception as e:
+            with self._lock:
+                if kind in self._unavailable:
+                    return False
+                # Remember the failure; readers must not retry (or download) on every render
+                self._unavailable.add(kind)
+            logger.warning(f"DuckDB {ext} scanner unavailable, using cursor fetch instead: {e}")
+            return False
+
+    @staticmethod
+    def _attach(conn, kind, conn_str) -> str:
+        alias = f"_src_{uuid.uuid4().hex[:12]}"
+        if kind == "sqlite":
+            target = conn_str.replace("sqllite://", "").replace("sqlite3://", "").replace("sqlite://", "")
+        else:
+            target = conn_str
+        target = target.replace("'", "''")
+        conn.execute(f"ATTACH '{target}' AS {alias} (TYPE {kind}, READ_ONLY)")
+        return alias
+
+    def _select(self, kind, alias, sql) -> str:
+        escaped = sql.strip().rstrip(';').replace("'", "''")
+        return f"SELECT * FROM {self.QUERY_FUNCTIONS[kind]}('{alias}', '{escaped}')"
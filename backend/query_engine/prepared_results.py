@@ -0,0 +1,116 @@
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("StreamFlightServer")
+
+
+class PreparedQuery:
+    """
+    A single in-flight or finished render of a QueryCommand.
+
+    The render runs on its own thread so that `{% python %}` output can be streamed
+    through log_queue while it executes. A `None` item on the queue marks the end
+    of the render; `result` then holds the final SQL or the error.
+    """
+
+    def __init__(self, cmd, db_conn):
+        self.id = uuid.uuid4().hex
+        self.cmd = cmd
+        self.db_conn = db_conn
+        self.log_queue = queue.Queue()
+        self.result = {"sql": None, "params": None, "error": None, "has_side_effects": False}
+        self.registered_tables = {}
+        self.catalog_changes = {}  # name -> schema/signature of tables the render (re)defined
+        self.first_item = None
+        self.thread = None
+        self.cancel_token = None
+        self.created_at = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(list(self.registered_tables.values()))
+
+    @property
+    def done(self) -> bool:
+        return self.thread is not None and not self.thread.is_alive()
+
+
+class PreparedResultRegistry:
+    """
+    Holds renders done in get_flight_info until do_get streams them.
+
+    Entries are single-use and keyed by an opaque ticket id. Finished entries
+    older than ttl seconds are dropped; a render still running (live Python
+    output) is kept until it finishes, so its ticket never starts a second,
+    concurrent render of the same blocks. Each session keeps at most
+    max_per_session entries: putting one more evicts the session's oldest,
+    cancelling it first if it is still rendering so its thread stops. The
+    tables a render registered stay in the session either way. A ticket whose
+    entry is gone fails (see StreamFlightServer.do_get) rather than re-running
+    its blocks.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_per_session: int = 16):
+        self.ttl = ttl
+        self.max_per_session = max_per_session
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def put(self, entry: PreparedQuery) -> str:
+        with self._lock:
+            self._entries[entry.id] = entry
+            self._sweep_locked()
+            own = [e for e in self._entries.values() if e.cmd.session_id == entry.cmd.session_id]
+            surplus = own[:max(0, len(own) - self.max_per_session)]
+            for old in surplus:
+                del self._entries[old.id]
+            self.evicted += len(surplus)
+        for old in surplus:
+            if old.cancel_token is not None and not old.done:
+                old.cancel_token.cancel("prepared result evicted")
+            logger.info(f"[{old.cmd.session_id}] Prepared result {old.id} evicted")
+        return entry.id
+
+    def take(self, prepared_id: str, session_id: str = None):
+        with self._lock:
+            self._sweep_locked()
+            entry = self._entries.get(prepared_id)
+            if entry is None or (session_id and entry.cmd.session_id != session_id):
+                self.misses += 1
+                return None
+            del self._entries[prepared_id]
+            self.hits += 1
+            return entry
+
+    def _sweep_locked(self):
+        cutoff = time.monotonic() - self.ttl
+        for entry in list(self._entries.values()):
+            if entry.created_at >= cutoff:
+                break
+            if entry.thread is not None and not entry.done:
+                continue
+            del self._entries[entry.id]
+            self.expired += 1
+            logger.info(f"Prepared result {entry.id} expired")
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._sweep_locked()
+            return {
+                "pending": len(self._entries),
+                "pending_bytes": sum(e.nbytes for e in self._entries.values()),
+                "ttl": self.ttl,
+                "max_per_session": self.max_per_session,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evicted": self.evicted
+            }
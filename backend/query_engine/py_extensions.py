@@ -1,10 +1,11 @@
 import sys
 import threading
 import logging
-from typing import Any, List, Dict, Iterable, IO, Optional
+from typing import Any, List, Dict, Iterable, Iterator, IO, Optional
 from jinja2 import nodes
 from jinja2.ext import Extension
 import textwrap
+import itertools
 import os
 import tempfile
 import subprocess
@@ -18,12 +19,26 @@ from datetime import datetime
 # Import context_storage from reader_extensions to access shared state
 # We use a try-except block to avoid circular import issues if this module is run as a script (e.g. in subprocess)
 try:
-    from .reader_extensions import context_storage, logger
+    from .reader_extensions import context_storage, logger, track_registration, track_catalog_change, literal_rendering
+    from .cancellation import QueryCancelled, check as check_cancelled
+    from .python_workers import ResultConversionError
 except ImportError:
     # Fallback for when running as standalone script or in subprocess where reader_extensions isn't needed/available
     context_storage = None
+    track_registration = None
+    track_catalog_change = None
+    literal_rendering = None
     logger = logging.getLogger("PythonExtension")
 
+    class QueryCancelled(Exception):
+        pass
+
+    class ResultConversionError(Exception):
+        pass
+
+    def check_cancelled(token, kind=None):
+        pass
+
 try:
     import pyarrow as pa
     HAS_ARROW = True
@@ -45,201 +60,263 @@ except ImportError:
     pl = None
     HAS_POLARS = False
 
+# Rows per chunk when streaming record iterables (lists/generators of dicts or scalars)
+DEFAULT_CHUNK_ROWS = 65536
+
+# Errors pyarrow raises when a column's values do not share one inferable type
+_INFERENCE_ERRORS = (TypeError, ValueError, OverflowError) + (
+    (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) if HAS_ARROW else ())
+
+
 class ArrowConverter:
-    """Helper class to convert various Python objects to Arrow Tables."""
-    
-    def __init__(self):
-        pass
+    """
+    Helper class to convert various Python objects to Arrow data.
+
+    Arrow tables and DataFrames are already in memory and are converted whole.
+    Record iterables (lists or generators of dicts or scalars, RecordBatchReaders,
+    generators of RecordBatches/DataFrames) are consumed `chunk_rows` at a time
+    and each chunk becomes a RecordBatch column by column, using pyarrow's own
+    type inference: nested lists/dicts become list/struct columns, Decimal becomes
+    decimal128 and a column whose values share no type falls back to strings.
+
+    The running schema only grows: a chunk that brings a new column or a wider
+    type (null -> anything, int -> double, decimal(5,2) -> decimal(20,2), mixed
+    -> string) widens it and later batches are conformed to it. `register()`
+    applies each widening to the DuckDB table before inserting the chunk, so a
+    large generator is never held in memory as Python objects or as a pa.Table.
+    """
+
+    def __init__(self, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.schema = None
 
     def convert_to_arrow_table(self, input_data: Any) -> pa.Table:
         """Convert input data to Arrow Table"""
+        table = self.as_table(input_data)
+        if table is not None:
+            return table
+        batches = list(self.iter_batches(input_data))
+        if not batches:
+            # Empty input - return empty table
+            return pa.table([])
+        # Earlier batches may predate a widening of the schema
+        return pa.Table.from_batches([self._conform(b, self.schema) for b in batches], self.schema)
+
+    def as_table(self, input_data: Any) -> Optional[pa.Table]:
+        """Returns in-memory Arrow/DataFrame results as a table, or None for record iterables to stream."""
         if input_data is None:
-             return pa.Table.from_pylist([])
+            return pa.Table.from_pylist([])
 
         # Check for Arrow types
-        if HAS_ARROW and pa is not None:
-            if isinstance(input_data, pa.Table):
-                return input_data
-            if isinstance(input_data, pa.RecordBatch):
-                return pa.Table.from_batches([input_data])
-            # Check for list of RecordBatches
-            if isinstance(input_data, list) and len(input_data) > 0 and isinstance(input_data[0], pa.RecordBatch):
-                 return pa.Table.from_batches(input_data)
+        if isinstance(input_data, pa.Table):
+            return input_data
+        if isinstance(input_data, pa.RecordBatch):
+            return pa.Table.from_batches([input_data])
+        # Check for list of RecordBatches
+        if isinstance(input_data, list) and len(input_data) > 0 and isinstance(input_data[0], pa.RecordBatch):
+            return pa.Table.from_batches(input_data)
+        if isinstance(input_data, pa.RecordBatchReader):
+            return None
 
         # Check for pandas/polars DataFrames
         try:
             # Check for pandas DataFrame
             if HAS_PANDAS and pd is not None and isinstance(input_data, pd.DataFrame):
                 return pa.Table.from_pandas(input_data, preserve_index=False)
-            
+
             # Check for polars DataFrame
             if HAS_POLARS and pl is not None and isinstance(input_data, pl.DataFrame):
                 return input_data.to_arrow()
         except Exception:
             # Ignore errors during specific type checks and fall through
             pass
-        
+
         # Fallback: check by duck typing for .to_arrow() (e.g. Polars, other dataframe libs)
         if hasattr(input_data, 'to_arrow') and callable(getattr(input_data, 'to_arrow')):
             return input_data.to_arrow()
-        
+
         # Fallback: check by duck typing for pandas-like (has index, columns, to_dict)
         if hasattr(input_data, 'index') and hasattr(input_data, 'columns') and hasattr(input_data, 'to_dict'):
-             # Try to treat as pandas-like
-             if HAS_PANDAS and pd is not None:
+            # Try to treat as pandas-like
+            if HAS_PANDAS and pd is not None:
                 try:
                     return pa.Table.from_pandas(input_data, preserve_index=False)
-                except:
+                except Exception:
                     pass
 
         # Handle iterables (including lists of dicts, generators)
         # Must be last check because specialized types above might also be iterable
         if hasattr(input_data, '__iter__') and not isinstance(input_data, (str, bytes)):
-            # Convert to list of records first to ensure we can iterate multiple times if needed for schema inference
+            return None
+
+        raise ValueError(f"Unsupported return type or failed conversion: {type(input_data)}")
+
+    def iter_batches(self, input_data: Any) -> Iterator[pa.RecordBatch]:
+        """Yields RecordBatches conformed to the running schema (self.schema), which only widens."""
+        table = self.as_table(input_data)
+        if table is not None:
+            chunks = iter([table.to_batches()])
+        else:
+            iterator = iter(input_data)
+            chunks = iter(lambda: list(itertools.islice(iterator, self.chunk_rows)), [])
+
+        for chunk in chunks:
+            for batch in self._chunk_to_batches(chunk):
+                self.schema = self._widen_schema(self.schema, batch.schema)
+                yield self._conform(batch, self.schema)
+
+    def register(self, ctx, name: str, input_data: Any, cancel_token=None) -> Optional[int]:
+        """
+        Streams a record iterable into the DuckDB table `name` chunk by chunk and
+        returns its row count (None if the input had no rows). A widened schema is
+        applied with ALTER TABLE before the chunk that needs it is inserted, and
+        the query's cancel token is checked between chunks.
+        """
+        chunk_view = f"__arrow_chunk_{uuid.uuid4().hex}"
+        created = None
+        rows = None
+        try:
+            for batch in self.iter_batches(input_data):
+                check_cancelled(cancel_token)
+                ctx.register(chunk_view, batch)
+                if created is None:
+                    ctx.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM {chunk_view}")
+                    rows = 0
+                elif not batch.schema.equals(created):
+                    duck_types = {r[0]: r[1] for r in ctx.execute(f"DESCRIBE SELECT * FROM {chunk_view}").fetchall()}
+                    for field in batch.schema:
+                        column = '"' + field.name.replace('"', '""') + '"'
+                        index = created.get_field_index(field.name)
+                        if index < 0:
+                            ctx.execute(f"ALTER TABLE {name} ADD COLUMN {column} {duck_types[field.name]}")
+                        elif created.field(index).type != field.type:
+                            ctx.execute(f"ALTER TABLE {name} ALTER COLUMN {column} TYPE {duck_types[field.name]}")
+                if created is not None:
+                    ctx.execute(f"INSERT INTO {name} BY NAME SELECT * FROM {chunk_view}")
+                ctx.unregister(chunk_view)
+                created = batch.schema
+                rows += batch.num_rows
+        finally:
             try:
-                records = list(input_data)
+                ctx.unregister(chunk_view)
             except Exception:
-                 raise ValueError(f"Could not convert iterable to list: {type(input_data)}")
+                pass
+        return rows
 
-            if not records:
-                # Empty input - return empty table
-                return pa.table([])
-            
-            # Collect records into batches for efficient Arrow processing
-            batch_size = 10000
-            all_batches = []
-            schema = None
-            
-            for i in range(0, len(records), batch_size):
-                batch_records = records[i:i + batch_size]
-                
-                if schema is None:
-                    schema = self._infer_arrow_schema(batch_records)
-                
-                batch = self._records_to_arrow_batch(batch_records, schema)
-                all_batches.append(batch)
-            
-            if not all_batches:
-                # No data - return empty table
-                return pa.table([])
-            
-            # Combine all batches into a table
-            return pa.Table.from_batches(all_batches, schema=schema)
-        
-        raise ValueError(f"Unsupported return type or failed conversion: {type(input_data)}")
+    def _chunk_to_batches(self, chunk: List[Any]) -> Iterator[pa.RecordBatch]:
+        """Turns one chunk of an iterable into RecordBatches."""
+        first = chunk[0]
+        if isinstance(first, pa.RecordBatch):
+            yield from chunk
+        elif isinstance(first, pa.Table) or self._is_frame(first):
+            # Generator of DataFrame/Table pieces
+            for piece in chunk:
+                yield from self.as_table(piece).to_batches()
+        elif isinstance(first, dict):
+            yield self._records_to_batch(chunk)
+        else:
+            # Handle scalar list case (single column named 'value')
+            yield pa.record_batch([self._to_array(chunk)], names=['value'])
 
-    def _infer_arrow_schema(self, records: List[Dict[str, Any]]) -> pa.Schema:
-        """Infer Arrow schema from a sample of records"""
-        if not records:
-            return pa.schema([])
-        
-        # Collect all unique field names
-        # Collect all unique field names, preserving order
-        field_names = {}
-        for record in records[:100]:  # Sample first 100 records for schema inference
-            if isinstance(record, dict):
-                for key in record.keys():
-                    if key not in field_names:
-                        field_names[key] = True
-            else:
-                 # Handle non-dict records if possible? 
-                 # For now assuming list of dicts. If list of primitives, this will fail.
-                 pass
-        
-        if not field_names and records:
-             # Maybe list of scalars?
-             return pa.schema([('value', self._infer_arrow_type(records[:100]))])
-
-        fields = []
-        for field_name in field_names:
-            # Sample values for type inference
-            sample_values = []
-            for record in records[:100]:
-                if isinstance(record, dict) and field_name in record and record[field_name] is not None:
-                    sample_values.append(record[field_name])
-            
-            # Infer type from sample values
-            arrow_type = self._infer_arrow_type(sample_values)
-            fields.append(pa.field(field_name, arrow_type, nullable=True))
-        
-        return pa.schema(fields)
+    @staticmethod
+    def _is_frame(value: Any) -> bool:
+        return (HAS_PANDAS and isinstance(value, pd.DataFrame)) or (HAS_POLARS and isinstance(value, pl.DataFrame))
 
-    def _infer_arrow_type(self, sample_values: List[Any]) -> pa.DataType:
-        """Infer Arrow data type from sample values"""
-        if not sample_values:
+    def _records_to_batch(self, records: List[Dict[str, Any]]) -> pa.RecordBatch:
+        """Convert a chunk of dict records to a RecordBatch, one list comprehension per column"""
+        try:
+            # Collect all unique field names, preserving order
+            names = list(dict.fromkeys(itertools.chain.from_iterable(records)))
+            columns = [[record.get(n) for record in records] for n in names]
+        except AttributeError:
+            # Some records are not dicts; they contribute nulls
+            names = list(dict.fromkeys(k for r in records if isinstance(r, dict) for k in r))
+            columns = [[r.get(n) if isinstance(r, dict) else None for r in records] for n in names]
+        return pa.record_batch([self._to_array(c) for c in columns], names=[str(n) for n in names])
+
+    @staticmethod
+    def _to_array(values: List[Any]) -> pa.Array:
+        try:
+            return pa.array(values)
+        except _INFERENCE_ERRORS:
+            # Fallback to string conversion if the values share no Arrow type
+            return pa.array([str(v) if v is not None else None for v in values], type=pa.string())
+
+    @staticmethod
+    def widen_type(current: pa.DataType, new: pa.DataType) -> pa.DataType:
+        """Smallest type holding both, or string when they have no common Arrow type."""
+        if current.equals(new):
+            return current
+        try:
+            return pa.unify_schemas([pa.schema([('v', current)]), pa.schema([('v', new)])],
+                                    promote_options='permissive').field('v').type
+        except _INFERENCE_ERRORS:
             return pa.string()
-        
-        # Check for boolean
-        if all(isinstance(v, bool) for v in sample_values):
-            return pa.bool_()
-        
-        # Check for int64
-        if all(isinstance(v, int) and not isinstance(v, bool) for v in sample_values):
-            return pa.int64()
-        
-        # Check for float64
-        if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in sample_values):
-            return pa.float64()
-        
-        # Check for timestamp
-        import datetime
-        if all(isinstance(v, datetime.datetime) for v in sample_values):
-            return pa.timestamp('us')
-        
-        # Check for date
-        if all(isinstance(v, datetime.date) for v in sample_values):
-            return pa.date32()
-        
-        # Default to string
-        return pa.string()
 
-    def _records_to_arrow_batch(self, records: List[Dict[str, Any]], schema: pa.Schema) -> pa.RecordBatch:
-        """Convert a list of records to an Arrow RecordBatch"""
-        arrays = []
-        
-        # Handle scalar list case (single column named 'value')
-        if len(schema) == 1 and schema[0].name == 'value' and records and not isinstance(records[0], dict):
-             # Scalar conversion
-             try:
-                 return pa.RecordBatch.from_arrays([pa.array(records)], schema=schema)
-             except:
-                 # Fallback
-                 return pa.RecordBatch.from_arrays([pa.array([str(r) for r in records])], schema=pa.schema([('value', pa.string())]))
+    def _widen_schema(self, schema: Optional[pa.Schema], new: pa.Schema) -> pa.Schema:
+        if schema is None:
+            return new
+        if schema.equals(new):
+            return schema
+        fields = {f.name: f.type for f in schema}
+        for field in new:
+            fields[field.name] = self.widen_type(fields[field.name], field.type) if field.name in fields else field.type
+        return pa.schema(list(fields.items()))
 
+    @staticmethod
+    def _conform(batch: pa.RecordBatch, schema: pa.Schema) -> pa.RecordBatch:
+        """Adds missing columns as nulls and casts narrower columns up to the schema."""
+        if batch.schema.equals(schema):
+            return batch
+        arrays = []
         for field in schema:
-            column_data = []
-            for record in records:
-                if isinstance(record, dict):
-                    value = record.get(field.name)
-                    column_data.append(value)
-                else: 
-                    column_data.append(None)
-            
-            # Create Arrow array with proper type conversion
-            try:
-                if field.type == pa.bool_():
-                    array = pa.array(column_data, type=pa.bool_())
-                elif field.type == pa.int64():
-                    array = pa.array(column_data, type=pa.int64())
-                elif field.type == pa.float64():
-                    array = pa.array(column_data, type=pa.float64())
-                elif field.type == pa.timestamp('us'):
-                    array = pa.array(column_data, type=pa.timestamp('us'))
-                elif field.type == pa.date32():
-                    array = pa.array(column_data, type=pa.date32())
-                else:
-                    # Convert to string for safety
-                    string_data = [str(v) if v is not None else None for v in column_data]
-                    array = pa.array(string_data, type=pa.string())
-            except Exception:
-                # Fallback to string conversion if type conversion fails
-                string_data = [str(v) if v is not None else None for v in column_data]
-                array = pa.array(string_data, type=pa.string())
-            
-            arrays.append(array)
-        
+            index = batch.schema.get_field_index(field.name)
+            if index < 0:
+                arrays.append(pa.nulls(batch.num_rows, field.type))
+                continue
+            column = batch.column(index)
+            if not column.type.equals(field.type):
+                try:
+                    column = column.cast(field.type)
+                except _INFERENCE_ERRORS:
+                    column = pa.array([str(v) if v is not None else None for v in column.to_pylist()], type=pa.string())
+            arrays.append(column)
         return pa.record_batch(arrays, schema=schema)
 
+
+def block_globals(ctx, print_func) -> dict:
+    """Namespace a {% python %} block runs in, inside the server or in a worker process."""
+    try:
+        import duckdb
+    except ImportError:
+        duckdb = None
+
+    return {
+        "ctx": ctx,      # The request: active duckdb connection
+        "duckdb": duckdb,
+        "pa": pa,
+        "pd": pd,
+        "json": __import__('json'),
+        "datetime": __import__('datetime'),
+        "print": print_func
+    }
+
+
+def compile_block(code: str, exec_globals: dict):
+    """Defines the block's code as a function in exec_globals (so `return` is allowed) and returns it."""
+    dedented_code = textwrap.dedent(code)
+    func_name = f"_python_block_{hash(code) & 0xFFFFFFFF}"
+    indented_code = textwrap.indent(dedented_code, "    ")
+
+    # We use a trick to compile with 'return' allowed: wrap in function
+    script_full = f"""
+def {func_name}():
+{indented_code}
+"""
+    exec(script_full, exec_globals)
+    return exec_globals[func_name]
+
+
 class PythonExtension(Extension):
     """
     Custom python tag for executing arbitrary python code and registering results:
@@ -247,6 +324,10 @@ class PythonExtension(Extension):
     data = [{"id": 1, "value": "A"}]
     return data
     {% endpython %}
+
+    Optional keywords choose where and how long the block runs when a
+    PythonWorkerPool is configured: mode='process' | 'inline', timeout=<seconds>,
+    cpu_seconds=<seconds>.
     """
     tags = {"python"}
 
@@ -254,6 +335,7 @@ class PythonExtension(Extension):
         lineno = next(parser.stream).lineno
         
         name_node = None
+        options = []
         
         while parser.stream.current.type != "block_end":
             if parser.stream.skip_if("comma"):
@@ -267,6 +349,8 @@ class PythonExtension(Extension):
                 
                 if key == 'name':
                     name_node = val_node
+                elif key in ('mode', 'timeout', 'cpu_seconds'):
+                    options.append(nodes.Keyword(key, val_node))
             else:
                 # positional argument
                 if name_node is None:
@@ -281,18 +365,18 @@ class PythonExtension(Extension):
         body = parser.parse_statements(["name:endpython"], drop_needle=True)
 
         return nodes.CallBlock(
-            self.call_method("_register", [name_node]),
+            self.call_method("_register", [name_node], options),
             [], [], body
         ).set_lineno(lineno)
 
-    def _register(self, name, caller):
-        code = caller()
+    def _register(self, name, caller, mode=None, timeout=None, cpu_seconds=None):
+        if literal_rendering:
+            with literal_rendering():
+                code = caller()
+        else:
+            code = caller()
         if not code.strip():
             raise ValueError("Python block is empty")
-            
-        dedented_code = textwrap.dedent(code)
-        func_name = f"_python_block_{hash(code) & 0xFFFFFFFF}"
-        indented_code = textwrap.indent(dedented_code, "    ")
         
         # In-Process Execution Strategy
         # We define a function wrapping the users code, then execute it.
@@ -303,9 +387,17 @@ class PythonExtension(Extension):
         # Get active DuckDB context from thread-local storage
         ctx = getattr(context_storage, "db_conn", None) if context_storage else None
         log_queue = getattr(context_storage, "log_queue", None) if context_storage else None
+        cancel_token = getattr(context_storage, "cancel_token", None) if context_storage else None
+        check_cancelled(cancel_token)
+        workers = getattr(context_storage, "python_workers", None) if context_storage else None
+        if track_catalog_change:
+            # Arbitrary code with ctx: any table in the session may have changed
+            track_catalog_change(None)
         
         # Custom print function to capture output in real-time
         def custom_print(*args, **kwargs):
+            # Every print is a cancellation point for long-running user code
+            check_cancelled(cancel_token, "python")
             sep = kwargs.get('sep', ' ')
             end = kwargs.get('end', '\n')
             file = kwargs.get('file', None)
@@ -326,41 +418,22 @@ class PythonExtension(Extension):
                 # Fallback logging
                 logger.info(f"[USER PRINT]: {msg.strip()}")
 
-        # Ensure imports are available
-        try:
-            import duckdb
-        except ImportError:
-            duckdb = None
-
-        # Build namespace
-        exec_globals = {
-            "ctx": ctx,      # The request: active duckdb connection
-            "duckdb": duckdb, 
-            "pa": pa,
-            "pd": pd,
-            "json": __import__('json'),
-            "datetime": __import__('datetime'),
-            "print": custom_print
-        }
-
-        # 2. Def Function Wrapper
-        # function_def = f"def {func_name}():\n{indented_code}"
-        
-        # We use a trick to compile with 'return' allowed: wrap in function
-        script_full = f"""
-def {func_name}():
-{indented_code}
-"""
-        
         try:
-            # Execute definition to create the function in exec_globals
-            exec(script_full, exec_globals)
-            
-            # Retrieve the function
-            user_func = exec_globals[func_name]
-            
-            # 3. Call Function
-            result = user_func()
+            if workers is not None and workers.use_process(mode):
+                # 2-3. Run in a warm worker process; prints are relayed into log_queue
+                try:
+                    result = workers.run(code, name, ctx, log_queue, cancel_token, timeout, cpu_seconds)
+                except ResultConversionError as e:
+                    if log_queue:
+                        log_queue.put(f"[SYSTEM ERROR]: Failed to convert Python result to Arrow table: {e}\n")
+                    logger.error(f"Failed to convert result: {e}")
+                    return ""
+            else:
+                # 2. Def Function Wrapper, in a namespace with our print
+                user_func = compile_block(code, block_globals(ctx, custom_print))
+
+                # 3. Call Function
+                result = user_func()
             
             # If no result returned (implicit None), we assume side-effects only and stop here.
             if result is None:
@@ -414,7 +487,7 @@ def {func_name}():
                          log_queue.put(f"\n[SYSTEM]: Binary output saved to {safe_filename}\n")
                     
                     # Return special marker for frontend
-                    return f"-- [DOWNLOAD_FILE]:/temp_downloads/{subdir_id}/{safe_filename}"
+                    return f"-- [DOWNLOAD_FILE]:/temp_downloads/{subdir_id}/{safe_filename}\n"
 
                 except Exception as e:
                     logger.error(f"Failed to save binary output: {e}")
@@ -427,9 +500,9 @@ def {func_name}():
                 converter = ArrowConverter()
                 table = None
                 
-                # A. Conversion Phase
+                # A. Conversion Phase (Arrow/DataFrame results; record iterables are streamed in B)
                 try:
-                    table = converter.convert_to_arrow_table(result)
+                    table = converter.as_table(result)
                 except Exception as e:
                      # This is a user-data error (cannot convert what they returned)
                      if log_queue:
@@ -438,7 +511,7 @@ def {func_name}():
                      return "" # Don't crash, just don't register
 
                 # B. Registration Phase
-                if table:
+                if table is None or table:
                     try:
                         # Drop existing
                         try:
@@ -449,27 +522,42 @@ def {func_name}():
                             
                         # Register New
                         try:
-                             ctx.register(name, table)
+                             if table is not None:
+                                 ctx.register(name, table)
+                                 if track_registration:
+                                     track_registration(name, table)
+                                 row_count = table.num_rows
+                             else:
+                                 # Chunk by chunk into a DuckDB table; no pa.Table of the whole result
+                                 row_count = converter.register(ctx, name, result, cancel_token)
+                        except QueryCancelled:
+                             raise
                         except Exception as reg_err:
                              # Warning: DuckDB might fail if table has 0 columns
                              if log_queue:
                                   log_queue.put(f"[SYSTEM ERROR]: Failed to register result table '{name}' in DuckDB: {reg_err}\n")
                              raise reg_err
+                        if row_count is None:
+                             # Empty iterable: nothing to register
+                             return ""
 
                         sid = getattr(context_storage, "session_id", "unknown")
                         logger.info(f"[{sid}] Registered result of '{name}'")
                         context_storage.has_side_effects = True
                         
-                        row_count = table.num_rows
                         if log_queue:
                              log_queue.put(f"\nTable '{name}' registered successfully ({row_count} rows).\n")
                              
+                    except QueryCancelled:
+                        raise
                     except Exception as e:
                         # Log but don't crash the server thread if possible, unless critical
                         logger.error(f"Registration error: {e}")
             
             return ""
 
+        except QueryCancelled:
+            raise
         except Exception as e:
             # Runtime error in user code
             error_msg = str(e)
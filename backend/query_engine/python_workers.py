@@ -0,0 +1,448 @@
+import io
+import os
+import re
+import sys
+import time
+import uuid
+import shutil
+import signal
+import logging
+import tempfile
+import threading
+import traceback
+import contextlib
+import multiprocessing
+
+import pyarrow as pa
+
+from .cancellation import check as check_cancelled
+
+logger = logging.getLogger("StreamFlightServer")
+
+# Candidate table names in a block's source; only session tables among them are shipped to the worker
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+MODES = ("inline", "process")
+
+
+class ResultConversionError(Exception):
+    """The block ran, but what it returned could not be turned into an Arrow table."""
+
+
+class PythonBlockError(RuntimeError):
+    """The block's own code raised; the worker that reported it is still healthy."""
+
+
+class CpuLimitExceeded(Exception):
+    pass
+
+
+def _shared_dir() -> str:
+    """tmpfs when available, so exchanged Arrow files live in shared memory rather than on disk."""
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return shm
+    return tempfile.gettempdir()
+
+
+class _Worker:
+    def __init__(self, mp, memory_mb):
+        self.conn, child = mp.Pipe()
+        self.process = mp.Process(target=_worker_main, args=(child, memory_mb), name="python-block-worker", daemon=True)
+        self.process.start()
+        child.close()
+        self.tasks = 0
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(5)
+        except Exception:
+            pass
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.process.join(2)
+        except Exception:
+            pass
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class PythonWorkerPool:
+    """
+    Runs `{% python %}` blocks in warm worker processes instead of the server process.
+
+    In "process" mode a CPU-heavy block holds its own interpreter's GIL, not the
+    server's. Session tables the block's source mentions are written once to
+    Arrow IPC files in shared memory (/dev/shm) and memory-mapped by the worker,
+    where `ctx` is a private DuckDB connection with those tables registered; the
+    returned result travels back the same way and is registered in the session
+    without another copy. Statements a block runs against `ctx` therefore do not
+    change the session itself; only the returned table does. print() output is
+    relayed line by line into the render's log queue.
+
+    Each block runs under a wall-clock timeout and optionally an RLIMIT_CPU
+    budget (cpu_seconds); workers get an RLIMIT_AS cap of memory_mb. A block
+    that times out or is cancelled has its worker killed and replaced. Workers
+    are recycled after max_tasks blocks. "inline" mode keeps the old in-process
+    execution; a block can pick its mode with `{% python 'name', mode='process' %}`.
+    """
+
+    def __init__(self, mode="inline", processes=2, timeout=300.0, cpu_seconds=None, memory_mb=None,
+                 max_tasks=200, checkout_timeout=60.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown python block mode '{mode}' (expected one of {MODES})")
+        self.mode = mode
+        self.processes = processes
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_tasks = max_tasks
+        self.checkout_timeout = checkout_timeout
+        self._mp = multiprocessing.get_context("spawn")
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._dir = None
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.crashes = 0
+        self.started = 0
+        self.exported_bytes = 0
+        self.returned_bytes = 0
+        if mode == "process":
+            threading.Thread(target=self._warm, name="python-worker-warmup", daemon=True).start()
+
+    def use_process(self, mode=None) -> bool:
+        return (mode or self.mode) == "process"
+
+    def run(self, code, name, ctx, log_queue=None, cancel_token=None, timeout=None, cpu_seconds=None):
+        """Runs one block in a worker; returns a pa.Table, an io.BytesIO (file output) or None."""
+        timeout = float(timeout or self.timeout)
+        cpu_seconds = cpu_seconds or self.cpu_seconds
+        deadline = time.monotonic() + timeout
+        task_dir = os.path.join(self._shared_root(), uuid.uuid4().hex)
+        os.makedirs(task_dir)
+        try:
+            tables = self._export(ctx, code, task_dir, cancel_token)
+            worker = self._checkout()
+            broken = True
+            try:
+                worker.tasks += 1
+                worker.conn.send({
+                    "code": code, "name": name, "tables": tables, "dir": task_dir, "cpu_seconds": cpu_seconds
+                })
+                try:
+                    result = self._relay(worker, log_queue, cancel_token, deadline, timeout)
+                except (PythonBlockError, ResultConversionError):
+                    # The worker reported the failure itself and can take the next block
+                    broken = False
+                    raise
+                broken = False
+                return result
+            finally:
+                self._checkin(worker, broken)
+        finally:
+            # Mapped result buffers stay valid after the files are unlinked
+            shutil.rmtree(task_dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "mode": self.mode,
+                "processes": self.processes,
+                "workers": self._size,
+                "idle": len(self._idle),
+                "timeout": self.timeout,
+                "cpu_seconds": self.cpu_seconds,
+                "memory_mb": self.memory_mb,
+                "runs": self.runs,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled,
+                "crashes": self.crashes,
+                "workers_started": self.started,
+                "exported_bytes": self.exported_bytes,
+                "returned_bytes": self.returned_bytes
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.stop()
+        if self._dir:
+            shutil.rmtree(self._dir, ignore_errors=True)
+
+    def _shared_root(self) -> str:
+        with self._cond:
+            if self._dir is None:
+                self._dir = tempfile.mkdtemp(prefix="flight_python_", dir=_shared_dir())
+            return self._dir
+
+    def _export(self, ctx, code, task_dir, cancel_token) -> dict:
+        """Writes the session tables named in code to Arrow IPC files; returns {name: path}."""
+        if ctx is None:
+            return {}
+        mentioned = {word.lower() for word in IDENTIFIER.findall(code)}
+        rows = ctx.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = 'main'").fetchall()
+        tables = {}
+        for (table,) in rows:
+            if table.lower() not in mentioned:
+                continue
+            check_cancelled(cancel_token, "python")
+            path = os.path.join(task_dir, f"in_{len(tables)}.arrow")
+            quoted = '"' + table.replace('"', '""') + '"'
+            reader = ctx.execute(f"SELECT * FROM {quoted}").to_arrow_reader()
+            with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+            tables[table] = path
+            with self._cond:
+                self.exported_bytes += os.path.getsize(path)
+        return tables
+
+    def _relay(self, worker, log_queue, cancel_token, deadline, timeout):
+        """Forwards the worker's output until it reports a result; kills it on timeout or cancellation."""
+        while True:
+            if worker.conn.poll(0.05):
+                try:
+                    kind, *payload = worker.conn.recv()
+                except (EOFError, OSError):
+                    self._count("crashes")
+                    raise RuntimeError(self._exit_message(worker))
+                if kind in ("stdout", "stderr"):
+                    if log_queue is not None:
+                        log_queue.put(payload[0] if kind == "stdout" else ("stderr", payload[0]))
+                    else:
+                        logger.info(f"[USER PRINT]: {payload[0].strip()}")
+                    continue
+                self._count("runs")
+                if kind == "table":
+                    path, nbytes = payload
+                    with self._cond:
+                        self.returned_bytes += nbytes
+                    return pa.ipc.open_file(pa.memory_map(path)).read_all()
+                if kind == "file":
+                    return io.BytesIO(payload[0])
+                if kind == "none":
+                    return None
+                self._count("failures")
+                if kind == "convert_error":
+                    raise ResultConversionError(payload[0])
+                message, trace = payload
+                logger.error(f"Python worker error: {message}\n{trace}")
+                raise PythonBlockError(message)
+
+            if cancel_token is not None and cancel_token.cancelled:
+                self._count("cancelled")
+                check_cancelled(cancel_token, "python")
+            if time.monotonic() > deadline:
+                self._count("timeouts")
+                raise TimeoutError(f"Python block exceeded its {timeout:g}s time limit")
+            if not worker.process.is_alive() and not worker.conn.poll():
+                self._count("crashes")
+                raise RuntimeError(self._exit_message(worker))
+
+    def _exit_message(self, worker) -> str:
+        worker.process.join(1)
+        code = worker.process.exitcode
+        if code is not None and code < 0:
+            return f"Python worker was killed by signal {-code} (CPU or memory limit?)"
+        return f"Python worker exited unexpectedly (exit code {code})"
+
+    def _checkout(self) -> _Worker:
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Python worker pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.processes:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No Python worker became free within {self.checkout_timeout:g}s")
+                self._cond.wait(remaining)
+        try:
+            return self._spawn()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _checkin(self, worker, broken=False):
+        retire = broken or worker.tasks >= self.max_tasks or not worker.process.is_alive()
+        with self._cond:
+            if retire or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append(worker)
+            self._cond.notify()
+        if broken:
+            worker.kill()
+        elif retire or self._closed:
+            worker.stop()
+        if retire and not self._closed and self.mode == "process":
+            # Keep the pool warm: the next block should not pay for interpreter start-up
+            threading.Thread(target=self._warm, name="python-worker-warmup", daemon=True).start()
+
+    def _warm(self):
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.processes:
+                    return
+                self._size += 1
+            try:
+                worker = self._spawn()
+            except Exception as e:
+                with self._cond:
+                    self._size -= 1
+                logger.warning(f"Starting a Python worker failed: {e}")
+                return
+            with self._cond:
+                closed = self._closed
+                if closed:
+                    self._size -= 1
+                else:
+                    self._idle.append(worker)
+                    self._cond.notify()
+            if closed:
+                worker.stop()
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._mp, self.memory_mb)
+        self._count("started")
+        logger.info(f"Started Python worker process {worker.process.pid}")
+        return worker
+
+    def _count(self, name):
+        with self._cond:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+# --- Worker process side ---
+
+def _worker_main(conn, memory_mb=None):
+    # Ctrl+C on the server must not interrupt a block half-way; the server stops workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory_mb:
+        try:
+            import resource
+            limit = int(memory_mb) * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            print(f"Python worker: memory limit not applied: {e}", file=sys.stderr)
+
+    # Preloaded so a block starts without import latency
+    import duckdb
+    from .py_extensions import ArrowConverter, block_globals, compile_block
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        _run_task(conn, task, duckdb, ArrowConverter, block_globals, compile_block)
+
+
+def _run_task(conn, task, duckdb, ArrowConverter, block_globals, compile_block):
+    ctx = duckdb.connect(":memory:")
+    try:
+        for table, path in task["tables"].items():
+            ctx.register(table, pa.ipc.open_file(pa.memory_map(path)).read_all())
+
+        def relay_print(*args, sep=" ", end="\n", file=None, flush=False):
+            msg = sep.join(map(str, args)) + end
+            if file is not None:
+                file.write(msg)
+            else:
+                conn.send(("stdout", msg))
+
+        try:
+            user_func = compile_block(task["code"], block_globals(ctx, relay_print))
+            with _cpu_limit(task.get("cpu_seconds")):
+                result = user_func()
+        except CpuLimitExceeded:
+            conn.send(("error", f"Python block exceeded its CPU time limit of {task['cpu_seconds']}s", ""))
+            return
+        except (Exception, SystemExit) as e:
+            conn.send(("error", str(e), traceback.format_exc()))
+            return
+
+        if result is None:
+            conn.send(("none",))
+            return
+        if hasattr(result, "read") and (isinstance(result, io.IOBase) or hasattr(result, "getvalue")):
+            if hasattr(result, "seek"):
+                with contextlib.suppress(Exception):
+                    result.seek(0)
+            data = result.getvalue() if hasattr(result, "getvalue") else result.read()
+            conn.send(("file", data if isinstance(data, bytes) else str(data).encode()))
+            return
+        try:
+            converter = ArrowConverter()
+            table = converter.as_table(result)
+            if table is None:
+                # Record iterables stream through the worker's DuckDB, which absorbs schema widening
+                if converter.register(ctx, "__block_result", result) is None:
+                    table = pa.table([])
+                else:
+                    reader = ctx.execute("SELECT * FROM __block_result").to_arrow_reader()
+        except Exception as e:
+            conn.send(("convert_error", str(e)))
+            return
+
+        path = os.path.join(task["dir"], "result.arrow")
+        schema = table.schema if table is not None else reader.schema
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            for batch in (table.to_batches() if table is not None else reader):
+                writer.write_batch(batch)
+        conn.send(("table", path, os.path.getsize(path)))
+    finally:
+        ctx.close()
+
+
+@contextlib.contextmanager
+def _cpu_limit(seconds):
+    """Raises CpuLimitExceeded once the block has used `seconds` more CPU time (POSIX only)."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if not seconds or resource is None or not hasattr(signal, "SIGXCPU"):
+        yield
+        return
+
+    def on_limit(signum, frame):
+        raise CpuLimitExceeded()
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = int(usage.ru_utime + usage.ru_stime + float(seconds)) + 1
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    previous = signal.signal(signal.SIGXCPU, on_limit)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+        signal.signal(signal.SIGXCPU, previous)
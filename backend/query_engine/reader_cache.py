@@ -0,0 +1,390 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import pathlib
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict, deque
+
+from .connection_pool import mask_connection_string
+
+logger = logging.getLogger("StreamFlightServer")
+
+
+class ReaderCache:
+    """
+    Content-addressed on-disk cache of `{% reader %}` results, shared by all sessions.
+
+    An entry is a dataset directory named "<key>.<id>", key being
+    sha256(connection string, reader SQL, version), holding Parquet part files
+    and a manifest.json. Readers write into a hidden staging directory that is
+    renamed into place once complete, so a crashed or failed write never becomes
+    visible; leftovers are removed at startup. Startup cleanup only touches
+    directories named like the cache's own entries and staging directories,
+    so unrelated files in cache_dir are left alone. Without a cache_dir the
+    cache lives in a private temporary directory that is removed with it; pass
+    one, owned by this server, to keep entries across restarts. Entries expire after ttl seconds
+    and the least recently used ones are dropped once the cache exceeds
+    max_bytes. Incremental readers keep expired entries, record their
+    watermark in the manifest and publish each refresh as a new version.
+
+    Session views over a dataset pin it (see pin): a dropped entry leaves the
+    index at once, so no new view picks it up, but its directory is deleted
+    only when the last view over it is replaced, dropped or its session
+    connection is freed. Every publish uses a new directory name, so a key
+    can be rebuilt while older sessions still read the previous copy. Datasets
+    outside cache_dir (per-session Parquet readers) are deleted the same way
+    when their last view goes.
+    """
+
+    MANIFEST = "manifest.json"
+    STAGING_PREFIX = ".stage-"
+    ENTRY_NAME = re.compile(r"[0-9a-f]{64}\.[0-9a-f]{8}")
+    STAGING_NAME = re.compile(r"\.stage-[0-9a-f]{16}-[0-9a-f]{8}")
+
+    def __init__(self, cache_dir=None, max_bytes=10 * 1024 ** 3, ttl=300.0):
+        if cache_dir is None:
+            self.cache_dir = pathlib.Path(tempfile.mkdtemp(prefix="query_engine_reader_cache-"))
+            weakref.finalize(self, shutil.rmtree, str(self.cache_dir), True)
+        else:
+            self.cache_dir = pathlib.Path(cache_dir)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> manifest dict, least recently used first
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._pins = {}  # dataset path -> views (connection id, lowercased name) reading it
+        self._views = {}  # (connection id, lowercased name) -> dataset path
+        self._owners = set()  # ids of connections whose views are released when they are freed
+        self._retired = set()  # dropped dataset paths kept while views still read them
+        self._freed = deque()  # connections freed since their views were last released
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.writes = 0
+        self.orphans_removed = self._load()
+
+    @staticmethod
+    def key(conn_str: str, sql: str, version=None) -> str:
+        digest = hashlib.sha256()
+        for part in (conn_str, sql.strip(), "" if version is None else str(version)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def lookup(self, key: str, ttl=None, drop_expired=True):
+        """Returns the dataset directory of a fresh entry, or None."""
+        self._release_freed()
+        ttl = self.ttl if ttl is None else ttl
+        stale = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            path = self.cache_dir / entry["dir"]
+            if not path.is_dir():
+                stale = self._entries.pop(key)
+                self.misses += 1
+            elif ttl is not None and ttl >= 0 and time.time() - entry["created_at"] > ttl:
+                self.misses += 1
+                if not drop_expired:
+                    return None
+                stale = self._entries.pop(key)
+                self.expired += 1
+            else:
+                self._entries.move_to_end(key)
+                entry["last_used"] = time.time()
+                self.hits += 1
+
+        if stale is not None:
+            self._retire(self.cache_dir / stale["dir"])
+            return None
+        try:
+            # Directory mtime carries the LRU order across restarts
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def peek(self, key: str):
+        """Returns (directory, manifest copy) of an entry regardless of its age, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not (self.cache_dir / entry["dir"]).is_dir():
+                return None
+            return self.cache_dir / entry["dir"], dict(entry)
+
+    def lock(self, key: str) -> threading.Lock:
+        """Serializes incremental refreshes of one entry across sessions."""
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def update(self, key: str, **fields):
+        """Rewrites an entry's manifest with new fields (e.g. its watermark); the entry counts as fresh again."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            path = self.cache_dir / entry["dir"]
+            entry.update(fields)
+            entry["bytes"] = sum(f.stat().st_size for f in path.glob("*.parquet"))
+            entry["created_at"] = entry["last_used"] = time.time()
+            self._entries.move_to_end(key)
+            tmp = path / f"{self.MANIFEST}.tmp"
+            tmp.write_text(json.dumps(entry))
+            os.replace(tmp, path / self.MANIFEST)
+            evicted = self._evict_locked(keep=key)
+        for old in evicted:
+            self._retire(old)
+
+    def stage(self, key: str) -> pathlib.Path:
+        """Creates a private directory the reader writes its Parquet parts into."""
+        path = self.cache_dir / f"{self.STAGING_PREFIX}{key[:16]}-{uuid.uuid4().hex[:8]}"
+        path.mkdir()
+        return path
+
+    def discard(self, staging: pathlib.Path):
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def commit(self, key: str, staging: pathlib.Path, conn_str: str, connection_name=None, rows=None) -> pathlib.Path:
+        """Publishes a staged dataset; if another render published the same key first, that one wins."""
+        now = time.time()
+        manifest = {
+            "key": key,
+            "connection": mask_connection_string(conn_str),
+            "connection_name": connection_name,
+            "rows": rows,
+            "bytes": sum(f.stat().st_size for f in staging.glob("*.parquet")),
+            "created_at": now,
+            "last_used": now
+        }
+        (staging / self.MANIFEST).write_text(json.dumps(manifest))
+
+        replaced = None
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and (self.cache_dir / current["dir"]).is_dir():
+                self._entries.move_to_end(key)
+                final = self.cache_dir / current["dir"]
+                winner = True
+            else:
+                winner = False
+                if current is not None:
+                    replaced = self.cache_dir / current["dir"]
+                final = self.cache_dir / f"{key}.{uuid.uuid4().hex[:8]}"
+                staging.rename(final)
+                manifest["dir"] = final.name
+                self._entries[key] = manifest
+                self.writes += 1
+            evicted = self._evict_locked(keep=key)
+
+        if winner:
+            self.discard(staging)
+        for old in evicted + ([replaced] if replaced is not None else []):
+            self._retire(old)
+        return final
+
+    def publish(self, key: str, staging: pathlib.Path, **fields) -> pathlib.Path:
+        """
+        Replaces an entry's dataset with a new version staged by an incremental refresh,
+        keeping its manifest fields. The previous directory is retired, so sessions
+        still reading it keep their files until their views move on.
+        """
+        with self._lock:
+            manifest = dict(self._entries.get(key) or {"key": key})
+        manifest.update(fields)
+        manifest["bytes"] = sum(f.stat().st_size for f in staging.glob("*.parquet"))
+        manifest["created_at"] = manifest["last_used"] = time.time()
+        final = self.cache_dir / f"{key}.{uuid.uuid4().hex[:8]}"
+        manifest["dir"] = final.name
+        (staging / self.MANIFEST).write_text(json.dumps(manifest))
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            staging.rename(final)
+            self._entries[key] = manifest
+            self.writes += 1
+            evicted = self._evict_locked(keep=key)
+        if previous is not None:
+            evicted.append(self.cache_dir / previous["dir"])
+        for old in evicted:
+            self._retire(old)
+        return final
+
+    def pin(self, conn, name: str, path):
+        """
+        Records that view name of session connection conn reads the dataset at path,
+        releasing the dataset its previous view of that name read. All views of conn
+        are released when the connection is freed.
+        """
+        self._release_freed()
+        path, view = str(path), (id(conn), name.lower())
+        with self._lock:
+            if view[0] not in self._owners:
+                weakref.finalize(conn, self._freed.append, view[0])
+                self._owners.add(view[0])
+            previous = self._views.get(view)
+            self._views[view] = path
+            self._pins.setdefault(path, set()).add(view)
+            doomed = self._unpin_locked(view, previous) if previous not in (None, path) else None
+        if doomed:
+            shutil.rmtree(doomed, ignore_errors=True)
+
+    def unpin(self, conn, name: str):
+        """Releases the dataset read by view name of conn, e.g. after the view was dropped."""
+        self._release_freed()
+        with self._lock:
+            view = (id(conn), name.lower())
+            doomed = self._unpin_locked(view, self._views.pop(view, None))
+        if doomed:
+            shutil.rmtree(doomed, ignore_errors=True)
+
+    def invalidate(self, key=None, connection=None) -> int:
+        """Drops entries by key, by connection name or string, or all of them."""
+        masked = mask_connection_string(connection) if connection and "://" in connection else None
+        with self._lock:
+            victims = [
+                k for k, e in self._entries.items()
+                if (key is None or k == key)
+                and (connection is None
+                     or (e.get("connection_name") or "").casefold() == connection.casefold()
+                     or e.get("connection") == masked)
+            ]
+            paths = [self.cache_dir / self._entries.pop(k)["dir"] for k in victims]
+            for k in victims:
+                self._key_locks.pop(k, None)
+        for path in paths:
+            self._retire(path)
+        return len(victims)
+
+    def stats(self) -> dict:
+        self._release_freed()
+        with self._lock:
+            total = sum(e["bytes"] for e in self._entries.values())
+            requests = self.hits + self.misses
+            return {
+                "cache_dir": str(self.cache_dir),
+                "entries": len(self._entries),
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / requests, 4) if requests else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "writes": self.writes,
+                "pinned_datasets": len(self._pins),
+                "retired_datasets": len(self._retired),
+                "orphans_removed": self.orphans_removed
+            }
+
+    def _evict_locked(self, keep=None) -> list:
+        """Drops least recently used entries beyond max_bytes; returns their directories to retire."""
+        if not self.max_bytes:
+            return []
+        total = sum(e["bytes"] for e in self._entries.values())
+        evicted = []
+        for k in list(self._entries.keys()):
+            if total <= self.max_bytes:
+                break
+            if k == keep:
+                continue
+            entry = self._entries.pop(k)
+            total -= entry["bytes"]
+            evicted.append(self.cache_dir / entry["dir"])
+            self.evictions += 1
+        return evicted
+
+    def _retire(self, path):
+        """Deletes a dropped dataset directory, or defers that until no view pins it."""
+        with self._lock:
+            if str(path) in self._pins:
+                self._retired.add(str(path))
+                return
+        shutil.rmtree(path, ignore_errors=True)
+
+    def _unpin_locked(self, view, path):
+        """Removes one view's pin; returns path if nothing reads it any more and it must go."""
+        if path is None:
+            return None
+        views = self._pins.get(path)
+        if views:
+            views.discard(view)
+            if views:
+                return None
+        self._pins.pop(path, None)
+        if path in self._retired or pathlib.Path(path).parent != self.cache_dir:
+            self._retired.discard(path)
+            return path
+        return None
+
+    def _release_freed(self):
+        """
+        Releases the views of freed session connections. Their finalizers only queue
+        the connection id: they may run during garbage collection with the lock held.
+        """
+        doomed = []
+        while self._freed:
+            owner = self._freed.popleft()
+            with self._lock:
+                self._owners.discard(owner)
+                for view in [v for v in self._views if v[0] == owner]:
+                    doomed.append(self._unpin_locked(view, self._views.pop(view)))
+        for path in doomed:
+            if path:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _load(self) -> int:
+        """
+        Rebuilds the index from disk, deleting staging leftovers, unreadable entries and
+        superseded copies. Anything not named like an entry or a staging directory is
+        not the cache's and stays.
+        """
+        removed = 0
+        found = {}
+        for child in self.cache_dir.iterdir():
+            if self.STAGING_NAME.fullmatch(child.name):
+                manifest = None
+            elif self.ENTRY_NAME.fullmatch(child.name):
+                try:
+                    manifest = json.loads((child / self.MANIFEST).read_text())
+                    if manifest.get("key") != child.name.split(".")[0] or not any(child.glob("*.parquet")):
+                        manifest = None
+                except (OSError, ValueError):
+                    manifest = None
+            else:
+                continue
+            if manifest is not None:
+                manifest["dir"] = child.name
+                manifest["last_used"] = child.stat().st_mtime
+                # Older copies of a key were still pinned when the server stopped; keep the newest
+                previous = found.get(manifest["key"])
+                if previous is not None and previous["created_at"] >= manifest["created_at"]:
+                    manifest = None
+                elif previous is not None:
+                    found[manifest["key"]], manifest, child = manifest, None, self.cache_dir / previous["dir"]
+                else:
+                    found[manifest["key"]] = manifest
+            if manifest is None:
+                logger.info(f"Removing orphaned reader cache item {child}")
+                if child.is_dir():
+                    shutil.rmtree(child, ignore_errors=True)
+                else:
+                    child.unlink(missing_ok=True)
+                removed += 1
+
+        for manifest in sorted(found.values(), key=lambda m: m["last_used"]):
+            self._entries[manifest["key"]] = manifest
+        for path in self._evict_locked():
+            shutil.rmtree(path, ignore_errors=True)
+        return removed
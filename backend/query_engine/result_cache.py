@@ -0,0 +1,235 @@
+import time
+import uuid
+import logging
+import threading
+
+import pyarrow as pa
+
+from .cancellation import interrupting
+
+logger = logging.getLogger("StreamFlightServer")
+
+# Schema holding materialized results inside each session database; hidden from catalog listings
+RESULT_SCHEMA = "_results"
+
+FILTER_OPERATORS = {
+    "=": "=", "==": "=", "eq": "=",
+    "!=": "<>", "<>": "<>", "ne": "<>",
+    "<": "<", "lt": "<", "<=": "<=", "le": "<=",
+    ">": ">", "gt": ">", ">=": ">=", "ge": ">=",
+    "like": "LIKE", "ilike": "ILIKE",
+}
+
+
+class CachedResult:
+    def __init__(self, result_id, session_id, conn, table, total_rows, schema):
+        self.result_id = result_id
+        self.session_id = session_id
+        self.conn = conn
+        self.table = table
+        self.total_rows = total_rows
+        self.schema = schema
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+
+
+class ResultCache:
+    """
+    Materializes a query result once per session and serves row windows from it.
+
+    Results live as tables in the session's own DuckDB database under the
+    `_results` schema, so DuckDB's memory limit and spilling apply to them and
+    sorted or filtered windows run as plain SQL with a Top-N plan. Column names
+    in sort and filter specs are checked against the cached schema and values
+    are bound as parameters. Results expire after ttl seconds without a window
+    request; each session keeps at most max_per_session of them, and they go
+    with their session when it is evicted (release_session). Only the session
+    that materialized a result can read windows of it or release it.
+    """
+
+    def __init__(self, ttl=900.0, max_per_session=8):
+        self.ttl = ttl
+        self.max_per_session = max_per_session
+        self._results = {}
+        self._lock = threading.Lock()
+        self.materialized = 0
+        self.windows = 0
+        self.expired = 0
+
+    def materialize(self, session_id, conn, sql, cancel_token=None, params=None) -> CachedResult:
+        self.sweep()
+        result_id = uuid.uuid4().hex
+        table = f"{RESULT_SCHEMA}.r_{result_id}"
+        cur = conn.cursor()
+        try:
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {RESULT_SCHEMA}")
+            with interrupting(cancel_token, cur.interrupt):
+                cur.execute(f"CREATE TABLE {table} AS {sql.strip().rstrip(';')}", params or None)
+            total_rows = cur.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            schema = cur.execute(f"SELECT * FROM {table} LIMIT 0").to_arrow_table().schema
+        finally:
+            cur.close()
+
+        entry = CachedResult(result_id, session_id, conn, table, total_rows, schema)
+        with self._lock:
+            self._results[result_id] = entry
+            self.materialized += 1
+            own = sorted((r for r in self._results.values() if r.session_id == session_id), key=lambda r: r.last_used)
+            surplus = own[:max(0, len(own) - self.max_per_session)]
+            for old in surplus:
+                del self._results[old.result_id]
+        for old in surplus:
+            self._drop(old)
+        logger.info(f"[{session_id}] Cached result {result_id} ({total_rows} rows)")
+        return entry
+
+    def get(self, result_id, session_id) -> CachedResult:
+        self.sweep()
+        with self._lock:
+            entry = self._results.get(result_id)
+            if entry is None or entry.session_id != session_id:
+                raise KeyError(f"Result {result_id} not found or expired")
+            entry.last_used = time.monotonic()
+            return entry
+
+    def window(self, result_id, session_id, offset=0, limit=1000, sort=None, filters=None):
+        """Returns (rows as an Arrow table, row count after filtering) for one window of a cached result."""
+        entry = self.get(result_id, session_id)
+        columns = {name.lower(): name for name in entry.schema.names}
+
+        where, params = self._where(filters, columns)
+        order = self._order(sort, columns)
+        sql = f"SELECT * FROM {entry.table}{where}{order} LIMIT {max(int(limit), 0)} OFFSET {max(int(offset), 0)}"
+
+        cur = entry.conn.cursor()
+        try:
+            table = cur.execute(sql, params).to_arrow_table()
+            if where:
+                total = cur.execute(f"SELECT COUNT(*) FROM {entry.table}{where}", params).fetchone()[0]
+            else:
+                total = entry.total_rows
+        finally:
+            cur.close()
+        with self._lock:
+            self.windows += 1
+        return table, total
+
+    def release(self, result_id, session_id) -> bool:
+        with self._lock:
+            entry = self._results.get(result_id)
+            if entry is None or entry.session_id != session_id:
+                return False
+            del self._results[result_id]
+        self._drop(entry)
+        return True
+
+    def release_session(self, session_id, conn) -> int:
+        """Drops the results a session's connection holds, e.g. once the session is evicted."""
+        with self._lock:
+            own = [r for r in self._results.values() if r.session_id == session_id and r.conn is conn]
+            for r in own:
+                del self._results[r.result_id]
+        for r in own:
+            self._drop(r)
+        return len(own)
+
+    def sweep(self):
+        if not self.ttl:
+            return
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            stale = [r for r in self._results.values() if r.last_used < cutoff]
+            for r in stale:
+                del self._results[r.result_id]
+                self.expired += 1
+        for r in stale:
+            self._drop(r)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "results": len(self._results),
+                "rows": sum(r.total_rows for r in self._results.values()),
+                "ttl": self.ttl,
+                "max_per_session": self.max_per_session,
+                "materialized": self.materialized,
+                "windows": self.windows,
+                "expired": self.expired
+            }
+
+    @staticmethod
+    def _drop(entry):
+        try:
+            cur = entry.conn.cursor()
+            cur.execute(f"DROP TABLE IF EXISTS {entry.table}")
+            cur.close()
+        except Exception as e:
+            logger.warning(f"Failed to drop cached result {entry.result_id}: {e}")
+
+    @staticmethod
+    def _column(name, columns):
+        column = columns.get(str(name).lower())
+        if column is None:
+            raise ValueError(f"Unknown column '{name}'")
+        return '"' + column.replace('"', '""') + '"'
+
+    def _order(self, sort, columns) -> str:
+        """sort: ["col", "-col"] or [{"column": "col", "desc": true}, ...]"""
+        if not sort:
+            return ""
+        if isinstance(sort, (str, dict)):
+            sort = [sort]
+        terms = []
+        for item in sort:
+            if isinstance(item, dict):
+                name, desc = item.get("column"), bool(item.get("desc"))
+            else:
+                name, desc = (item[1:], True) if str(item).startswith("-") else (item, False)
+            terms.append(f"{self._column(name, columns)} {'DESC' if desc else 'ASC'}")
+        return " ORDER BY " + ", ".join(terms)
+
+    def _where(self, filters, columns):
+        """filters: [{"column": "col", "op": ">=", "value": 10}, {"column": "c", "op": "in", "value": [1, 2]}, ...]"""
+        if not filters:
+            return "", []
+        if isinstance(filters, dict):
+            filters = [filters]
+        clauses, params = [], []
+        for f in filters:
+            column = self._column(f.get("column"), columns)
+            op = str(f.get("op", "=")).lower()
+            value = f.get("value")
+            if op in ("is_null", "null"):
+                clauses.append(f"{column} IS NULL")
+            elif op in ("not_null", "notnull"):
+                clauses.append(f"{column} IS NOT NULL")
+            elif op in ("in", "not_in"):
+                values = list(value or [])
+                if not values:
+                    clauses.append("FALSE" if op == "in" else "TRUE")
+                    continue
+                marks = ", ".join("?" for _ in values)
+                clauses.append(f"{column} {'IN' if op == 'in' else 'NOT IN'} ({marks})")
+                params.extend(values)
+            elif op == "contains":
+                clauses.append(f"CAST({column} AS VARCHAR) ILIKE ?")
+                params.append(f"%{value}%")
+            elif op in FILTER_OPERATORS:
+                clauses.append(f"{column} {FILTER_OPERATORS[op]} ?")
+                params.append(value)
+            else:
+                raise ValueError(f"Unsupported filter operator '{op}'")
+        return " WHERE " + " AND ".join(clauses), params
+
+
+def window_metadata(entry: CachedResult, offset, total) -> dict:
+    """Schema metadata that tells the client which cached result and window a stream holds."""
+    return {
+        b"result_id": entry.result_id.encode(),
+        b"total_rows": str(total).encode(),
+        b"offset": str(offset).encode(),
+    }
+
+
+def with_metadata(table: pa.Table, metadata: dict) -> pa.Table:
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
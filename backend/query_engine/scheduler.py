@@ -0,0 +1,204 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+from .cancellation import QueryCancelled
+
+logger = logging.getLogger("StreamFlightServer")
+
+# Priority classes, most urgent first; ties between waiters of one class go to the session running less
+PRIORITIES = {"interactive": 0, "export": 1, "python": 2}
+
+
+class AdmissionError(RuntimeError):
+    """Raised when a query is not admitted: the wait queue is full or its wait timed out."""
+
+    def __init__(self, message, timed_out=False):
+        super().__init__(message)
+        self.timed_out = timed_out
+
+
+class QuerySlot:
+    """One admitted query's share of the server; release() is idempotent."""
+
+    def __init__(self, scheduler, session_id, priority, waited):
+        self.session_id = session_id
+        self.priority = priority
+        self.waited = waited
+        self.released = False
+        self._scheduler = scheduler
+
+    def release(self):
+        self._scheduler._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Waiter:
+    def __init__(self, session_id, priority, seq):
+        self.session_id = session_id
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+
+
+class QueryScheduler:
+    """
+    Admission control in front of rendering and query execution.
+
+    At most global_slots queries run at once, at most session_slots per session,
+    and the export and python classes are capped by class_slots so heavy work
+    always leaves room for interactive grid queries. Queries that do not fit
+    wait in a queue of at most max_queue entries for up to queue_timeout
+    seconds. A freed slot goes to the most urgent waiter that fits, where a
+    waiter's class rank improves by one for every `aging` seconds it has waited
+    (so exports and Python blocks are never starved) and ties go to the session
+    with fewer running queries, then to the earliest arrival.
+    """
+
+    def __init__(self, global_slots=None, session_slots=2, max_queue=64, queue_timeout=30.0,
+                 class_slots=None, aging=10.0):
+        self.global_slots = global_slots or os.cpu_count() or 4
+        self.session_slots = session_slots
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.aging = aging
+        heavy = max(1, self.global_slots // 2)
+        self.class_slots = {"export": heavy, "python": heavy, **(class_slots or {})}
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = 0
+        self._running = 0
+        self._by_session = {}
+        self._by_class = {}
+        self._waits = {p: deque(maxlen=1000) for p in PRIORITIES}
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+
+    def acquire(self, session_id, priority="interactive", timeout=None, token=None) -> QuerySlot:
+        """Waits for a slot; raises AdmissionError, or QueryCancelled if token is cancelled while queued."""
+        if priority not in PRIORITIES:
+            priority = "interactive"
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._cond:
+            if not self._waiters and self._fits_locked(session_id, priority):
+                return self._grant_locked(session_id, priority, 0.0)
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionError(f"Server busy: {len(self._waiters)} queries already waiting")
+
+            self._seq += 1
+            waiter = _Waiter(session_id, priority, self._seq)
+            self._waiters.append(waiter)
+            self.queued += 1
+            deadline = waiter.enqueued + timeout
+            try:
+                while True:
+                    if self._next_locked() is waiter:
+                        self._waiters.remove(waiter)
+                        # Another waiter may fit in what is left
+                        self._cond.notify_all()
+                        return self._grant_locked(session_id, priority, time.monotonic() - waiter.enqueued)
+                    if token is not None and token.cancelled:
+                        self.cancelled += 1
+                        raise QueryCancelled(f"Query {token.query_id} cancelled while queued ({token.reason})")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise AdmissionError(
+                            f"Query waited {timeout:.0f}s for a free slot ({self._running} running)", timed_out=True)
+                    # Bounded wait so a cancelled token is noticed without a notify
+                    self._cond.wait(min(remaining, 0.25))
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self._cond.notify_all()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            queued = {p: 0 for p in PRIORITIES}
+            for w in self._waiters:
+                queued[w.priority] += 1
+            return {
+                "global_slots": self.global_slots,
+                "session_slots": self.session_slots,
+                "class_slots": dict(self.class_slots),
+                "max_queue": self.max_queue,
+                "queue_timeout": self.queue_timeout,
+                "running": self._running,
+                "running_by_class": {p: self._by_class.get(p, 0) for p in PRIORITIES},
+                "running_by_session": dict(self._by_session),
+                "queue_depth": len(self._waiters),
+                "queued_by_class": queued,
+                "oldest_wait_ms": round(max((now - w.enqueued for w in self._waiters), default=0.0) * 1000, 1),
+                "wait_ms": {p: self._wait_summary(self._waits[p]) for p in PRIORITIES},
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled
+            }
+
+    def _fits_locked(self, session_id, priority) -> bool:
+        cap = self.class_slots.get(priority)
+        return (self._running < self.global_slots
+                and self._by_session.get(session_id, 0) < self.session_slots
+                and (cap is None or self._by_class.get(priority, 0) < cap))
+
+    def _next_locked(self):
+        now = time.monotonic()
+        eligible = [w for w in self._waiters if self._fits_locked(w.session_id, w.priority)]
+        if not eligible:
+            return None
+        aging = self.aging or float("inf")
+        return min(eligible, key=lambda w: (
+            PRIORITIES[w.priority] - (now - w.enqueued) / aging,
+            self._by_session.get(w.session_id, 0),
+            w.seq
+        ))
+
+    def _grant_locked(self, session_id, priority, waited) -> QuerySlot:
+        self._running += 1
+        self._by_session[session_id] = self._by_session.get(session_id, 0) + 1
+        self._by_class[priority] = self._by_class.get(priority, 0) + 1
+        self._waits[priority].append(waited)
+        self.admitted += 1
+        if waited > 1.0:
+            logger.info(f"[{session_id}] {priority} query admitted after waiting {waited:.1f}s")
+        return QuerySlot(self, session_id, priority, waited)
+
+    def _release(self, slot: QuerySlot):
+        with self._cond:
+            if slot.released:
+                return
+            slot.released = True
+            self._running -= 1
+            for counts, key in ((self._by_session, slot.session_id), (self._by_class, slot.priority)):
+                counts[key] -= 1
+                if counts[key] <= 0:
+                    del counts[key]
+            self._cond.notify_all()
+
+    @staticmethod
+    def _wait_summary(waits) -> dict:
+        if not waits:
+            return {"count": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        ordered = sorted(waits)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return {
+            "count": len(ordered),
+            "avg": round(sum(ordered) / len(ordered) * 1000, 1),
+            "p50": round(pick(0.5) * 1000, 1),
+            "p95": round(pick(0.95) * 1000, 1),
+            "max": round(ordered[-1] * 1000, 1)
+        }
@@ -0,0 +1,119 @@
+import re
+import logging
+import threading
+from collections import OrderedDict
+
+import duckdb
+import pyarrow as pa
+
+logger = logging.getLogger("StreamFlightServer")
+
+# Statement types (duckdb.StatementType names) that return rows without changing the session
+QUERY_STATEMENTS = ("SELECT", "EXPLAIN")
+# Also safe to plan in get_flight_info, but they may change settings, so do_get treats them as changes
+INSPECTION_STATEMENTS = ("CALL", "PRAGMA")
+
+# Quoted literals/identifiers are kept verbatim; comments and whitespace runs collapse to one space
+_SQL_TOKENS = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|(?:--[^\n]*|/\*.*?\*/|\s+)+", re.DOTALL)
+
+
+def param_types(params) -> tuple:
+    """Python type names of bound values; a result schema can depend on them (SELECT $1 AS x)."""
+    return tuple(type(p).__name__ for p in params or ())
+
+
+def normalize_sql(sql: str) -> str:
+    """Rendered SQL without comments, redundant whitespace or trailing semicolons (string literals untouched)."""
+    normalized = _SQL_TOKENS.sub(lambda m: m.group(1) or " ", sql or "").strip()
+    while normalized.endswith(";"):
+        normalized = normalized[:-1].rstrip()
+    return normalized
+
+
+def statement_kinds(sql: str):
+    """Statement types of sql per DuckDB's parser (e.g. ["CREATE", "SELECT"]), or None if it does not parse."""
+    try:
+        return [s.type.name for s in duckdb.extract_statements(sql)]
+    except Exception:
+        return None
+
+
+def modifies_session(kinds) -> bool:
+    """True unless every statement is a plain query; unparsable SQL counts as a change."""
+    return kinds is None or any(k not in QUERY_STATEMENTS for k in kinds)
+
+
+def describe_schema(conn: duckdb.DuckDBPyConnection, sql: str, params=None):
+    """
+    Arrow schema of a single SELECT from its plan alone: DESCRIBE binds and plans
+    the query without running it (limit(0) still executes blocking operators such
+    as a sorted aggregate), and the DuckDB types are mapped to Arrow by DuckDB's
+    own conversion on a constant zero-row probe. Returns None if DESCRIBE cannot
+    plan the statement. params are the values of the statement's $n placeholders.
+    """
+    try:
+        rows = conn.execute(f"DESCRIBE {sql}", params).fetchall() if params else conn.execute(f"DESCRIBE {sql}").fetchall()
+        if not rows:
+            return pa.schema([])
+        probe = ", ".join(f"NULL::{row[1]} AS c{i}" for i, row in enumerate(rows))
+        types = conn.execute(f"SELECT {probe} LIMIT 0").arrow().schema
+    except Exception as e:
+        logger.debug(f"DESCRIBE could not plan query, falling back to limit(0): {e}")
+        return None
+    return pa.schema([pa.field(row[0], types.field(i).type) for i, row in enumerate(rows)])
+
+
+class SchemaCache:
+    """
+    LRU cache of result schemas for get_flight_info.
+
+    Entries are keyed by session id, the session's catalog version, the
+    normalized rendered SQL and, for bound statements, the parameter types. The catalog version changes whenever a reader,
+    Python block or DDL statement changes the session's tables (see
+    SessionManager.note_catalog), so a stale schema is never served; repeated
+    get_flight_info calls for the same dashboard are dictionary lookups.
+    """
+
+    def __init__(self, enabled=True, max_entries=2048):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id, version, sql, params=None):
+        if not self.enabled or version is None:
+            return None
+        key = (session_id, version, normalize_sql(sql), param_types(params))
+        with self._lock:
+            schema = self._entries.get(key)
+            if schema is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return schema
+
+    def put(self, session_id, version, sql, schema: pa.Schema, params=None):
+        if not self.enabled or version is None:
+            return
+        key = (session_id, version, normalize_sql(sql), param_types(params))
+        with self._lock:
+            self._entries[key] = schema
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -1,22 +1,45 @@
 import json
 import sqlite3
 import pathlib
-import yaml
 import logging
 import duckdb
 import pyarrow as pa
 import pyarrow.flight
 from datetime import datetime
-from dataclasses import asdict
+from dataclasses import asdict, replace
 from jinja2 import Environment, FileSystemLoader
 from faker import Faker
 import queue
 import threading
 import io
+import re
+import time
 
-from .models import QueryCommand, SqlWrapper, TemplateMetadata
+from .models import QueryCommand, SqlWrapper
 from .reader_extensions import ReaderExtension, context_storage
 from .py_extensions import PythonExtension
+from .template_cache import TemplateCache
+from .connection_pool import PoolManager, cancel_connection
+from .prepared_results import PreparedQuery, PreparedResultRegistry
+from .sessions import SessionManager
+from .cursor_converter import CursorConverter
+from .types import sqlite_declared_types
+from .native_scan import NativeScanner
+from .reader_cache import ReaderCache
+from .batching import BatchPolicy
+from .result_cache import ResultCache, window_metadata, with_metadata
+from .middleware import HeadersMiddlewareFactory, request_headers
+from .cancellation import QueryRegistry, QueryCancelled, interrupting
+from .scheduler import QueryScheduler, AdmissionError, PRIORITIES
+from .metrics import MetricsRegistry
+from .compression import WireCompression
+from .python_workers import PythonWorkerPool
+from .external_schema import SchemaDiscovery
+from .catalog import CatalogCache
+from .template_catalog import TemplateCatalog, parse_criteria
+from .connections import ConnectionRegistry, ConnectionRegistryError
+from .bind_params import StatementCache, null_placeholders, binds_before_last, inline_params
+from .schema_cache import SchemaCache, describe_schema, statement_kinds, modifies_session, QUERY_STATEMENTS, INSPECTION_STATEMENTS
 from .filters import (
     filter_quote, filter_sql, filter_between, filter_eq, filter_add_days,
     filter_gt, filter_lt, filter_gte, filter_lte, filter_ne, filter_like,
@@ -27,10 +50,48 @@ from .filters import (
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("StreamFlightServer")
 
+# Schema of the stdout/stderr stream produced while {% python %} blocks run
+LOG_SCHEMA = pa.schema([
+    pa.field("stream_type", pa.string()),
+    pa.field("stream_content", pa.string())
+])
+
+# Log-mode result summary: rows printed to the terminal view and rows read per batch while counting
+LOG_PREVIEW_ROWS = 50
+LOG_SUMMARY_BATCH_ROWS = 16384
+
+# Templates containing a {% python %} block are scheduled in the python priority class
+PYTHON_BLOCK = re.compile(r"{%-?\s*python\b")
+# Blocks that change the session while rendering; such templates are only rendered once, by the query itself
+SIDE_EFFECT_BLOCK = re.compile(r"{%-?\s*(python|reader)\b")
+
 class StreamFlightServer(pa.flight.FlightServerBase):
     def __init__(self, location="grpc://0.0.0.0:8815", query_dirs=None, db_path="data.db", **kwargs):
         self.external_conns = kwargs.pop("external_conns", [])
-        super(StreamFlightServer, self).__init__(location, **kwargs)
+        template_cache_size = kwargs.pop("template_cache_size", 128)
+        pool_options = kwargs.pop("pool_options", {})
+        prepared_ttl = kwargs.pop("prepared_ttl", 300.0)
+        prepared_max_per_session = kwargs.pop("prepared_max_per_session", 16)
+        session_options = kwargs.pop("session_options", {})
+        native_scanners = kwargs.pop("native_scanners", True)
+        native_scanner_install = kwargs.pop("native_scanner_install", False)
+        reader_cache_options = kwargs.pop("reader_cache_options", {})
+        batch_options = kwargs.pop("batch_options", {})
+        result_cache_options = kwargs.pop("result_cache_options", {})
+        cancellation_options = kwargs.pop("cancellation_options", {})
+        scheduler_options = kwargs.pop("scheduler_options", {})
+        metrics_options = kwargs.pop("metrics_options", {})
+        compression_options = kwargs.pop("compression_options", {})
+        python_options = kwargs.pop("python_options", {})
+        schema_cache_options = kwargs.pop("schema_cache_options", {})
+        external_schema_options = kwargs.pop("external_schema_options", {})
+        catalog_options = kwargs.pop("catalog_options", {})
+        template_catalog_options = kwargs.pop("template_catalog_options", {})
+        bind_parameters = kwargs.pop("bind_parameters", False)
+        statement_cache_options = kwargs.pop("statement_cache_options", {})
+        middleware = dict(kwargs.pop("middleware", None) or {})
+        middleware.setdefault("headers", HeadersMiddlewareFactory())
+        super(StreamFlightServer, self).__init__(location, middleware=middleware, **kwargs)
         self.location = location
         self.db_path = db_path
         self.query_dirs = query_dirs or [
@@ -38,287 +99,126 @@ class StreamFlightServer(pa.flight.FlightServerBase):
         ]
         
         # 3. Initialize Shared Database (SQLite) and Metadata
-        self._init_metadata_db()
-        self._sync_external_connections()
+        self.connection_registry = ConnectionRegistry(
+            db_path, seeds=self.external_conns if isinstance(self.external_conns, dict) else None)
         
         # Initialize internal structures
-        self.connections = {}
-        self.connection_map = {}
+        self.connection_pools = PoolManager(**pool_options)
+        self.native_scanner = NativeScanner(enabled=native_scanners, autoinstall=native_scanner_install)
+        self.reader_cache = ReaderCache(**reader_cache_options)
+        self.batch_policy = BatchPolicy(**batch_options)
+        self.compression = WireCompression(**compression_options)
+        self.result_cache = ResultCache(**result_cache_options)
+        self.queries = QueryRegistry(**cancellation_options)
+        self.scheduler = QueryScheduler(**scheduler_options)
+        self.python_workers = PythonWorkerPool(**python_options)
+        self.schema_cache = SchemaCache(**schema_cache_options)
+        self.external_schemas = SchemaDiscovery(**external_schema_options)
+        self.catalog = CatalogCache(**catalog_options)
+        self.bind_parameters = bind_parameters
+        self.statements = StatementCache(**statement_cache_options)
+        self.prepared_results = PreparedResultRegistry(ttl=prepared_ttl, max_per_session=prepared_max_per_session)
         
         # 1. Initialize Sessions
-        self._sessions = {}
-        self._max_sessions = 100
+        self.sessions = SessionManager(**session_options)
+        self.sessions.on_evict(self.result_cache.release_session)
+
+        self.metrics = MetricsRegistry(**metrics_options)
+        self._register_gauges()
         
         # 2. Setup Template Engine (Jinja)
         self._setup_jinja()
-
-        self._load_connections()
-
-    def _sync_external_connections(self):
-        """Seeds external connections into the SQLite DB if they don't exist."""
-        if not isinstance(self.external_conns, dict):
-            return
-
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        for name, cstr in self.external_conns.items():
-            # Attempt to insert. If name exists, it will fail silently due to OR IGNORE (name is UNIQUE)
-            # We treat external_conns as 'System' type initial seeds
-            cursor.execute(
-                "INSERT OR IGNORE INTO _meta_connections (name, type, connection_string) VALUES (?, ?, ?)",
-                (name, "system", cstr)
-            )
-            
-        conn.commit()
-        conn.close()
-
-    def _init_metadata_db(self):
-        """Initializes metadata tables in the SQLite database."""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS _meta_connections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL COLLATE NOCASE,
-                type TEXT NOT NULL,
-                connection_string TEXT NOT NULL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        conn.commit()
-        conn.close()
-
-    def _load_connections(self):
-        """Loads connections from metadata table into memory."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.execute("SELECT id, name, type, connection_string FROM _meta_connections")
-        for row in cursor.fetchall():
-            cid, name, ctype, cstr = row
-            # Use string ID for consistency
-            self.connections[str(cid)] = cstr
-            self.connection_map[name] = cstr
-        conn.close()
-
-    # ... (skipping unchanged methods until do_get)
-
-    def do_get(self, context, ticket):
-        try:
-            # 1. Parse Ticket
-            raw_ticket = ticket.ticket.decode('utf-8')
-            try:
-                ticket_json = json.loads(raw_ticket)
-                cmd = QueryCommand.from_json(raw_ticket)
-            except Exception:
-                # Handle old-style or raw text tickets gracefully if needed, or error out
-                logger.warning(f"Failed to parse ticket as JSON: {raw_ticket[:50]}...")
-                # Fallbck: assume it's just SQL text for default session
-                cmd = QueryCommand(query=raw_ticket, session_id="default", criteria={})
-            
-            # 2. Get Session Context
-            if not cmd.session_id:
-                cmd.session_id = "default"
-            
-            ctx = self._get_session_context(cmd.session_id)
-            
-            # 3. Setup Thread Local Context for Extensions
-            context_storage.db_conn = ctx
-            context_storage.connection_map = self.connection_map
-            context_storage.session_id = cmd.session_id
-            context_storage.python_stdout = ""
-            
-            # 4. Render Query (Jinja)
-            try:
-                sql = self._render_query(cmd, ctx)
-            except Exception as e:
-                raise pa.flight.FlightServerError(f"Template rendering error: {str(e)}")
-
-            # 5. Check if SQL is effectively empty
-            clean_lines = []
-            comment_lines = []
-            if sql:
-                for line in sql.splitlines():
-                    stripped = line.strip()
-                    if not stripped: continue
-                    if stripped.startswith("--"):
-                        comment_lines.append(stripped[2:].strip())
-                    else:
-                        clean_lines.append(line)
-            
-            is_effectively_empty = len(clean_lines) == 0
-
-            if is_effectively_empty:
-                 # Construct message
-                 msg = "İşlem başarıyla tamamlandı."
-                 python_stdout = getattr(context_storage, "python_stdout", None)
-                 if python_stdout:
-                     msg = python_stdout.strip()
-                 elif comment_lines:
-                     msg = "\n".join(comment_lines)
-
-                 batch = pa.RecordBatch.from_arrays([pa.array([msg])], names=["Result"])
-                 return pa.flight.RecordBatchStream(pa.RecordBatchReader.from_batches(batch.schema, [batch]))
-
-            # 6. Execute Query
-            
-            # Check for side effects (e.g. {% reader %} was used)
-            # If side effects occurred, we MUST execute in the Session Context (DuckDB) because
-            # that's where the data was loaded. Executing on an external connection would fail
-            # to find the temporary table.
-            has_side_effects = getattr(context_storage, "has_side_effects", False)
-            
-            # Direct connection execution
-            if cmd.connection_id and cmd.connection_id != "default" and not has_side_effects:
-                target_conn = self.connections.get(str(cmd.connection_id))
-                if target_conn:
-                    logger.info(f"Executing rendered query on connection {cmd.connection_id}")
-                    return self._execute_on_external(target_conn, sql)
-                else:
-                    logger.warning(f"Connection ID {cmd.connection_id} not found. Falling back to default.")
-
-            # DuckDB internal execution
-            # Connect execution (Post-Render) happens here
-            if has_side_effects and cmd.connection_id and cmd.connection_id != "default":
-                logger.info(f"Side-effects detected (e.g. reader). Forcing execution on Memory/DuckDB instead of external connection {cmd.connection_id}")
-            try:
-                rel = ctx.sql(sql)
-                if rel is None:
-                    # DDL returned no relation
-                    batch = pa.RecordBatch.from_arrays([pa.array(["İşlem başarıyla tamamlandı."])], names=["Result"])
-                    return pa.flight.RecordBatchStream(pa.RecordBatchReader.from_batches(batch.schema, [batch]))
-                
-                reader = rel.fetch_arrow_reader(batch_size=1024)
-                return pa.flight.RecordBatchStream(reader)
-            except Exception as e:
-                # DuckDB execution error
-                raise e
-
-        except Exception as e:
-            logger.exception("Query execution failed")
-            msg = str(e)
-            
-            # Clean up error message
-            duckdb_prefixes = [
-                "Binder Error: ", "Catalog Error: ", "Parser Error: ",
-                "Constraint Error: ", "Conversion Error: ", "Data Error: ",
-                "Transaction Error: ", "IO Error: ", "Connection Error: ",
-                "Internal Error: ", "Standard Error: ", "Sequence Error: "
-            ]
-            for prefix in duckdb_prefixes:
-                if prefix in msg:
-                    msg = msg.replace(prefix, "")
-            
-            if "Detail: Python exception" in msg:
-                msg = msg.split("Detail: Python exception")[0].strip()
-            
-            raise pa.flight.FlightServerError(msg)
-
-    def _execute_on_external(self, conn_str, query):
-        """Executes query directly on external connection and returns Flight stream."""
+        self.template_cache = TemplateCache(self.jinja_env, max_size=template_cache_size)
+        self.template_catalog = TemplateCatalog(self.query_dirs, **template_catalog_options)
+        self.template_catalog.start()
+
+    def _register_gauges(self):
+        self.metrics.gauge("sessions_active", lambda: len(self.sessions), "Open DuckDB sessions.")
+        self.metrics.gauge("threads_active", threading.active_count, "Live Python threads.")
+        self.metrics.gauge("external_connections_open",
+                           lambda: sum(p["in_use"] + p["idle"] for p in self.connection_pools.stats()),
+                           "Pooled connections to external databases, busy or idle.")
+        self.metrics.gauge("queries_active", lambda: self.queries.stats()["active"], "Queries rendering or streaming.")
+        self.metrics.gauge("queries_queued", lambda: self.scheduler.stats()["queue_depth"], "Queries waiting for a slot.")
+
+    def _execute_on_external(self, conn_str, query, policy=None, token=None, context=None, label=None, started=None,
+                             options=None, params=None):
+        """
+        Executes query directly on external connection and returns Flight stream.
+        A bound query (params for its $n placeholders) runs through the statement
+        cache on the pooled driver connection, which the source can plan once.
+        """
+        policy = policy or self.batch_policy
+        label = label or self.metrics.label(None)
+        # SQLite/Postgres: let DuckDB scan the source natively when its extension is available
+        native_reader = None
+        if not params:
+            with self.metrics.timed("execution", label):
+                native_reader = self.native_scanner.stream(conn_str, query, batch_size=policy.fetch_rows)
+        if native_reader is not None:
+            logger.info("Streaming external query through native DuckDB scanner")
+            reader = self.metrics.stream(policy.rebatch(native_reader), label, started)
+            return pa.flight.RecordBatchStream(self.queries.stream(token, context, reader, "external"), options=options)
+
+        pool = self.connection_pools.get(conn_str)
         conn = None
         try:
-            if conn_str.startswith("mssql://"):
-                import pymssql
-                from urllib.parse import urlparse, unquote, parse_qs
-                u = urlparse(conn_str)
-                
-                # Parse query parameters (e.g. ?charset=CP1254)
-                query_params = parse_qs(u.query)
-                charset = query_params.get('charset', [None])[0]
-                
-                connect_args = {
-                    "server": u.hostname,
-                    "user": unquote(u.username) if u.username else None,
-                    "password": unquote(u.password) if u.password else None,
-                    "database": u.path.lstrip('/'),
-                    "port": u.port or 1433,
-                    "autocommit": True
-                }
-                
-                if charset:
-                    connect_args["charset"] = charset
-
-                conn = pymssql.connect(**connect_args)
-                cursor = conn.cursor()
-                cursor.execute(query)
-            
-            elif conn_str.startswith("postgres://") or conn_str.startswith("postgresql://"):
-                import psycopg2
-                conn = psycopg2.connect(conn_str)
-                cursor = conn.cursor()
-                cursor.execute(query)
-
-            elif conn_str.startswith("sqlite://") or "://" not in conn_str:
-                import sqlite3
-                db_path = conn_str.replace("sqlite://", "").replace("sqlite3://", "")
-                conn = sqlite3.connect(db_path)
-                cursor = conn.execute(query)
-            else:
-                 raise ValueError(f"Unsupported connection protocol in: {conn_str}")
-
-            # Get column names
-            col_names = [col[0] for col in cursor.description or []]
-            if not col_names:
+            conn = pool.acquire()
+            # Types the source described (usually cached by get_flight_info) are fixed, not sampled
+            discovered = self.external_schemas.discover(conn_str, query, conn, params=params)
+            # SQLite cursors report no types; use the declared column types, which discovery already read
+            declared_types = None
+            if isinstance(conn, sqlite3.Connection):
+                declared_types = discovered.declared_types if discovered is not None else None
+                if declared_types is None:
+                    declared_types = sqlite_declared_types(conn, null_placeholders(query) if params else query)
+            cursor = conn.cursor()
+            # A disconnect while the source is still executing cancels the statement
+            with interrupting(token, lambda: cancel_connection(conn)), self.queries.watching(token, context), \
+                    self.metrics.timed("execution", label):
+                self.statements.execute(conn, cursor, query, params)
+
+            if not cursor.description:
                 # No result (e.g. INSERT)
+                pool.release(conn)
                 schema = pa.schema([])
-                return pa.flight.RecordBatchStream(pa.RecordBatchReader.from_batches(schema, []))
+                return pa.flight.RecordBatchStream(pa.RecordBatchReader.from_batches(schema, []), options=options)
 
-            # normalized_names = [n.lower() for n in col_names] # Removed normalization
-            
-            # Fetch first batch to infer schema
-            batch_size = 5000
-            first_rows = cursor.fetchmany(batch_size)
-            if not first_rows:
-                fields = [pa.field(n, pa.string()) for n in col_names] 
-                schema = pa.schema(fields)
-                return pa.flight.RecordBatchStream(pa.RecordBatchReader.from_batches(schema, []))
-
-            cols = list(zip(*first_rows))
-            # Convert to PyArrow arrays with type inference
-            arrays = []
-            for c in cols:
-                arrays.append(pa.array(c))
-
-            first_batch = pa.RecordBatch.from_arrays(
-                arrays,
-                names=col_names
-            )
-            schema = first_batch.schema
+            # Fix a stable schema up front (from cursor.description, declared types or the first batch)
+            # Small first fetch for a fast first paint; later fetches are sized by bytes per row
+            converter = CursorConverter(cursor, batch_size=policy.first_rows(), declared_types=declared_types,
+                                        known_types=discovered.types if discovered is not None else None)
+            schema = converter.schema
+            stream_conn, conn = conn, None
 
             def batch_gen():
-                yield first_batch
-                while True:
-                    try:
-                        rows = cursor.fetchmany(batch_size)
-                        if not rows: break
-                        cols = list(zip(*rows))
-                        # Use schema types to ensure consistency across batches
-                        batch_arrays = []
-                        for i, c in enumerate(cols):
-                            # Handle potential type mismatches (e.g. first batch NULL -> inferred NullType, second batch -> Int)
-                            # If schema field is NullType but we have data, we might lose data or crash.
-                            # For now, we try to cast to schema type.
-                            target_type = schema.field(i).type
-                            try:
-                                batch_arrays.append(pa.array(c, type=target_type))
-                            except Exception:
-                                # Fallback: let pyarrow infer and hope it's compatible or castable?
-                                # If we return different type, stream crashes. 
-                                # We log warning and try string as last resort for safety? No, string breaks schema.
-                                # Just let it try default inference if strict typed failed, but this might violate schema.
-                                logger.warning(f"Type mismatch in column {i}. schema={target_type}. data example={c[0]}")
-                                batch_arrays.append(pa.array(c))
-
-                        yield pa.RecordBatch.from_arrays(batch_arrays, schema=schema)
-                    except Exception as e:
-                        logger.error(f"Error streaming batch: {e}")
-                        break
-                conn.close()
+                # The connection goes back to the pool only after a fully drained cursor;
+                # an abandoned or failed stream discards it instead.
+                state = {"completed": False}
+                try:
+                    yield from _batches(state)
+                finally:
+                    pool.release(stream_conn, discard=not state["completed"])
 
-            return pa.flight.RecordBatchStream(pa.RecordBatchReader.from_batches(schema, batch_gen()))
+            def _batches(state):
+                try:
+                    yield from policy.adapt(converter)
+                    state["completed"] = True
+                except Exception as e:
+                    # Fail the stream; ending it normally would hand the client a truncated result
+                    logger.error(f"Error streaming batch: {e}")
+                    raise
+
+            reader = self.metrics.stream(pa.RecordBatchReader.from_batches(schema, batch_gen()), label, started)
+            return pa.flight.RecordBatchStream(self.queries.stream(
+                token, context, reader, "external", interrupt=lambda: cancel_connection(stream_conn)), options=options)
             
         except Exception as e:
             logger.error(f"External execution failed: {e}")
-            if conn: conn.close()
+            if conn: pool.release(conn, discard=True)
+            if token is not None and token.cancelled:
+                token.stopped("external")
+                raise QueryCancelled(f"Query {token.query_id} cancelled ({token.reason})") from e
             
             # Clean up error message (especially for pymssql which returns tuples/bytes)
             msg = str(e)
@@ -330,39 +230,45 @@ class StreamFlightServer(pa.flight.FlightServerBase):
                     pass
             
             raise pa.flight.FlightServerError(msg)
-        self._max_sessions = 100
-        
-        # 2. Setup Template Engine (Jinja)
-        self._setup_jinja()
-        
-        # 3. Initialize Shared Database (SQLite)
-        #self._init_db()
+
+    def _render_external(self, cmd: QueryCommand):
+        """
+        cmd with its SQL rendered and the placeholder values attached (already_rendered), so do_get
+        does not render it again; None for templates with reader/python blocks or a failed render.
+        """
+        source = self._template_source(cmd)
+        if source is None or SIDE_EFFECT_BLOCK.search(source):
+            return None
+        try:
+            sql = self._render_query(cmd, self._get_session_context(cmd.session_id))
+        except Exception as e:
+            # do_get renders again and reports the error
+            logger.info(f"External query not rendered ahead of do_get: {e}")
+            return None
+        return replace(cmd, query=sql, criteria={}, already_rendered=True, params=context_storage.bind_params)
+
+    def _discover_external(self, sql, params, conn_str):
+        """Schema and row estimate of an external query from the source's describe; None if unknown."""
+        if not sql or not sql.strip():
+            return None
+        try:
+            with self.connection_pools.connection(conn_str) as conn:
+                return self.external_schemas.discover(conn_str, sql, conn, native=self.native_scanner, params=params)
+        except Exception as e:
+            logger.info(f"External schema discovery skipped: {e}")
+            return None
+
+    def _write_options(self, context, requested=None) -> pa.ipc.IpcWriteOptions:
+        """IPC write options (body compression) for the ticket's "compression" field and x- headers."""
+        return self.compression.write_options(requested, request_headers(context))
+
+    def _batch_policy(self, context, ticket_options=None) -> BatchPolicy:
+        """Server batch policy with the ticket's "batching" options and x-batch-* headers applied."""
+        return self.batch_policy.overridden(ticket_options, request_headers(context))
 
     def _get_session_context(self, session_id: str) -> duckdb.DuckDBPyConnection:
         """Returns existing or creates a new isolated SessionContext for the user."""
-        if session_id in self._sessions:
-            return self._sessions[session_id]
-
-        # Cleanup if too many sessions
-        if len(self._sessions) >= self._max_sessions:
-            oldest = next(iter(self._sessions))
-            del self._sessions[oldest]
-
-        logger.info(f"Creating new session context for: {session_id}")
-        # Create an in-memory DuckDB connection
-        # We can also use a persistent file if needed, but in-memory is good for session isolation
-        ctx = duckdb.connect(":memory:")
-        
-        # Install and load generic extensions if needed (e.g. httpfs, spatial)
-        # ctx.install_extension("httpfs")
-        # ctx.load_extension("httpfs")
-        
-        # Register default tables for this new session
-        #self._register_tables_in_datafusion(ctx)
-        #self._register_external_conns(ctx)
-        
-        self._sessions[session_id] = ctx
-        return ctx
+        return self.sessions.get(session_id)
 
     def _setup_jinja(self):
         self.jinja_env = Environment(
@@ -527,19 +433,35 @@ class StreamFlightServer(pa.flight.FlightServerBase):
     #         except Exception as e:
     #             logger.error(f"Failed to connect to external source: {e}")
 
+    def _binds(self, cmd: QueryCommand) -> bool:
+        """Whether filters render placeholders for cmd: its bind_parameters field, else the server default."""
+        return self.bind_parameters if cmd.bind_parameters is None else bool(cmd.bind_parameters)
+
     def _render_query(self, cmd: QueryCommand, ctx: duckdb.DuckDBPyConnection) -> str:
-        """Processes Jinja templates into SQL strings using specific session context."""
+        """
+        Processes Jinja templates into SQL strings using specific session context.
+        In bind mode filters emit $n placeholders and the values are left in
+        context_storage.bind_params; otherwise bind_params is None. DuckDB can only
+        bind the last statement of a multi-statement script, so when placeholders
+        land in an earlier statement the query falls back to literal values.
+        """
         if cmd.already_rendered:
+            context_storage.bind_params = list(cmd.params) if cmd.params else None
             return cmd.query
 
         # Use thread-local storage accessable by ReaderExtension
         # This prevents race conditions in multi-threaded environment where
         # global environment variables would be overwritten.
         context_storage.db_conn = ctx
-        context_storage.connection_map = self.connection_map
-        context_storage.db_path = self.db_path
+        context_storage.connection_registry = self.connection_registry
+        context_storage.connection_pools = self.connection_pools
+        context_storage.native_scanner = self.native_scanner
+        context_storage.reader_cache = self.reader_cache
+        context_storage.python_workers = self.python_workers
+        context_storage.watermarks = self.sessions.watermarks(cmd.session_id)
         context_storage.session_id = cmd.session_id
         context_storage.python_stdout = "" # Clear captured stdout
+        context_storage.bind_params = [] if self._binds(cmd) else None
 
 # ... (Do not include intermediate lines, I will make two separate replace calls if needed or one with correct context if contiguous. They are not contiguous.)
 
@@ -549,88 +471,282 @@ class StreamFlightServer(pa.flight.FlightServerBase):
         
         criteria = {k: SqlWrapper(v, k, jinja_env=self.jinja_env) for k, v in cmd.criteria.items()}
         
+        template = None
         source = cmd.query
-        if not source and cmd.template:
+        if cmd.query:
+            template = self.template_cache.get_source(cmd.query)
+        elif cmd.template:
             for d in self.query_dirs:
                 p = d / cmd.template
                 if p.exists():
-                    with open(p, 'r', encoding='utf-8') as f:
-                        source = yaml.safe_load(f).get('sql', '')
+                    metadata, template = self.template_cache.get_file(p)
+                    source = metadata.sql
                     break
         
-        if not source:
+        if template is None:
             raise FileNotFoundError(f"Query source not found for template: {cmd.template}")
 
         try:
-            template = self.jinja_env.from_string(source)
-            return template.render(**criteria)
+            sql = template.render(**criteria)
+            if context_storage.bind_params and binds_before_last(sql):
+                # DuckDB binds parameters only in a script's last statement: render literals instead.
+                # Reader and Python blocks must not run twice, so their templates get the values inlined.
+                if SIDE_EFFECT_BLOCK.search(source or ""):
+                    sql = inline_params(sql, context_storage.bind_params)
+                else:
+                    context_storage.bind_params = None
+                    sql = template.render(**criteria)
+                context_storage.bind_params = None
+            return sql
+        except QueryCancelled:
+            raise
         except Exception as e:
             logger.exception("Template rendering failed")
             raise
 
+    def _start_render(self, cmd: QueryCommand, db_conn: duckdb.DuckDBPyConnection, context=None) -> PreparedQuery:
+        """Starts rendering cmd on a background thread and waits for its first log line or completion."""
+        prepared = PreparedQuery(cmd, db_conn)
+        token = prepared.cancel_token = self.queries.new(cmd.query_id, cmd.session_id)
+        # Held for the caller, who releases it; a queued query can already be cancelled
+        self.queries.hold(token)
+        try:
+            self._admit(token, cmd, context)
+        except BaseException:
+            self.queries.release(token)
+            raise
+        # The render thread keeps the query cancellable until it finishes
+        self.queries.hold(token)
+
+        def render_thread_target():
+            try:
+                # Initialize thread-local context for this new thread
+                context_storage.log_queue = prepared.log_queue
+                context_storage.has_side_effects = False
+                context_storage.registered_tables = prepared.registered_tables
+                context_storage.catalog_changes = prepared.catalog_changes
+                context_storage.cancel_token = token
+                
+                # Render Jinja (Runs python blocks which create logs)
+                with token.interrupting(db_conn.interrupt):
+                    if cmd.already_rendered:
+                        prepared.result["sql"] = self._render_query(cmd, db_conn)
+                    else:
+                        with self.metrics.timed("render", self.metrics.label(cmd.template)):
+                            prepared.result["sql"] = self._render_query(cmd, db_conn)
+                
+                prepared.result["params"] = context_storage.bind_params or None
+                # Capture side effects flag from this thread's context
+                prepared.result["has_side_effects"] = getattr(context_storage, "has_side_effects", False)
+                self.sessions.note_tables(cmd.session_id, prepared.registered_tables)
+                self.sessions.note_catalog(cmd.session_id, prepared.catalog_changes)
+                
+            except Exception as e:
+                # A failed render may have replaced some tables before it stopped
+                self.sessions.note_catalog(cmd.session_id, prepared.catalog_changes)
+                if token.cancelled:
+                    token.stopped("render")
+                    if not isinstance(e, QueryCancelled):
+                        e = QueryCancelled(f"Query {token.query_id} cancelled ({token.reason})")
+                prepared.result["error"] = e
+            finally:
+                context_storage.cancel_token = None
+                self.queries.release(token)
+                # Signal done
+                prepared.log_queue.put(None)
+
+        prepared.thread = threading.Thread(target=render_thread_target)
+        prepared.thread.start()
+        with self.queries.watching(token, context):
+            prepared.first_item = prepared.log_queue.get()
+        return prepared
+
+    def _admit(self, token, cmd: QueryCommand, context=None):
+        """
+        Waits for a scheduler slot unless the query already has one. The slot is
+        released when the last holder of the query (render thread, Flight call, stream) lets go.
+        """
+        if token.slot is not None and not token.slot.released:
+            return
+        try:
+            with self.queries.watching(token, context):
+                token.slot = self.scheduler.acquire(cmd.session_id, self._priority(cmd), token=token)
+        except AdmissionError as e:
+            logger.warning(f"[{cmd.session_id}] Query {token.query_id} not admitted: {e}")
+            if e.timed_out:
+                raise pa.flight.FlightTimedOutError(str(e))
+            raise pa.flight.FlightUnavailableError(str(e))
+        token.on_finish(token.slot.release)
+
+    def _priority(self, cmd: QueryCommand) -> str:
+        """The ticket's priority class, else python for templates with a {% python %} block, else interactive."""
+        if cmd.priority in PRIORITIES:
+            return cmd.priority
+        source = self._template_source(cmd) or ""
+        return "python" if PYTHON_BLOCK.search(source) else "interactive"
+
+    def _template_source(self, cmd: QueryCommand):
+        """Unrendered SQL of the ticket's query or template file; None if the template does not exist."""
+        if cmd.query or cmd.already_rendered:
+            return cmd.query or ""
+        if cmd.template:
+            for d in self.query_dirs:
+                p = d / cmd.template
+                if p.exists():
+                    return self.template_cache.get_file(p)[0].sql
+        return None
+
+    @staticmethod
+    def _window_request(raw_ticket):
+        try:
+            data = json.loads(raw_ticket)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) and data.get("result_id") else None
+
+    def _stream_result_window(self, request, label="result_window", started=None, options=None):
+        """Streams one offset/limit window of a cached result, optionally sorted and filtered."""
+        result_id = request["result_id"]
+        session_id = request.get("session_id") or request.get("sessionId")
+        offset = int(request.get("offset", 0))
+        try:
+            entry = self.result_cache.get(result_id, session_id)
+            table, total = self.result_cache.window(
+                result_id, session_id,
+                offset=offset,
+                limit=int(request.get("limit", 1000)),
+                sort=request.get("sort"),
+                filters=request.get("filters")
+            )
+        except KeyError as e:
+            raise pa.flight.FlightServerError(str(e.args[0]))
+        except Exception as e:
+            raise pa.flight.FlightServerError(f"Invalid result window: {e}")
+        table = with_metadata(table, window_metadata(entry, offset, total))
+        return pa.flight.RecordBatchStream(self.metrics.stream(table.to_reader(), label, started), options=options)
+
+    @staticmethod
+    def _summarize_result(db_conn, sql, params=None, preview_rows=LOG_PREVIEW_ROWS):
+        """
+        Counts the rows of sql batch by batch and keeps only the first preview_rows,
+        so printing a summary never holds the whole result in memory.
+        """
+        reader = db_conn.execute(sql, params or None).to_arrow_reader(LOG_SUMMARY_BATCH_ROWS)
+        total_rows = 0
+        kept = []
+        kept_rows = 0
+        for batch in reader:
+            total_rows += batch.num_rows
+            if kept_rows < preview_rows:
+                # take() copies the few preview rows so the full batch can be released
+                head = batch.take(pa.array(range(min(batch.num_rows, preview_rows - kept_rows))))
+                kept.append(head)
+                kept_rows += head.num_rows
+        preview = pa.Table.from_batches(kept, schema=reader.schema)
+        return total_rows, preview
+
+    def _prepared_ticket(self, cmd: QueryCommand, prepared_id: str) -> bytes:
+        """Ticket for a parked render; do_get streams it once and fails the ticket if it expired."""
+        payload = asdict(cmd)
+        payload["prepared_id"] = prepared_id
+        return json.dumps(payload).encode()
+
     def list_flights(self, context, criteria):
-        seen = set()
-        for q_dir in self.query_dirs:
-            if not q_dir.exists(): continue
-            for path in q_dir.glob("*.yaml"):
-                if path.name in seen: continue
-                try:
-                    with open(path, 'r', encoding='utf-8') as f:
-                        meta = TemplateMetadata.from_dict(path.name, yaml.safe_load(f))
-                    seen.add(path.name)
-                    desc = pa.flight.FlightDescriptor.for_command(json.dumps({"template": meta.name, "metadata": asdict(meta)}).encode())
-                    yield pa.flight.FlightInfo(pa.schema([]), desc, [pa.flight.FlightEndpoint(desc.command, [self.location])], -1, -1)
-                except Exception:
-                    continue
+        # Served from the template catalog; only changed files are ever parsed again
+        options = parse_criteria(criteria)
+        try:
+            entries = self.template_catalog.list(options.get("search"), options.get("offset", 0), options.get("limit"))
+        except (TypeError, ValueError) as e:
+            raise pa.flight.FlightServerError(f"Invalid list_flights criteria: {e}")
+        for entry in entries:
+            desc = pa.flight.FlightDescriptor.for_command(entry.command)
+            yield pa.flight.FlightInfo(pa.schema([]), desc, [pa.flight.FlightEndpoint(desc.command, [self.location])], -1, -1)
 
     def get_flight_info(self, context, descriptor):
         cmd = QueryCommand.from_json(descriptor.command.decode())
         
         # Check if this is a direct external connection query
         if cmd.connection_id and cmd.connection_id != "default":
-            # Just return a placeholder FlightInfo to allow execution to proceed to do_get.
-            # Real schema discovery would happen in do_get stream or we could try to implement it here.
-            if self.connections.get(str(cmd.connection_id)):
+            # Rendered once here; the ticket carries the SQL, so do_get runs it on the source
+            # as is. The source describes the statement (schema and row estimate) without
+            # running it. Templates with reader/python blocks are rendered by do_get only,
+            # so their schema stays unknown (empty).
+            conn_str = self.connection_registry.get(cmd.connection_id)
+            if conn_str:
+                rendered = self._render_external(cmd)
+                discovered = self._discover_external(rendered.query, rendered.params, conn_str) if rendered else None
+                schema = discovered.schema if discovered is not None else None
+                ticket = json.dumps(asdict(rendered)).encode() if rendered else descriptor.command
                 return pa.flight.FlightInfo(
-                    pa.schema([]), # Empty schema/unknown
+                    schema if schema is not None else pa.schema([]), # Empty schema/unknown
                     descriptor, 
-                    [pa.flight.FlightEndpoint(pa.flight.Ticket(descriptor.command), [self.location])], 
-                    -1, 
+                    [pa.flight.FlightEndpoint(pa.flight.Ticket(ticket), [self.location])], 
+                    discovered.total_records if discovered is not None else -1, 
                     -1
                 )
         
         ctx = self._get_session_context(cmd.session_id)
         
-        # Optimize: Tell extensions we only need schema
-        context_storage.is_schema_inference = True
-        context_storage.has_side_effects = False
-        
+        # Render once, for real. Tables created by {% reader %} / {% python %} stay in the
+        # session and the render is parked in the prepared-result registry, so do_get
+        # streams it instead of running every reader query and Python block again.
         try:
-            sql = self._render_query(cmd, ctx)
+            prepared = self._start_render(cmd, ctx, context)
+        except QueryCancelled as e:
+            raise pa.flight.FlightCancelledError(str(e))
+        try:
+            if prepared.first_item is None:
+                with self.queries.watching(prepared.cancel_token, context):
+                    prepared.thread.join()
         finally:
-            context_storage.is_schema_inference = False
+            # A parked render keeps its slot through the render thread until it finishes
+            self.queries.release(prepared.cancel_token)
+
+        if prepared.first_item is not None:
+            # Python block output is streaming; do_get attaches to the live log queue
+            ticket_payload = self._prepared_ticket(cmd, self.prepared_results.put(prepared))
+            return pa.flight.FlightInfo(
+                LOG_SCHEMA,
+                descriptor,
+                [pa.flight.FlightEndpoint(pa.flight.Ticket(ticket_payload), [self.location])],
+                -1,
+                -1
+            )
+
+        if prepared.result["error"]:
+            if isinstance(prepared.result["error"], QueryCancelled):
+                raise pa.flight.FlightCancelledError(str(prepared.result["error"]))
+            raise prepared.result["error"]
+
+        sql = prepared.result["sql"]
+        params = prepared.result["params"]
         
         # Determine Ticket Strategy
         # If no side effects (e.g. Reader Extensions) happened, we can safely pass the rendered SQL
-        # to DoGet, saving a second render pass.
-        # If side effects happened, DoGet MUST re-render to trigger appropriate "Full Load" side effects.
-        has_side_effects = getattr(context_storage, "has_side_effects", False)
+        # to DoGet as a stateless ticket.
+        # If side effects happened, DoGet streams the prepared render by its ticket id.
+        has_side_effects = prepared.result["has_side_effects"]
         
         if not has_side_effects and sql and sql.strip():
              # Create optimized command
              optimized_cmd = QueryCommand(
-                 template="", # No template
+                 template=cmd.template, # Kept only to label metrics; the query is already rendered
                  query=sql,   # Rendered SQL
                  criteria={}, # No criteria needed
                  session_id=cmd.session_id,
                  connection_id=cmd.connection_id,
-                 already_rendered=True
+                 already_rendered=True,
+                 batching=cmd.batching,
+                 cache_result=cmd.cache_result,
+                 window=cmd.window,
+                 query_id=cmd.query_id,
+                 priority=cmd.priority,
+                 compression=cmd.compression,
+                 params=params # Values of the $n placeholders in bind mode
              )
              ticket_payload = json.dumps(asdict(optimized_cmd)).encode()
         else:
-             # Fallback to original command (re-render in DoGet)
-             # Explicitly re-serialize to ensure session_id is always explicit in ticket
-             ticket_payload = json.dumps(asdict(cmd)).encode()
+             ticket_payload = self._prepared_ticket(cmd, self.prepared_results.put(prepared))
         
         if not sql or not sql.strip():
             # User likely only used {% reader %} or {% macro %} blocks without a query
@@ -655,19 +771,11 @@ class StreamFlightServer(pa.flight.FlightServerBase):
                  -1
             )
         try:
-            # Check for non-SELECT statements by inspecting the SQL string first
-            # Use simple string check to avoid DataFusion planning overhead/errors for DDL
-            sql_upper = sql.strip().upper()
-            is_modification_sql = (
-                sql_upper.startswith("CREATE") or
-                sql_upper.startswith("INSERT") or
-                sql_upper.startswith("UPDATE") or
-                sql_upper.startswith("DELETE") or
-                sql_upper.startswith("DROP")
-            )
-
-            if is_modification_sql:
-                logger.info(f"Skipping schema inference for modification query (SQL check): {sql[:50]}...")
+            # Classify with DuckDB's parser rather than by prefix (leading comments, WITH ... INSERT,
+            # several statements); statements that change the session are never run here
+            kinds = statement_kinds(sql)
+            if kinds is not None and any(k not in QUERY_STATEMENTS + INSPECTION_STATEMENTS for k in kinds):
+                logger.info(f"Skipping schema inference for modification query ({', '.join(kinds)}): {sql[:50]}...")
                 return pa.flight.FlightInfo(
                     pa.schema([("result", pa.string())]), 
                     descriptor, 
@@ -676,29 +784,39 @@ class StreamFlightServer(pa.flight.FlightServerBase):
                     -1
                 )
 
+            inference_started = time.perf_counter()
+            arrow_schema = None
+            if kinds == ["SELECT"]:
+                # Same SQL against the same session catalog: a dictionary lookup.
+                # Otherwise plan-only DESCRIBE, which never executes the query. In bind
+                # mode the SQL is the same whatever the criteria, so it hits across them.
+                version = self.sessions.catalog_version(cmd.session_id)
+                arrow_schema = self.schema_cache.get(cmd.session_id, version, sql, params)
+                if arrow_schema is None:
+                    arrow_schema = describe_schema(ctx, sql, params)
+                    if arrow_schema is not None:
+                        self.schema_cache.put(cmd.session_id, version, sql, arrow_schema, params)
+
+            if arrow_schema is None:
+                # Statements DESCRIBE cannot plan: executing with limit 0 still yields the schema
+                rel = ctx.sql(sql, params=params) if params else ctx.sql(sql)
+                # Fetch empty arrow table to get schema
+                try:
+                    arrow_schema = rel.limit(0).arrow().schema
+                except Exception as e:
+                    # If limit 0 fails (e.g. multiple statements?), or it might be a command without rows
+                    logger.info(f"Limit 0 failed for schema inference ({e}). Returning empty schema result.")
+                    return pa.flight.FlightInfo(
+                        pa.schema([("result", pa.string())]), 
+                        descriptor, 
+                        [pa.flight.FlightEndpoint(pa.flight.Ticket(ticket_payload), [self.location])], 
+                        -1, 
+                        -1
+                    )
 
-
-            # Use DuckDB to infer schema. 
-            # executing with limit 0 is a cheap way to get schema without running full query
-            # However for correct DDL/DML detection we might still roughly parse.
-            
-            # DuckDB allows DESCRIBE or just limit 0
-            rel = ctx.sql(sql)
-            # Fetch empty arrow table to get schema
-            try:
-                arrow_schema = rel.limit(0).arrow().schema
-                return pa.flight.FlightInfo(arrow_schema, descriptor, [pa.flight.FlightEndpoint(pa.flight.Ticket(ticket_payload), [self.location])], -1, -1)
-            except Exception as e:
-                # If limit 0 fails (e.g. multiple statements?), try to just execute it? 
-                # Or it might be a DDL/DML command.
-                logger.info(f"Limit 0 failed for schema inference ({e}). Returning empty schema result.")
-                return pa.flight.FlightInfo(
-                    pa.schema([("result", pa.string())]), 
-                    descriptor, 
-                    [pa.flight.FlightEndpoint(pa.flight.Ticket(ticket_payload), [self.location])], 
-                    -1, 
-                    -1
-                )
+            self.metrics.observe("schema_inference", time.perf_counter() - inference_started,
+                                 self.metrics.label(cmd.template))
+            return pa.flight.FlightInfo(arrow_schema, descriptor, [pa.flight.FlightEndpoint(pa.flight.Ticket(ticket_payload), [self.location])], -1, -1)
         except Exception as e:
             logger.error(f"Schema inference failed for session {cmd.session_id}. Error: {e}. SQL:\n{sql}", exc_info=True)
             # If planning fails (e.g. table doesn't exist yet but will be created), 
@@ -706,19 +824,55 @@ class StreamFlightServer(pa.flight.FlightServerBase):
             raise pa.flight.FlightServerError(f"Error: {e}")
 
     def do_get(self, context, ticket):
+        started = time.perf_counter()
         query = ticket.ticket.decode('utf-8')
+
+        # Window of a previously cached result: no rendering, no query execution
+        window_request = self._window_request(query)
+        if window_request is not None:
+            # Results are only readable from the session that cached them
+            if not (window_request.get("session_id") or window_request.get("sessionId")):
+                window_request["session_id"] = request_headers(context).get("x-session-id", "default")
+            return self._stream_result_window(
+                window_request, started=started,
+                options=self._write_options(context, window_request.get("compression")))
         
         # Parse ticket (JSON or plain text)
+        template = ""
+        criteria = {}
+        already_rendered = False
+        prepared_id = None
+        result_ticket = False
+        batching = {}
+        cache_result = False
+        window = {}
+        query_id = None
+        priority = None
+        compression = None
+        bind_parameters = None
+        params = None
         try:
             request_data = json.loads(query)
             
             # Check if it looks like our command structure
-            if isinstance(request_data, dict) and 'query' in request_data:
+            if isinstance(request_data, dict) and ('query' in request_data or 'template' in request_data):
                  query_sql = request_data.get('query', '')
+                 template = request_data.get('template') or ""
                  criteria = request_data.get('criteria', {})
                  # Handle mixed case keys (frontend sends camelCase, internal might be snake_case)
                  connection_id = request_data.get('connectionId') or request_data.get('connection_id')
                  session_id = request_data.get('sessionId') or request_data.get('session_id')
+                 already_rendered = request_data.get('already_rendered', False)
+                 prepared_id = request_data.get('prepared_id')
+                 result_ticket = request_data.get('result_ticket', False)
+                 batching = request_data.get('batching') or {}
+                 cache_result = request_data.get('cache_result', False)
+                 window = request_data.get('window') or {}
+                 query_id = request_data.get('query_id') or request_data.get('queryId')
+                 priority = request_data.get('priority')
+                 compression = request_data.get('compression')
+                 bind_parameters = request_data.get('bind_parameters')
+                 params = request_data.get('params')
             else:
                  # Valid JSON but not our expected object (e.g. plain string "SELECT...")
                  if isinstance(request_data, str):
@@ -737,78 +891,85 @@ class StreamFlightServer(pa.flight.FlightServerBase):
         if not session_id:
              # Try header if not in ticket
              try:
-                 # Check if invocation_metadata exists and is callable
-                 if hasattr(context, 'invocation_metadata'):
-                     headers = {k.lower(): v for k, v in context.invocation_metadata()}
-                     session_id = headers.get('x-session-id', 'default')
-                 else:
-                     # Fallback or try other attributes?
-                     # Debugging: Log what's available
-                     logger.warning(f"ServerCallContext has no invocation_metadata. Dir: {dir(context)}")
-                     session_id = 'default'
+                 # Headers are captured by HeadersMiddleware
+                 session_id = request_headers(context).get('x-session-id', 'default')
              except Exception as e:
                  logger.warning(f"Failed to access context headers: {e}")
                  session_id = 'default'
 
-        
-        # Ensure session and get connection
-        db_conn = self._get_session_context(session_id)
-        
-        # Setup context storage
-        context_storage.db_conn = db_conn
-        context_storage.connection_map = self.connection_map
-        context_storage.db_path = self.db_path
-        context_storage.session_id = session_id
-        context_storage.python_stdout = ""
-        context_storage.has_side_effects = False
-        
-        # Setup Log Streaming Queue
-        log_queue = queue.Queue()
-        context_storage.log_queue = log_queue
+        # cancel_query finds the query by this id
+        query_id = query_id or request_headers(context).get('x-query-id')
+        priority = priority or request_headers(context).get('x-query-priority')
 
-        # Result container for thread
-        render_result = {"sql": None, "error": None, "has_side_effects": False}
-        
         # Construct Command Object for _render_query
         cmd = QueryCommand(
-            template="", # No template for direct query
+            template=template,
             query=query_sql,
             criteria=criteria,
             session_id=session_id,
-            connection_id=connection_id
+            connection_id=connection_id,
+            already_rendered=already_rendered,
+            result_ticket=result_ticket,
+            batching=batching,
+            cache_result=cache_result,
+            window=window,
+            query_id=query_id,
+            priority=priority,
+            compression=compression,
+            bind_parameters=bind_parameters,
+            params=params
         )
 
-        def render_thread_target():
-            try:
-                # Initialize thread-local context for this new thread
-                context_storage.log_queue = log_queue
-                
-                # Render Jinja (Runs python blocks which create logs)
-                render_result["sql"] = self._render_query(cmd, db_conn)
-                
-                # Capture side effects flag from this thread's context
-                render_result["has_side_effects"] = getattr(context_storage, "has_side_effects", False)
-                
-            except Exception as e:
-                render_result["error"] = e
-            finally:
-                # Signal done
-                log_queue.put(None)
+        # Reuse the render get_flight_info already did. Its reader/python blocks have
+        # side effects, so a ticket whose render is gone is not silently rendered again.
+        prepared = self.prepared_results.take(prepared_id, session_id) if prepared_id else None
+        if prepared_id and prepared is None:
+            raise pa.flight.FlightServerError(
+                f"Prepared result {prepared_id} expired or was already streamed; request flight info again")
+        try:
+            if prepared is not None:
+                logger.info(f"Streaming prepared result {prepared_id} without re-rendering")
+                self.queries.hold(prepared.cancel_token)
+            else:
+                # Start rendering in background thread (held for this call)
+                prepared = self._start_render(cmd, self._get_session_context(session_id), context)
+        except QueryCancelled as e:
+            raise pa.flight.FlightCancelledError(str(e))
 
-        # Start rendering in background thread
-        t = threading.Thread(target=render_thread_target)
-        t.start()
+        token = prepared.cancel_token
+        try:
+            # A parked render whose thread has finished gave its slot back
+            self._admit(token, cmd, context)
+            return self._stream_prepared(context, prepared, cmd, started)
+        except QueryCancelled as e:
+            raise pa.flight.FlightCancelledError(str(e))
+        finally:
+            # A returned stream holds the query itself until it is drained or abandoned
+            self.queries.release(token)
+
+    def _stream_prepared(self, context, prepared: PreparedQuery, cmd: QueryCommand, started=None):
+        """Streams a render: its live log output, or the rows of its final SQL once it has finished."""
+        session_id = cmd.session_id
+        label = self.metrics.label(cmd.template)
+        options = self._write_options(context, cmd.compression)
+        token = prepared.cancel_token
+        db_conn = prepared.db_conn
         
-        # ... (Log Streaming Logic skipped for brevity implementation is unchanged) ...
-        # Ensure we join thread if we didn't enter log streaming loop or finished it
+        # Setup context storage
+        context_storage.db_conn = db_conn
+        context_storage.connection_registry = self.connection_registry
+        context_storage.session_id = session_id
+        context_storage.python_stdout = ""
+        context_storage.has_side_effects = False
         
-        # Define Log Schema globally for this function scope
-        log_schema = pa.schema([
-            pa.field("stream_type", pa.string()),
-            pa.field("stream_content", pa.string())
-        ])
+        # Log Streaming Queue and result container filled by the render thread
+        log_queue = prepared.log_queue
+        context_storage.log_queue = log_queue
+        render_result = prepared.result
+        t = prepared.thread
+        log_schema = LOG_SCHEMA
 
-        first_item = log_queue.get()
+        first_item = prepared.first_item
         
         if first_item is not None:
              # OPTION 1: LOG STREAMING MODE
@@ -835,7 +996,9 @@ class StreamFlightServer(pa.flight.FlightServerBase):
                     }, schema=log_schema)
                     yield batch
                     item = log_queue.get()
-                
+
+                # A cancelled stream stops reading logs without waiting for the render to notice
+                token.check()
                 t.join()
                 if render_result["error"]:
                      error_msg = f"\n[RENDER ERROR]: {render_result['error']}"
@@ -846,16 +1009,32 @@ class StreamFlightServer(pa.flight.FlightServerBase):
                      return
 
                 final_sql = render_result["sql"]
+                params = render_result["params"]
                 is_empty_query = not final_sql or not final_sql.strip() or all(line.strip().startswith("--") for line in final_sql.splitlines())
                 
                 if not is_empty_query:
                     try:
                         # Log Rendered SQL
                         logger.info(f"Rendered SQL: {final_sql}")
-                        arrow_result = context_storage.db_conn.execute(final_sql).arrow()
-                        summary = f"\n[SQL RESULT]: {arrow_result.num_rows} rows returned.\n"
-                        if arrow_result.num_rows < 50:
-                            summary += arrow_result.to_pandas().to_string()
+                        if cmd.result_ticket:
+                            # The client streams the rows itself in grid mode; nothing to count here
+                            data_ticket = json.dumps({
+                                "query": final_sql,
+                                "session_id": session_id,
+                                "already_rendered": True,
+                                "params": params
+                            })
+                            yield pa.RecordBatch.from_pydict({
+                                "stream_type": ["result_ticket"],
+                                "stream_content": [data_ticket]
+                            }, schema=log_schema)
+                            return
+
+                        with token.interrupting(db_conn.interrupt), self.metrics.timed("execution", label):
+                            total_rows, preview = self._summarize_result(db_conn, final_sql, params)
+                        summary = f"\n[SQL RESULT]: {total_rows} rows returned.\n"
+                        if total_rows < LOG_PREVIEW_ROWS:
+                            summary += preview.to_pandas().to_string()
                         else:
                             summary += "(Result too large for terminal view, run SQL separately for Grid View)"
                             
@@ -864,21 +1043,28 @@ class StreamFlightServer(pa.flight.FlightServerBase):
                             "stream_content": [summary]
                         }, schema=log_schema)
                     except Exception as e:
+                         token.check("duckdb")
                          error_msg = f"\n[SQL ERROR]: {e}"
                          yield pa.RecordBatch.from_pydict({
                             "stream_type": ["stderr"],
                             "stream_content": [error_msg]
                          }, schema=log_schema)
             
-             return pa.flight.GeneratorStream(log_schema, log_generator())
+             reader = self.metrics.stream(pa.RecordBatchReader.from_batches(log_schema, log_generator()), label, started)
+             # Cancelling wakes the generator out of log_queue.get()
+             return pa.flight.RecordBatchStream(
+                 self.queries.stream(token, context, reader, "logs", interrupt=lambda: log_queue.put(None)),
+                 options=options)
         
         else:
             # OPTION 2: DATA GRID MODE (Normal)
-            t.join()
+            with self.queries.watching(token, context):
+                t.join()
             if render_result["error"]:
                  raise render_result["error"]
             
             final_sql = render_result["sql"]
+            params = render_result["params"]
             has_side_effects = render_result["has_side_effects"]
 
             logger.info(f"Rendered SQL: {final_sql}")
@@ -903,35 +1089,60 @@ class StreamFlightServer(pa.flight.FlightServerBase):
                         
                     yield pa.RecordBatch.from_pydict({"Result": [msg]}, schema=success_schema)
                 
-                return pa.flight.GeneratorStream(success_schema, success_gen())
+                return pa.flight.GeneratorStream(success_schema, success_gen(), options=options)
             
             # Execute SQL and stream real results
             # Check for external connection first IF NO SIDE EFFECTS
             if cmd.connection_id and cmd.connection_id != "default" and not has_side_effects:
-                target_conn = self.connections.get(str(cmd.connection_id))
+                target_conn = self.connection_registry.get(cmd.connection_id)
                 if target_conn:
                     logger.info(f"Executing rendered query on connection {cmd.connection_id}")
-                    return self._execute_on_external(target_conn, final_sql)
+                    return self._execute_on_external(
+                        target_conn, final_sql, self._batch_policy(context, cmd.batching), token, context,
+                        label, started, options, params)
                 else:
                     logger.warning(f"Connection ID {cmd.connection_id} not found. Falling back to default session.")
 
             try:
-                # Use DuckDB streaming execution
-                rel = context_storage.db_conn.sql(final_sql)
-                
-                if rel is None:
-                    # DDL returned no relation
-                    batch = pa.RecordBatch.from_arrays(
-                         [pa.array(["İşlem başarıyla tamamlandı."])],
-                         names=["Result"]
-                     )
-                    reader = pa.RecordBatchReader.from_batches(batch.schema, [batch])
-                    return pa.flight.RecordBatchStream(reader)
-
-                reader = rel.fetch_arrow_reader(batch_size=1024)
-                return pa.flight.RecordBatchStream(reader)
-                
+                # Blocking operators run while the reader is created; a disconnect interrupts them
+                with token.interrupting(db_conn.interrupt), self.queries.watching(token, context):
+                    # Use DuckDB streaming execution
+                    execution_started = time.perf_counter()
+                    try:
+                        rel = db_conn.sql(final_sql, params=params) if params else db_conn.sql(final_sql)
+                    finally:
+                        if modifies_session(statement_kinds(final_sql)):
+                            # DDL, SET, ...: schemas planned against the old catalog are stale
+                            self.sessions.bump_catalog(session_id)
+
+                    if rel is None:
+                        # DDL returned no relation
+                        batch = pa.RecordBatch.from_arrays(
+                             [pa.array(["İşlem başarıyla tamamlandı."])],
+                             names=["Result"]
+                         )
+                        reader = pa.RecordBatchReader.from_batches(batch.schema, [batch])
+                        return pa.flight.RecordBatchStream(reader, options=options)
+
+                    if cmd.cache_result:
+                        # Materialize once; the client pages through it with result_id tickets
+                        entry = self.result_cache.materialize(session_id, db_conn, final_sql, cancel_token=token,
+                                                             params=params)
+                        self.metrics.observe("execution", time.perf_counter() - execution_started, label)
+                        return self._stream_result_window(
+                            {**cmd.window, "result_id": entry.result_id, "session_id": session_id}, label, started, options)
+
+                    policy = self._batch_policy(context, cmd.batching)
+                    reader = policy.rebatch(rel.to_arrow_reader(policy.fetch_rows))
+                    self.metrics.observe("execution", time.perf_counter() - execution_started, label)
+                    reader = self.metrics.stream(reader, label, started)
+                return pa.flight.RecordBatchStream(
+                    self.queries.stream(token, context, reader, "duckdb", interrupt=db_conn.interrupt), options=options)
+
             except Exception as e:
+                if token.cancelled:
+                    token.stopped("duckdb")
+                    raise QueryCancelled(f"Query {token.query_id} cancelled ({token.reason})") from e
                 logger.error(f"Error executing SQL: {e}")
                 raise e
             finally:
@@ -943,52 +1154,21 @@ class StreamFlightServer(pa.flight.FlightServerBase):
             session_id = body.get("session_id", "default")
             ctx = self._get_session_context(session_id)
             
+            since_version = body.get("since_version")
+            
             try:
-                # DuckDB uses information_schema similar to Postgres
-                # Fetch tables directly from information_schema.tables to get correct types
-                tables_res = ctx.execute("""
-                    SELECT 
-                        table_schema,
-                        table_name,
-                        table_type
-                    FROM information_schema.tables 
-                    WHERE table_schema NOT IN ('information_schema', 'pg_catalog')
-                    ORDER BY table_name
-                """).fetchall()
-                
-                tables_data = []
-                for table_schema, table_name, table_type in tables_res:
-                    # Fetch columns for each table/view
-                    # Use parameter binding if possible, but f-string varies with execute method support.
-                    # DuckDB python execute supports parameters.
-                    cols_res = ctx.execute("""
-                        SELECT 
-                            column_name,
-                            data_type
-                        FROM information_schema.columns 
-                        WHERE table_name = ? AND table_schema = ?
-                        ORDER BY ordinal_position
-                    """, [table_name, table_schema]).fetchall()
-                    
-                    columns = []
-                    for col_name, data_type in cols_res:
-                        columns.append({
-                            "name": col_name,
-                            "type": data_type,
-                            "primaryKey": False, # Basic schema inference
-                            "fk": None
-                        })
-                        
-                    tables_data.append({
-                        "name": table_name,
-                        "type": table_type,
-                        "columns": columns
-                    })
+                # One joined catalog query, skipped entirely while the catalog version is unchanged
+                catalog = self.catalog.get(
+                    session_id, self.sessions.catalog_version(session_id), ctx,
+                    since_version=since_version, arrow_bytes=self.sessions.arrow_bytes(session_id))
                 
                 schema = {
                     "name": f"Session : {session_id}",
                     "models": [], # Models are not yet supported/implemented
-                    "tables": tables_data
+                    "tables": catalog["tables"],
+                    "version": catalog["version"],
+                    "incremental": catalog["incremental"],
+                    "removed": catalog["removed"]
                 }
                 
                 return iter([pa.flight.Result(json.dumps(schema).encode())])
@@ -1034,6 +1214,9 @@ class StreamFlightServer(pa.flight.FlightServerBase):
                     # For safety, let's try dropping view first then table if ambiguous
                     ctx.execute(f"DROP VIEW IF EXISTS {safe_name}")
                     ctx.execute(f"DROP TABLE IF EXISTS {safe_name}")
+                # A reader view's shared Parquet dataset is no longer read by this session
+                self.reader_cache.unpin(ctx, table_name)
+                self.sessions.bump_catalog(session_id)
                     
                 return iter([pa.flight.Result(json.dumps({"success": True}).encode())])
             except Exception as e:
@@ -1052,20 +1235,7 @@ class StreamFlightServer(pa.flight.FlightServerBase):
             return iter([pa.flight.Result(json.dumps({"success": True}).encode())])
 
         elif action.type == "list_connections":
-            conn_list = []
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.execute("SELECT id, name, type, connection_string FROM _meta_connections")
-            for row in cursor.fetchall():
-                cid, name, ctype, cstr = row
-                conn_list.append({
-                    "id": str(cid),
-                    "name": name,
-                    "type": ctype,
-                    "connection_string": cstr # In production, mask this!
-                })
-            
-            conn.close()
-            return iter([pa.flight.Result(json.dumps(conn_list).encode())])
+            return iter([pa.flight.Result(json.dumps(self.connection_registry.list()).encode())])
 
         elif action.type == "save_connection":
             body = json.loads(action.body.to_pybytes().decode())
@@ -1075,49 +1245,10 @@ class StreamFlightServer(pa.flight.FlightServerBase):
             cstr = body.get("connection_string")
             
             try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-
-                # Check unique name (case-insensitive) using explicit collation
-                if conn_id:
-                     # For update
-                     cursor.execute("SELECT 1 FROM _meta_connections WHERE name = ? COLLATE NOCASE AND id != ?", (name, conn_id))
-                else:
-                     # For insert
-                     cursor.execute("SELECT 1 FROM _meta_connections WHERE name = ? COLLATE NOCASE", (name,))
-                
-                if cursor.fetchone():
-                    conn.close()
-                    raise pa.flight.FlightServerError(f"Connection with name '{name}' already exists.")
-
-                if conn_id:
-                    # Update
-                    cursor.execute(
-                        "UPDATE _meta_connections SET name=?, type=?, connection_string=? WHERE id=?",
-                        (name, ctype, cstr, conn_id)
-                    )
-                    if cursor.rowcount == 0:
-                        conn.close()
-                        raise pa.flight.FlightServerError(f"Connection ID {conn_id} not found.")
-                else:
-                    # Insert
-                    cursor.execute(
-                        "INSERT INTO _meta_connections (name, type, connection_string) VALUES (?, ?, ?)",
-                        (name, ctype, cstr)
-                    )
-                    conn_id = str(cursor.lastrowid)
-
-                conn.commit()
-                conn.close()
-                
-                # Reload memory
-                self.connections = {}
-                self.connection_map = {}
-                self._load_connections()
-                
-                return iter([pa.flight.Result(json.dumps({"success": True, "id": str(conn_id)}).encode())])
-            except sqlite3.IntegrityError:
-                 raise pa.flight.FlightServerError(f"Connection with name '{name}' already exists.")
+                conn_id = self.connection_registry.save(name, ctype, cstr, conn_id=conn_id)
+                return iter([pa.flight.Result(json.dumps({"success": True, "id": conn_id}).encode())])
+            except ConnectionRegistryError as e:
+                raise pa.flight.FlightServerError(str(e))
             except Exception as e:
                 raise pa.flight.FlightServerError(f"Failed to save connection: {e}")
 
@@ -1129,32 +1260,90 @@ class StreamFlightServer(pa.flight.FlightServerBase):
                  raise pa.flight.FlightServerError("Cannot delete system connections.")
 
             try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                
-                # Get name first to update map
-                cursor.execute("SELECT name FROM _meta_connections WHERE id = ?", (conn_id,))
-                row = cursor.fetchone()
-                if not row:
-                     conn.close()
-                     raise pa.flight.FlightServerError(f"Connection ID {conn_id} not found.")
-                
-                name = row[0]
-                
-                cursor.execute("DELETE FROM _meta_connections WHERE id = ?", (conn_id,))
-                conn.commit()
-                conn.close()
-                
-                # Update memory
-                if conn_id in self.connections:
-                    del self.connections[conn_id]
-                if name in self.connection_map:
-                    del self.connection_map[name]
-                
+                self.connection_registry.delete(conn_id)
                 return iter([pa.flight.Result(json.dumps({"success": True}).encode())])
+            except ConnectionRegistryError as e:
+                raise pa.flight.FlightServerError(str(e))
             except Exception as e:
                 raise pa.flight.FlightServerError(f"Failed to delete connection: {e}")
 
+        elif action.type == "list_sessions":
+            return iter([pa.flight.Result(json.dumps({
+                **self.sessions.stats(),
+                "items": self.sessions.list_sessions()
+            }).encode())])
+
+        elif action.type == "pool_stats":
+            return iter([pa.flight.Result(json.dumps(self.connection_pools.stats()).encode())])
+
+        elif action.type == "native_scan_stats":
+            return iter([pa.flight.Result(json.dumps(self.native_scanner.stats()).encode())])
+
+        elif action.type == "result_cache_stats":
+            return iter([pa.flight.Result(json.dumps(self.result_cache.stats()).encode())])
+
+        elif action.type == "release_result":
+            body = json.loads(action.body.to_pybytes().decode())
+            released = self.result_cache.release(body.get("result_id"), body.get("session_id", "default"))
+            return iter([pa.flight.Result(json.dumps({"success": released}).encode())])
+
+        elif action.type == "reader_cache_stats":
+            return iter([pa.flight.Result(json.dumps(self.reader_cache.stats()).encode())])
+
+        elif action.type == "invalidate_reader_cache":
+            body = json.loads(action.body.to_pybytes().decode() or "{}")
+            removed = self.reader_cache.invalidate(key=body.get("key"), connection=body.get("connection"))
+            logger.info(f"Invalidated {removed} reader cache entries")
+            return iter([pa.flight.Result(json.dumps({"success": True, "removed": removed}).encode())])
+
+        elif action.type == "cancel_query":
+            body = json.loads(action.body.to_pybytes().decode() or "{}")
+            query_id = body.get("query_id") or body.get("queryId")
+            session_id = body.get("session_id") or body.get("sessionId")
+            if not query_id and not session_id:
+                raise pa.flight.FlightServerError("cancel_query needs a query_id or session_id")
+            cancelled = self.queries.cancel(query_id, session_id)
+            return iter([pa.flight.Result(json.dumps({"success": bool(cancelled), "cancelled": cancelled}).encode())])
+
+        elif action.type == "query_stats":
+            return iter([pa.flight.Result(json.dumps(self.queries.stats()).encode())])
+
+        elif action.type == "scheduler_stats":
+            return iter([pa.flight.Result(json.dumps(self.scheduler.stats()).encode())])
+
+        elif action.type == "python_worker_stats":
+            return iter([pa.flight.Result(json.dumps(self.python_workers.stats()).encode())])
+
+        elif action.type == "compression_stats":
+            return iter([pa.flight.Result(json.dumps(self.compression.stats()).encode())])
+
+        elif action.type == "template_catalog_stats":
+            return iter([pa.flight.Result(json.dumps(self.template_catalog.stats()).encode())])
+
+        elif action.type == "catalog_stats":
+            return iter([pa.flight.Result(json.dumps(self.catalog.stats()).encode())])
+
+        elif action.type == "statement_cache_stats":
+            return iter([pa.flight.Result(json.dumps(self.statements.stats()).encode())])
+
+        elif action.type == "schema_cache_stats":
+            return iter([pa.flight.Result(json.dumps(self.schema_cache.stats()).encode())])
+
+        elif action.type == "external_schema_stats":
+            return iter([pa.flight.Result(json.dumps(self.external_schemas.stats()).encode())])
+
+        elif action.type == "get_metrics":
+            body = json.loads(action.body.to_pybytes().decode() or "{}")
+            if body.get("format") == "prometheus":
+                return iter([pa.flight.Result(self.metrics.prometheus_text().encode())])
+            return iter([pa.flight.Result(json.dumps(self.metrics.snapshot()).encode())])
+
+        elif action.type == "prepared_stats":
+            return iter([pa.flight.Result(json.dumps(self.prepared_results.stats()).encode())])
+
+        elif action.type == "template_cache_stats":
+            return iter([pa.flight.Result(json.dumps(self.template_cache.stats()).encode())])
+
         elif action.type == "create_session":
             # Generate readable unique session ID
             # Format: Session_HHMMSS_{rnd}
@@ -1166,7 +1355,7 @@ class StreamFlightServer(pa.flight.FlightServerBase):
                 rnd = ''.join(random.choices(string.ascii_uppercase, k=3))
                 new_session_id = f"Session_{now_str}_{rnd}"
                 
-                if new_session_id not in self._sessions:
+                if new_session_id not in self.sessions:
                     break
             
             # Pre-initialize session (optional but ensures it is ready)
@@ -0,0 +1,271 @@
+import time
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+
+import duckdb
+
+logger = logging.getLogger("StreamFlightServer")
+
+
+class Session:
+    """An isolated in-memory DuckDB connection plus bookkeeping for eviction."""
+
+    def __init__(self, session_id: str, conn: duckdb.DuckDBPyConnection):
+        self.session_id = session_id
+        self.conn = conn
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.last_used_wall = self.created_at
+        self.arrow_tables = {}  # name -> nbytes of Arrow data registered from readers/python blocks
+        self.watermarks = {}  # lowercased table name -> incremental reader state
+        self.catalog = {}  # lowercased table name -> schema/signature it was last registered with
+        self.catalog_version = 0
+        self.sampled_bytes = 0
+
+    def touch(self):
+        self.last_used = time.monotonic()
+        self.last_used_wall = time.time()
+
+    def table_names(self) -> list:
+        # A cursor is a separate connection to the same database, safe to use while
+        # another thread is streaming from the session connection.
+        rows = self.conn.cursor().execute("""
+            SELECT table_name FROM information_schema.tables
+            WHERE table_schema NOT IN ('information_schema', 'pg_catalog', '_results')
+            ORDER BY table_name
+        """).fetchall()
+        return [r[0] for r in rows]
+
+    def sample_bytes(self) -> int:
+        """DuckDB buffer memory plus Arrow tables registered into the session that still exist."""
+        cur = self.conn.cursor()
+        duck_bytes = cur.execute("SELECT COALESCE(SUM(memory_usage_bytes), 0) FROM duckdb_memory()").fetchone()[0]
+        if self.arrow_tables:
+            live = {n.lower() for n in self.table_names()}
+            self.arrow_tables = {n: b for n, b in self.arrow_tables.items() if n.lower() in live}
+        self.sampled_bytes = int(duck_bytes) + sum(self.arrow_tables.values())
+        return self.sampled_bytes
+
+
+class SessionManager:
+    """
+    Thread-safe LRU registry of per-user DuckDB sessions.
+
+    Sessions are evicted least-recently-used first when there are more than
+    max_sessions, when idle for longer than idle_timeout seconds, or when the
+    sampled memory of all sessions exceeds memory_budget bytes. Each new
+    connection gets the configured DuckDB memory_limit and threads settings.
+    Evicted connections are only dereferenced, never closed, so a query that
+    is still streaming from one finishes normally. Callbacks registered with
+    on_evict are told about every evicted session, outside the lock.
+    """
+
+    def __init__(self, max_sessions=100, idle_timeout=3600.0, memory_limit=None, threads=None,
+                 memory_budget=None, sample_interval=5.0):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.memory_limit = memory_limit
+        self.threads = threads
+        self.memory_budget = memory_budget
+        self.sample_interval = sample_interval
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sample = 0.0
+        # Globally unique, so a session recreated under an evicted id never reuses a version
+        self._catalog_versions = itertools.count(1)
+        self.evictions = {"lru": 0, "idle": 0, "memory": 0}
+        self._evict_callbacks = []
+
+    def __contains__(self, session_id) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def on_evict(self, callback):
+        """Calls callback(session_id, conn) for every session evicted from now on."""
+        self._evict_callbacks.append(callback)
+
+    def get(self, session_id: str) -> duckdb.DuckDBPyConnection:
+        """Returns existing or creates a new isolated session connection."""
+        evicted = []
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            else:
+                session = self._create_locked(session_id, evicted)
+            session.touch()
+            self._evict_idle_locked(evicted, keep=session_id)
+        self._evicted(evicted)
+
+        if self.memory_budget and time.monotonic() - self._last_sample >= self.sample_interval:
+            self.enforce_budget(keep=session_id)
+        return session.conn
+
+    def note_tables(self, session_id: str, tables: dict):
+        """Records Arrow bytes registered into a session, which duckdb_memory() does not see."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.arrow_tables.update(tables)
+
+    def arrow_bytes(self, session_id: str) -> dict:
+        """Name -> nbytes of the Arrow data registered into a session."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return dict(session.arrow_tables) if session is not None else {}
+
+    def catalog_version(self, session_id: str):
+        """Version of the session's tables and views; None if the session does not exist."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session.catalog_version if session is not None else None
+
+    def note_catalog(self, session_id: str, changes: dict) -> bool:
+        """
+        Applies the tables a render (re)registered, name -> Arrow schema or other
+        signature of their shape. The version moves on if any of them is new, has a
+        different shape, or has an unknown (None) shape, e.g. a Python block ran.
+        """
+        if not changes:
+            return False
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            changed = False
+            for name, signature in changes.items():
+                key = name.lower() if isinstance(name, str) else name
+                previous = session.catalog.get(key)
+                if signature is None or previous is None or previous != signature:
+                    changed = True
+                session.catalog[key] = signature
+            if changed:
+                session.catalog_version = next(self._catalog_versions)
+            return changed
+
+    def bump_catalog(self, session_id: str):
+        """Invalidates everything derived from the session's catalog, e.g. after DDL."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                # The DDL may have dropped any table, so no registration counts as unchanged
+                session.catalog.clear()
+                session.catalog_version = next(self._catalog_versions)
+
+    def watermarks(self, session_id: str) -> dict:
+        """Incremental reader state of a session; it lives and dies with the session's tables."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session.watermarks if session is not None else {}
+
+    def enforce_budget(self, keep=None):
+        """Samples every session's memory and evicts LRU sessions until the total fits the budget."""
+        self._last_sample = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        sizes = {}
+        for s in sessions:
+            try:
+                sizes[s.session_id] = s.sample_bytes()
+            except Exception as e:
+                logger.warning(f"Failed to sample memory of session {s.session_id}: {e}")
+                sizes[s.session_id] = s.sampled_bytes
+
+        if not self.memory_budget:
+            return
+        total = sum(sizes.values())
+        evicted = []
+        with self._lock:
+            for sid in list(self._sessions.keys()):
+                if total <= self.memory_budget:
+                    break
+                if sid == keep:
+                    continue
+                evicted.append(self._sessions.pop(sid))
+                total -= sizes.get(sid, 0)
+                self.evictions["memory"] += 1
+                logger.info(f"Evicted session {sid} (memory budget {self.memory_budget} bytes)")
+        self._evicted(evicted)
+
+    def list_sessions(self) -> list:
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        result = []
+        for s in sessions:
+            try:
+                tables = s.table_names()
+                nbytes = s.sample_bytes()
+            except Exception as e:
+                logger.warning(f"Failed to inspect session {s.session_id}: {e}")
+                tables, nbytes = [], s.sampled_bytes
+            result.append({
+                "session_id": s.session_id,
+                "bytes": nbytes,
+                "tables": tables,
+                "created_at": s.created_at,
+                "last_used": s.last_used_wall,
+                "idle_seconds": round(time.monotonic() - s.last_used, 3)
+            })
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "memory_budget": self.memory_budget,
+                "sampled_bytes": sum(s.sampled_bytes for s in self._sessions.values()),
+                "evictions": dict(self.evictions)
+            }
+
+    def _create_locked(self, session_id: str, evicted: list) -> Session:
+        # Cleanup least recently used sessions if too many
+        while len(self._sessions) >= self.max_sessions:
+            oldest, old_session = self._sessions.popitem(last=False)
+            evicted.append(old_session)
+            self.evictions["lru"] += 1
+            logger.info(f"Evicted least recently used session {oldest}")
+
+        logger.info(f"Creating new session context for: {session_id}")
+        # In-memory is good for session isolation
+        conn = duckdb.connect(":memory:")
+        if self.memory_limit:
+            conn.execute(f"SET memory_limit = '{self.memory_limit}'")
+        if self.threads:
+            conn.execute(f"SET threads = {int(self.threads)}")
+
+        session = Session(session_id, conn)
+        session.catalog_version = next(self._catalog_versions)
+        self._sessions[session_id] = session
+        return session
+
+    def _evict_idle_locked(self, evicted: list, keep=None):
+        if not self.idle_timeout:
+            return
+        cutoff = time.monotonic() - self.idle_timeout
+        # Least recently used sessions sit at the front
+        for sid in list(self._sessions.keys()):
+            session = self._sessions[sid]
+            if session.last_used >= cutoff:
+                break
+            if sid == keep:
+                continue
+            evicted.append(self._sessions.pop(sid))
+            self.evictions["idle"] += 1
+            logger.info(f"Evicted idle session {sid}")
+
+    def _evicted(self, sessions):
+        for session in sessions:
+            for callback in self._evict_callbacks:
+                try:
+                    callback(session.session_id, session.conn)
+                except Exception as e:
+                    logger.warning(f"Releasing evicted session {session.session_id} failed: {e}")
@@ -0,0 +1,96 @@
+import logging
+import threading
+import hashlib
+from collections import OrderedDict
+
+import yaml
+
+from .models import TemplateMetadata
+
+logger = logging.getLogger("StreamFlightServer")
+
+
+class TemplateCache:
+    """
+    Bounded LRU cache of parsed YAML templates and compiled Jinja templates.
+
+    File entries are keyed by resolved path and revalidated with the file's
+    (mtime, size) on every lookup, so edits on disk are picked up without a
+    restart. Ad-hoc query strings are keyed by their content hash.
+    """
+
+    def __init__(self, jinja_env, max_size: int = 128):
+        self.jinja_env = jinja_env
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_file(self, path):
+        """Returns (TemplateMetadata, compiled Template or None) for a YAML template file."""
+        st = path.stat()
+        key = ("file", str(path.resolve()))
+        signature = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+
+        # Parse and compile outside the lock; a concurrent miss just does the work twice.
+        with open(path, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f) or {}
+        meta = TemplateMetadata.from_dict(path.name, data)
+        template = self.jinja_env.from_string(meta.sql) if meta.sql else None
+
+        self._put(key, (signature, meta, template))
+        return meta, template
+
+    def get_source(self, source: str):
+        """Returns a compiled Template for an inline query string."""
+        key = ("source", hashlib.sha1(source.encode('utf-8')).hexdigest())
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        template = self.jinja_env.from_string(source)
+        self._put(key, (None, None, template))
+        return template
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, path=None):
+        """Drops a single file entry, or everything when no path is given."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(("file", str(path.resolve())), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / total) if total else 0.0
+            }
@@ -0,0 +1,178 @@
+import os
+import json
+import logging
+import threading
+from dataclasses import asdict
+
+import yaml
+
+from .models import TemplateMetadata
+
+logger = logging.getLogger("StreamFlightServer")
+
+
+class _TemplateEntry:
+    """A parsed template file plus the list_flights descriptor built from it."""
+
+    __slots__ = ("signature", "meta", "command", "search_text")
+
+    def __init__(self, signature, meta):
+        self.signature = signature
+        self.meta = meta  # None if the file does not parse
+        if meta is not None:
+            self.command = json.dumps({"template": meta.name, "metadata": asdict(meta)}).encode()
+            self.search_text = f"{meta.name}\n{meta.description or ''}".casefold()
+        else:
+            self.command = None
+            self.search_text = ""
+
+
+def parse_criteria(expression: bytes) -> dict:
+    """
+    list_flights criteria: a JSON object {"search", "offset", "limit"} or plain
+    text searched for in template names and descriptions. Empty means everything.
+    """
+    text = (expression or b"").decode("utf-8", errors="replace").strip()
+    if not text:
+        return {}
+    try:
+        criteria = json.loads(text)
+    except ValueError:
+        return {"search": text}
+    return criteria if isinstance(criteria, dict) else {"search": text}
+
+
+class TemplateCatalog:
+    """
+    In-memory index of the YAML templates in query_dirs, served by list_flights.
+
+    The index is built once at startup. A daemon thread polls every
+    poll_interval seconds, stats each file and re-parses only files whose
+    (mtime, size) changed. Listing itself only stats the directories: a file
+    added, removed or saved by rename changes its directory's mtime and
+    rescans that directory at once, so new templates appear without waiting
+    for the poll. A file that fails to parse is remembered and skipped until
+    it changes. As in the per-call glob it replaces, the first directory
+    holding a file name wins.
+    """
+
+    def __init__(self, query_dirs, poll_interval=2.0):
+        self.query_dirs = list(query_dirs)
+        self.poll_interval = poll_interval
+        self._dirs = {}  # directory -> (mtime_ns or None, {file name: _TemplateEntry})
+        self._index = ()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self.scans = 0
+        self.parses = 0
+        self.errors = 0
+        self.refresh(full=True)
+
+    def start(self):
+        """Starts the polling watcher; a poll_interval of 0 or None leaves freshness to list-time checks."""
+        if self.poll_interval and self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name="template-catalog-watcher", daemon=True)
+            self._watcher.start()
+
+    def close(self):
+        self._stop.set()
+
+    def list(self, search=None, offset=0, limit=None) -> list:
+        """Indexed TemplateEntry objects in order, filtered by a case-insensitive search string."""
+        self.refresh()
+        entries = self._index
+        if search:
+            needle = str(search).casefold()
+            entries = [e for e in entries if needle in e.search_text]
+        offset = max(int(offset or 0), 0)
+        end = offset + int(limit) if limit is not None else None
+        return list(entries[offset:end])
+
+    def refresh(self, full=False):
+        """
+        Rescans directories whose mtime changed, or every directory when full.
+        Unchanged files are never re-read; returns True if the index changed.
+        """
+        with self._lock:
+            changed = False
+            for q_dir in self.query_dirs:
+                key = str(q_dir)
+                try:
+                    dir_mtime = os.stat(q_dir).st_mtime_ns
+                except OSError:
+                    dir_mtime = None
+                previous_mtime, files = self._dirs.get(key, (None, {}))
+                if not full and key in self._dirs and dir_mtime == previous_mtime:
+                    continue
+                scanned = self._scan(q_dir, files) if dir_mtime is not None else {}
+                changed = changed or scanned.keys() != files.keys() or any(
+                    scanned[name] is not files.get(name) for name in scanned)
+                self._dirs[key] = (dir_mtime, scanned)
+            if changed:
+                self._rebuild_locked()
+            return changed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "templates": len(self._index),
+                "scans": self.scans,
+                "parses": self.parses,
+                "errors": self.errors
+            }
+
+    def _scan(self, q_dir, files) -> dict:
+        self.scans += 1
+        scanned = {}
+        try:
+            it = os.scandir(q_dir)
+        except OSError:
+            return scanned
+        with it:
+            for dirent in it:
+                if not dirent.name.endswith(".yaml"):
+                    continue
+                try:
+                    st = dirent.stat()
+                    if not dirent.is_file():
+                        continue
+                except OSError:
+                    continue
+                signature = (st.st_mtime_ns, st.st_size)
+                entry = files.get(dirent.name)
+                if entry is None or entry.signature != signature:
+                    entry = self._parse(dirent.path, dirent.name, signature)
+                scanned[dirent.name] = entry
+        return scanned
+
+    def _parse(self, path, name, signature) -> _TemplateEntry:
+        self.parses += 1
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                meta = TemplateMetadata.from_dict(name, yaml.safe_load(f))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Skipping template {path}: {e}")
+            meta = None
+        return _TemplateEntry(signature, meta)
+
+    def _rebuild_locked(self):
+        seen = set()
+        index = []
+        for q_dir in self.query_dirs:
+            _, files = self._dirs.get(str(q_dir), (None, {}))
+            for name in sorted(files):
+                entry = files[name]
+                if name in seen or entry.meta is None:
+                    continue
+                seen.add(name)
+                index.append(entry)
+        self._index = tuple(index)
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh(full=True)
+            except Exception as e:
+                logger.warning(f"Template catalog refresh failed: {e}")
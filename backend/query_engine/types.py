@@ -18,3 +18,123 @@ def sqlite_to_arrow_type(sqlite_type_name: str):
         return pa.string()  # SQLite'ta tarihler genelde string saklanır
     
     return pa.string()
+
+# psycopg2 type OID'leri ve pymssql tip kodları (cursor.description[i][1])
+PG_OID_TO_ARROW = {
+    16: pa.bool_(),
+    17: pa.binary(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    25: pa.string(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1042: pa.string(),
+    1043: pa.string(),
+    1082: pa.date32(),
+    1114: pa.timestamp('us'),
+    1184: pa.timestamp('us', tz='UTC'),
+    2950: pa.string(),
+}
+
+# sp_describe_first_result_set system_type_name (parantez öncesi) -> Arrow
+MSSQL_TYPE_NAME_TO_ARROW = {
+    "bit": pa.bool_(),
+    "tinyint": pa.uint8(),
+    "smallint": pa.int16(),
+    "int": pa.int32(),
+    "bigint": pa.int64(),
+    "money": pa.decimal128(19, 4),
+    "smallmoney": pa.decimal128(10, 4),
+    "real": pa.float32(),
+    "date": pa.date32(),
+    "time": pa.time64('us'),
+    "datetime": pa.timestamp('us'),
+    "datetime2": pa.timestamp('us'),
+    "smalldatetime": pa.timestamp('us'),
+    "datetimeoffset": pa.timestamp('us', tz='UTC'),
+    "char": pa.string(),
+    "varchar": pa.string(),
+    "nchar": pa.string(),
+    "nvarchar": pa.string(),
+    "text": pa.string(),
+    "ntext": pa.string(),
+    "xml": pa.string(),
+    "sysname": pa.string(),
+    "uniqueidentifier": pa.string(),
+    "binary": pa.binary(),
+    "varbinary": pa.binary(),
+    "image": pa.binary(),
+    "timestamp": pa.binary(),
+    "rowversion": pa.binary(),
+}
+
+# SQLite declared tiplerinden yalnızca sqlite_to_arrow_type'ın gerçekten tanıdıkları (NUMERIC vb. veriden çıkarılır)
+SQLITE_KNOWN_TYPE_WORDS = ("INT", "REAL", "FLOA", "DOUB", "BOOL", "DATE", "TIME", "CHAR", "CLOB", "TEXT")
+
+MSSQL_TYPE_CODE_TO_ARROW = {
+    1: pa.string(),   # pymssql.STRING
+    2: pa.binary(),   # pymssql.BINARY
+}
+
+def dbapi_to_arrow_type(dialect: str, type_code):
+    """
+    cursor.description tip kodunu Arrow tipine çevirir. Belirsizse None döner
+    (ör. pymssql NUMBER hem int hem float olabilir); bu durumda tip veriden çıkarılır.
+    """
+    if dialect == "postgres":
+        return PG_OID_TO_ARROW.get(type_code)
+    if dialect == "mssql":
+        return MSSQL_TYPE_CODE_TO_ARROW.get(type_code)
+    return None
+
+def sqlite_declared_types(conn, sql: str) -> dict:
+    """
+    Bir SELECT sorgusunun kolonlarının SQLite'ta tanımlı (declared) tiplerini döner.
+    Sorgu geçici bir view'a sarılır ve PRAGMA table_info ile okunur; ifadelerin tipi boştur.
+    """
+    import uuid
+    view = f"_qe_probe_{uuid.uuid4().hex}"
+    try:
+        conn.execute(f"CREATE TEMP VIEW {view} AS {sql.strip().rstrip(';')}")
+        try:
+            return {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({view})").fetchall() if row[2]}
+        finally:
+            conn.execute(f"DROP VIEW IF EXISTS {view}")
+    except Exception:
+        return {}
+
+def mssql_to_arrow_type(type_name: str):
+    """
+    MSSQL tip adını (ör. 'decimal(18,2)', 'nvarchar(50)', 'float') Arrow tipine çevirir.
+    Tanınmayan tipler (sql_variant, geography...) için None döner; tip veriden çıkarılır.
+    """
+    if not type_name:
+        return None
+    base, _, args = type_name.lower().partition("(")
+    base = base.strip()
+    numbers = [int(a) for a in args.rstrip(")").split(",") if a.strip().isdigit()]
+    if base in ("decimal", "numeric"):
+        precision = numbers[0] if numbers else 18
+        scale = numbers[1] if len(numbers) > 1 else 0
+        return pa.decimal128(precision, scale)
+    if base == "float":
+        return pa.float32() if numbers and numbers[0] <= 24 else pa.float64()
+    return MSSQL_TYPE_NAME_TO_ARROW.get(base)
+
+def postgres_to_arrow_type(type_code, precision=None, scale=None):
+    """
+    psycopg2 kolon tanımını (OID, precision, scale) Arrow tipine çevirir. NUMERIC için
+    typmod varsa decimal128(p, s); sınırsız NUMERIC ve bilinmeyen OID'ler için None döner.
+    """
+    if type_code == 1700:
+        if precision and 0 < precision <= 38 and scale is not None and scale >= 0:
+            return pa.decimal128(precision, scale)
+        return None
+    return PG_OID_TO_ARROW.get(type_code)
+
+def sqlite_known_type(declared: str):
+    """SQLite declared tipi sqlite_to_arrow_type'ın tanıdığı bir tipse Arrow karşılığını, değilse None döner."""
+    if declared and any(word in declared.upper() for word in SQLITE_KNOWN_TYPE_WORDS):
+        return sqlite_to_arrow_type(declared)
+    return None
@@ -24,7 +24,9 @@ export async function GET(request: NextRequest) {
     const templates: any[] = [];
 
     return new Promise<NextResponse>((resolve) => {
-        const call = client.ListFlights({ expression: Buffer.alloc(0) });
+        // Search is applied by the server against its template index
+        const search = request.nextUrl.searchParams.get("search");
+        const call = client.ListFlights({ expression: search ? Buffer.from(JSON.stringify({ search })) : Buffer.alloc(0) });
 
         call.on("data", (info: any) => {
             try {